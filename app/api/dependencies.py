@@ -1,18 +1,138 @@
+import os
+from typing import Any, Dict, Optional
+from fastapi import Request
 from app.repositories.s3_repository import S3Repository
+from app.repositories.memory_s3_repository import MemoryS3Repository
 from app.services.s3_service import S3Service
+from app.services.job_service import RecognitionJobService
+from app.services.llm_gateway import LLMGateway
+from app.utils.llm_cache import LLMCache
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
+from app.utils.paddle_ocr import get_backend_options
 from app.core.config import settings
 
-def get_s3_client() -> S3Service:
+def create_s3_repository() -> S3Repository:
     """
-    Создает и возвращает экземпляр S3Service
+    Создает репозиторий S3, общий для всех запросов (вызывается при запуске приложения)
 
-    :return: Экземпляр S3Service
+    :return: Экземпляр S3Repository
     """
-    repository = S3Repository(
+    if settings.s3_backend == "memory":
+        return MemoryS3Repository(
+            bucket_name=settings.s3_bucket_name,
+            bucket_id=settings.s3_bucket_id
+        )
+    return S3Repository(
         access_key=settings.aws_access_key_id,
         secret_key=settings.aws_secret_access_key,
         endpoint_url=settings.s3_endpoint_url,
         bucket_name=settings.s3_bucket_name,
-        bucket_id=settings.s3_bucket_id
+        bucket_id=settings.s3_bucket_id,
+        max_pool_connections=settings.s3_max_pool_connections
+    )
+
+def get_page_normalization_options() -> Optional[Dict[str, Any]]:
+    """
+    Возвращает параметры нормализации страниц перед OCR
+
+    :return: Параметры PageNormalizer или None, если нормализация выключена
+    """
+    if not settings.ocr_normalize:
+        return None
+    return {
+        "target_text_height": settings.ocr_target_text_height,
+        "target_dpi": settings.ocr_target_dpi,
+        "max_side": settings.ocr_max_side,
+        "crop_paper": settings.ocr_crop_paper
+    }
+
+def get_ocr_engine_options() -> Dict[str, Any]:
+    """
+    Возвращает параметры варианта вывода OCR. Если количество потоков не задано, ядра процессора
+    делятся между рабочими процессами пула, чтобы процессы не конкурировали за ядра
+
+    :return: Параметры PaddleOCR
+    """
+    cpu_threads = settings.ocr_cpu_threads or max((os.cpu_count() or 1) // settings.ocr_workers, 1)
+    return get_backend_options(
+        backend=settings.ocr_backend,
+        precision=settings.ocr_precision,
+        cpu_threads=cpu_threads,
+        enable_mkldnn=settings.ocr_enable_mkldnn,
+        det_model_dir=settings.ocr_det_model_dir,
+        rec_model_dir=settings.ocr_rec_model_dir
+    )
+
+def get_s3_client(request: Request) -> S3Service:
+    """
+    Возвращает экземпляр S3Service, работающий через общий репозиторий S3
+
+    :param request: Текущий запрос
+    :return: Экземпляр S3Service
+    """
+    return S3Service(request.app.state.s3_repository)
+
+def get_ocr_executor(request: Request) -> OCRExecutor:
+    """
+    Возвращает общий пул процессов OCR, созданный при запуске приложения
+
+    :param request: Текущий запрос
+    :return: Экземпляр OCRExecutor
+    """
+    return request.app.state.ocr_executor
+
+def get_ocr_cache(request: Request) -> OCRCache:
+    """
+    Возвращает общий кэш результатов распознавания
+
+    :param request: Текущий запрос
+    :return: Экземпляр OCRCache
+    """
+    return request.app.state.ocr_cache
+
+def create_llm_gateway(cache: LLMCache) -> LLMGateway:
+    """
+    Создает клиента LLM, общего для всех запросов (вызывается при запуске приложения)
+
+    :param cache: Кэш ответов LLM
+    :return: Экземпляр LLMGateway
+    """
+    return LLMGateway(
+        api_key=settings.groq_api_key,
+        base_url=settings.groq_base_url,
+        cache=cache,
+        max_concurrency=settings.llm_max_concurrency,
+        max_connections=settings.llm_max_connections,
+        max_retries=settings.llm_max_retries,
+        timeout=settings.llm_timeout,
+        backoff_base=settings.llm_backoff_base,
+        backoff_max=settings.llm_backoff_max
     )
-    return S3Service(repository)
+
+def get_llm_cache(request: Request) -> LLMCache:
+    """
+    Возвращает общий кэш ответов LLM
+
+    :param request: Текущий запрос
+    :return: Экземпляр LLMCache
+    """
+    return request.app.state.llm_cache
+
+def get_llm_gateway(request: Request) -> LLMGateway:
+    """
+    Возвращает общий клиент LLM
+
+    :param request: Текущий запрос
+    :return: Экземпляр LLMGateway
+    """
+    return request.app.state.llm_gateway
+
+def get_job_service(request: Request) -> RecognitionJobService:
+    """
+    Возвращает общий сервис фоновых заданий распознавания
+
+    :param request: Текущий запрос
+    :return: Экземпляр RecognitionJobService
+    """
+    return request.app.state.job_service
@@ -0,0 +1,172 @@
+import os
+import re
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.utils.admission import AdmissionController, AdmissionRejected
+from app.utils.metrics import metrics, request_timings, server_timing
+
+# обработчики, выполняющие OCR, и обработчики, обращающиеся к LLM
+RECOGNIZE_ROUTE = "/api/v1/recognize"
+OCR_ROUTES = (RECOGNIZE_ROUTE, "/api/v1/check")
+LLM_ROUTES = (
+    "/api/v1/postprocess-text",
+    "/api/v1/postprocess-text/stream",
+    "/api/v1/analyze-code",
+    "/api/v1/analyze-code/stream",
+    "/api/v1/analyze-code/batch",
+)
+
+class TimingMiddleware:
+    """
+    Учет HTTP-запросов: длительность и коды ответов по обработчикам, заголовок Server-Timing
+    с длительностью этапов запроса и (если включено) профилирование медленных запросов
+    """
+
+    def __init__(self, app: ASGIApp):
+        """
+        Инициализирует middleware
+
+        :param app: Следующее приложение ASGI
+        """
+        self.app = app
+        self.profile_threshold: Optional[float] = None
+        self._profiling = False
+        if settings.profile_slow_requests_ms is not None:
+            # профилировщик - необязательная зависимость, нужна только при включенном профилировании
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                raise RuntimeError("pyinstrument is required when PROFILE_SLOW_REQUESTS_MS is set")
+            self.profile_threshold = settings.profile_slow_requests_ms / 1000
+            os.makedirs(settings.profile_dir, exist_ok=True)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # для потоковых ответов в заголовок попадают этапы, завершенные до начала передачи
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(timings, time.perf_counter() - start))
+            await send(message)
+
+        profiler = self._start_profiler()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_timings.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            # запрос, отклоненный контролем допуска, не доходит до маршрутизации и учитывается по его обработчику
+            route = route or scope.get("admission_route", "unmatched")
+            metrics.observe_request(scope["method"], route, status, elapsed)
+            if profiler is not None:
+                self._finish_profiler(profiler, scope, elapsed)
+
+    def _start_profiler(self):
+        """
+        Запускает выборочный профилировщик для запроса. Одновременно профилируется только один запрос,
+        остальные в это время выполняются без профилирования
+
+        :return: Профилировщик или None
+        """
+        if self.profile_threshold is None or self._profiling:
+            return None
+        from pyinstrument import Profiler
+
+        self._profiling = True
+        profiler = Profiler(interval=settings.profile_interval_ms / 1000, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def _finish_profiler(self, profiler, scope: Scope, elapsed: float):
+        """
+        Останавливает профилировщик и сохраняет отчет, если запрос выполнялся дольше порога
+
+        :param profiler: Профилировщик
+        :param scope: Параметры запроса
+        :param elapsed: Длительность запроса в секундах
+        """
+        try:
+            profiler.stop()
+            if elapsed >= self.profile_threshold:
+                name = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+                path = os.path.join(
+                    settings.profile_dir,
+                    f"{time.strftime('%Y%m%d-%H%M%S')}_{scope['method']}_{name}_{elapsed * 1000:.0f}ms.html"
+                )
+                with open(path, "w") as report:
+                    report.write(profiler.output_html())
+        finally:
+            self._profiling = False
+
+class AdmissionMiddleware:
+    """
+    Контроль допуска запросов к обработчикам OCR и LLM: у каждого обработчика свое ограничение
+    одновременных запросов и очередь ожидания. Запрос проверяется до чтения тела, поэтому отклоненные
+    запросы не загружают изображения в память; место занято до окончания передачи ответа
+    (включая потоковые ответы). Отклоненный запрос получает 503 с заголовком Retry-After
+    """
+
+    def __init__(self, app: ASGIApp):
+        """
+        Инициализирует middleware
+
+        :param app: Следующее приложение ASGI
+        """
+        self.app = app
+        self.controllers: Dict[str, AdmissionController] = {}
+        # ограничение 0 отключает контроль допуска группы обработчиков
+        for routes, concurrency, queue_size in (
+                (OCR_ROUTES, settings.admission_ocr_concurrency, settings.admission_ocr_queue_size),
+                (LLM_ROUTES, settings.admission_llm_concurrency, settings.admission_llm_queue_size)
+        ):
+            if concurrency > 0:
+                for route in routes:
+                    self.controllers[route] = AdmissionController(
+                        route, concurrency, queue_size, settings.admission_max_wait
+                    )
+
+    @staticmethod
+    def _is_job_submission(scope: Scope) -> bool:
+        """
+        Проверяет, что запрос ставит задание распознавания в очередь (/recognize?mode=job): такие запросы
+        не выполняют OCR, а глубину очереди заданий ограничивает сервис заданий
+
+        :param scope: Параметры запроса
+        :return: True для постановки задания в очередь
+        """
+        return scope["path"] == RECOGNIZE_ROUTE and parse_qs(scope["query_string"].decode()).get("mode") == ["job"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        controller = self.controllers.get(scope["path"]) if scope["type"] == "http" else None
+        if controller is None or self._is_job_submission(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with controller.admit():
+                await self.app(scope, receive, send)
+        except AdmissionRejected:
+            scope["admission_route"] = controller.route
+            response = JSONResponse(
+                {"detail": "Server is busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.admission_retry_after)}
+            )
+            await response(scope, receive, send)
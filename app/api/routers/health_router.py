@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import PlainTextResponse
+
+from app.api.dependencies import get_ocr_executor
+from app.utils.metrics import metrics
+from app.utils.ocr_executor import OCRExecutor
+
+router = APIRouter(tags=["Health"])
+
+@router.get("/ready")
+def get_readiness(response: Response, ocr_executor: OCRExecutor = Depends(get_ocr_executor)):
+    """
+    Проверка готовности: все рабочие процессы OCR запущены, модели загружены и прогреты
+
+    :param response: Ответ (503, пока приложение не готово принимать запросы)
+    :param ocr_executor: Пул процессов OCR
+    :return: Состояние готовности
+    """
+    if ocr_executor.ready:
+        return {"status": "ready"}
+    response.status_code = 503
+    if ocr_executor.warmup_error is not None:
+        return {"status": "failed", "error": ocr_executor.warmup_error}
+    return {"status": "starting"}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Метрики этапов обработки и HTTP-запросов в формате Prometheus
+
+    :return: Текст метрик
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
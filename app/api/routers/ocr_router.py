@@ -1,19 +1,31 @@
+import json
 from datetime import datetime
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
-from typing import List, Dict, Any
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Any, Literal, Optional
 import traceback
 from pydantic import BaseModel
 
-from app.api.dependencies import get_s3_client
-from app.services.ocr_service import handle_ocr_image
+from app.api.dependencies import (
+    get_s3_client, get_ocr_executor, get_ocr_cache, get_llm_cache, get_llm_gateway, get_job_service
+)
+from app.services.check_service import CheckService
+from app.services.job_service import RecognitionJobService
+from app.services.ocr_service import handle_ocr_images, collect_page_results
 from app.services.s3_service import S3Service
+from app.utils.llm_cache import LLMCache
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
 from app.services.postprocess_service import PostProcessService
 from app.core.config import settings
 from app.services.analysis_service import AnalysisService
+from app.services.llm_gateway import LLMGateway
 
 router = APIRouter(prefix="/api/v1", tags=["OCR"])
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 class FileUrlRequest(BaseModel):
     file_num: int
     object_key: str
@@ -22,72 +34,239 @@ class AnalysisRequest(BaseModel):
     task: str
     code: str
 
+class AnalysisBatchItem(AnalysisRequest):
+    id: str
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Формирует событие Server-Sent Events
+
+    :param data: Данные события
+    :param event: Тип события (None - сообщение по умолчанию)
+    :return: Текст события
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def sse_tokens(tokens: AsyncIterator[str], result: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Передает части ответа LLM событиями {"token": ...}, затем событие done с итоговыми данными.
+    При ошибке передается событие error
+
+    :param tokens: Асинхронный итератор частей ответа
+    :param result: Данные события done
+    :return: Асинхронный итератор событий
+    """
+    try:
+        async for token in tokens:
+            yield sse_event({"token": token})
+    except Exception as e:
+        yield sse_event({"detail": f"AI service error: {e}"}, event="error")
+        return
+    yield sse_event(result, event="done")
+
+def validate_images(images: List[UploadFile]):
+    """
+    Проверяет тип и размер загруженных изображений
+
+    :param images: Список загруженных изображений
+    """
+    for image in images:
+        if not image.content_type.startswith("image/"):
+            raise HTTPException(400, "Invalid file type")
+        if image.size is not None and image.size > settings.max_upload_size:
+            raise HTTPException(413, "File is too large")
+
 @router.post("/recognize")
 async def recognize_text(
+    response: Response,
     images: List[UploadFile] = File(..., description="Image file (JPG/PNG/БMP)"),
     student_id: int = Form(..., description="Номер студента"),
     work_code: int = Form(..., description="Код работы"),
     assignment_id: int = Form(..., description="Номер задания"),
-    s3_service: S3Service = Depends(get_s3_client)
+    mode: Literal["sync", "job"] = Query("sync", description="sync - дождаться результата, job - вернуть ID задания"),
+    segmentation: Optional[bool] = Query(
+        None, description="Выделять строки по проекции без модели детекции (по умолчанию - из настроек)"
+    ),
+    s3_service: S3Service = Depends(get_s3_client),
+    ocr_executor: OCRExecutor = Depends(get_ocr_executor),
+    ocr_cache: OCRCache = Depends(get_ocr_cache),
+    job_service: RecognitionJobService = Depends(get_job_service)
 ):
     """
     Загруженные изображения проходят проверку типа, отправляются в обработчик OCR, а затем сохраняются
-    в хранилище S3
+    в хранилище S3. В режиме job страницы ставятся в очередь, а результат запрашивается через /jobs/{job_id}
 
+    :param response: Ответ (в режиме job - код 202)
     :param images: Список загруженных изображений
     :param student_id: ID студента
     :param work_code: Код работы
     :param assignment_id: ID задания
+    :param mode: Режим обработки
+    :param segmentation: Выделять строки по проекции без модели детекции
     :param s3_service: Зависимость для работы с S3-хранилищем
-    :return: Список результатов распознавания и путь работы в хранилище
+    :param ocr_executor: Пул процессов OCR
+    :param ocr_cache: Кэш результатов распознавания
+    :param job_service: Сервис фоновых заданий распознавания
+    :return: Список результатов распознавания (по странице на изображение), путь работы в хранилище
+        и список ошибок по страницам, которые не удалось обработать; в режиме job - ID задания
     """
-    results = []
-    work_url = None
-    file_index = 1
+    validate_images(images)
 
-    for image in images:
-        if not image.content_type.startswith("image/"):
-            raise HTTPException(400, "Invalid file type")
+    if mode == "job":
+        job_id = await job_service.submit(
+            images=images,
+            student_id=student_id,
+            work_code=work_code,
+            assignment_id=assignment_id,
+            segmentation=segmentation
+        )
+        response.status_code = 202
+        return {"job_id": job_id}
 
-        try:
-            image_result, work_url = await handle_ocr_image(
-                image=image,
-                s3_service=s3_service,
-                check_date=datetime.today(),
-                student_id=student_id,
-                work_code=work_code,
-                assignment_id=assignment_id,
-                file_index=file_index
-            )
-            results.append(image_result)
-            file_index += 1
-        except Exception as e:
-            traceback_str = traceback.format_exc()
-            raise HTTPException(
-                500,
-                f"Processing error: {type(e).__name__}: {str(e)}\nTraceback:\n{traceback_str}"
-            )
+    # страницы обрабатываются параллельно, результаты возвращаются в исходном порядке
+    outcomes = await handle_ocr_images(
+        images=images,
+        s3_service=s3_service,
+        ocr_executor=ocr_executor,
+        ocr_cache=ocr_cache,
+        check_date=datetime.today(),
+        student_id=student_id,
+        work_code=work_code,
+        assignment_id=assignment_id,
+        concurrency=settings.recognize_page_concurrency,
+        segmentation=segmentation
+    )
+    result = collect_page_results(outcomes)
 
-    return {
-        "results": results,
-        "work_url": work_url
-    }
+    if result["work_url"] is None:
+        e = next(outcome for outcome in outcomes if isinstance(outcome, Exception))
+        traceback_str = "".join(traceback.format_exception(e))
+        raise HTTPException(
+            500,
+            f"Processing error: {type(e).__name__}: {str(e)}\nTraceback:\n{traceback_str}"
+        )
+
+    return result
+
+@router.post("/check")
+async def check_work(
+    images: List[UploadFile] = File(..., description="Image file (JPG/PNG/БMP)"),
+    student_id: int = Form(..., description="Номер студента"),
+    work_code: int = Form(..., description="Код работы"),
+    assignment_id: int = Form(..., description="Номер задания"),
+    task: str = Form(..., description="Текст задачи"),
+    refresh: bool = Query(False, description="Получить новые ответы LLM, не используя кэш"),
+    segmentation: Optional[bool] = Query(
+        None, description="Выделять строки по проекции без модели детекции (по умолчанию - из настроек)"
+    ),
+    s3_service: S3Service = Depends(get_s3_client),
+    ocr_executor: OCRExecutor = Depends(get_ocr_executor),
+    ocr_cache: OCRCache = Depends(get_ocr_cache),
+    llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
+    """
+    Проверяет работу за один запрос: распознает страницы, обрабатывает код и анализирует его
+    относительно задачи. Результат каждого этапа передается событием Server-Sent Events сразу
+    после его завершения
+
+    :param images: Список загруженных изображений
+    :param student_id: ID студента
+    :param work_code: Код работы
+    :param assignment_id: ID задания
+    :param task: Текст задачи
+    :param refresh: Получить новые ответы LLM, не используя кэш
+    :param segmentation: Выделять строки по проекции без модели детекции
+    :param s3_service: Зависимость для работы с S3-хранилищем
+    :param ocr_executor: Пул процессов OCR
+    :param ocr_cache: Кэш результатов распознавания
+    :param llm_gateway: Общий клиент LLM
+    :return: Поток событий recognize (ответ /recognize), postprocess (ответ /postprocess-text)
+        и analysis (ответ /analyze-code), завершающийся событием done; при ошибке этапа - событие error
+    """
+    validate_images(images)
+    check_service = CheckService(
+        s3_service=s3_service,
+        ocr_executor=ocr_executor,
+        ocr_cache=ocr_cache,
+        gateway=llm_gateway,
+        page_concurrency=settings.recognize_page_concurrency
+    )
+
+    async def events() -> AsyncIterator[str]:
+        # загруженные файлы остаются открытыми до окончания передачи ответа
+        async for stage, data in check_service.run(
+            images=images,
+            student_id=student_id,
+            work_code=work_code,
+            assignment_id=assignment_id,
+            task=task,
+            refresh=refresh,
+            segmentation=segmentation
+        ):
+            yield sse_event(data, event=stage)
+            if stage == "error":
+                return
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, job_service: RecognitionJobService = Depends(get_job_service)):
+    """
+    Возвращает состояние задания распознавания
+
+    :param job_id: ID задания
+    :param job_service: Сервис фоновых заданий распознавания
+    :return: Состояние (queued/running/done/failed), количество обработанных страниц,
+        результат в формате /recognize или текст ошибки
+    """
+    return await job_service.get(job_id)
 
 @router.post("/postprocess-text")
-def postprocess_text(data: Dict[str, Any]):
+async def postprocess_text(
+        data: Dict[str, Any],
+        refresh: bool = Query(False, description="Получить новый ответ LLM, не используя кэш"),
+        llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
     """
     Обрабатывает распознанный текст, используя сервис постобработки
 
     :param data: json, содержащий распознанный текст
+    :param refresh: Получить новый ответ LLM, не используя кэш
+    :param llm_gateway: Общий клиент LLM
     :return: Обработанный текст + путь к работе
     """
-    postprocess_service = PostProcessService(api_key=settings.groq_api_key)
-    response, work_url = postprocess_service.postprocess_text(data=data)
+    postprocess_service = PostProcessService(llm_gateway)
+    response, work_url = await postprocess_service.postprocess_text(data=data, refresh=refresh)
     return {
         "response": response,
         "work_url": work_url
     }
 
+@router.post("/postprocess-text/stream")
+async def postprocess_text_stream(
+        data: Dict[str, Any],
+        refresh: bool = Query(False, description="Получить новый ответ LLM, не используя кэш"),
+        llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
+    """
+    Обрабатывает распознанный текст, передавая обработанный код событиями Server-Sent Events
+    по мере генерации
+
+    :param data: json, содержащий распознанный текст
+    :param refresh: Получить новый ответ LLM, не используя кэш
+    :param llm_gateway: Общий клиент LLM
+    :return: Поток событий {"token": ...}, завершающийся событием done с путем к работе
+    """
+    postprocess_service = PostProcessService(llm_gateway)
+    code_parts, work_url = postprocess_service.postprocess_text_stream(data=data, refresh=refresh)
+    return StreamingResponse(
+        sse_tokens(code_parts, {"work_url": work_url}),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.post("/get-file-url")
 def get_file_url(
         request: FileUrlRequest,
@@ -105,16 +284,88 @@ def get_file_url(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/ocr-cache/stats")
+def get_ocr_cache_stats(ocr_cache: OCRCache = Depends(get_ocr_cache)):
+    """
+    Возвращает счетчики попаданий и промахов кэша результатов распознавания
+
+    :param ocr_cache: Кэш результатов распознавания
+    :return: Статистика кэша
+    """
+    return ocr_cache.stats()
+
+@router.get("/llm-cache/stats")
+def get_llm_cache_stats(llm_cache: LLMCache = Depends(get_llm_cache)):
+    """
+    Возвращает счетчики попаданий и промахов кэша ответов LLM
+
+    :param llm_cache: Кэш ответов LLM
+    :return: Статистика кэша
+    """
+    return llm_cache.stats()
+
 @router.post("/analyze-code")
-def analyze_code(request: AnalysisRequest):
+async def analyze_code(
+        request: AnalysisRequest,
+        refresh: bool = Query(False, description="Провести анализ заново, не используя кэш"),
+        llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
     """
     Проводит анализ кода, используя сервис интеллектуального анализа кода
 
     :param request: Задача + код
+    :param refresh: Провести анализ заново, не используя кэш
+    :param llm_gateway: Общий клиент LLM
     :return: Результат анализа
     """
-    analysis_service = AnalysisService(api_key=settings.groq_api_key)
-    response = analysis_service.analyze_code(task=request.task, code=request.code)
+    analysis_service = AnalysisService(llm_gateway)
+    response = await analysis_service.analyze_code(task=request.task, code=request.code, refresh=refresh)
     return {
         "response": response
     }
+
+@router.post("/analyze-code/stream")
+async def analyze_code_stream(
+        request: AnalysisRequest,
+        refresh: bool = Query(False, description="Провести анализ заново, не используя кэш"),
+        llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
+    """
+    Проводит анализ кода, передавая результат событиями Server-Sent Events по мере генерации
+
+    :param request: Задача + код
+    :param refresh: Провести анализ заново, не используя кэш
+    :param llm_gateway: Общий клиент LLM
+    :return: Поток событий {"token": ...}, завершающийся событием done
+    """
+    analysis_service = AnalysisService(llm_gateway)
+    tokens = analysis_service.analyze_code_stream(task=request.task, code=request.code, refresh=refresh)
+    return StreamingResponse(sse_tokens(tokens, {}), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/analyze-code/batch")
+async def analyze_code_batch(
+        items: List[AnalysisBatchItem],
+        refresh: bool = Query(False, description="Провести анализ заново, не используя кэш"),
+        llm_gateway: LLMGateway = Depends(get_llm_gateway)
+):
+    """
+    Проводит анализ нескольких работ и передает результаты построчно в формате NDJSON
+    по мере готовности. Ошибка анализа одной работы возвращается в ее строке и не прерывает остальные
+
+    :param items: Список работ (id + задача + код)
+    :param refresh: Провести анализ заново, не используя кэш
+    :param llm_gateway: Общий клиент LLM
+    :return: Поток строк {"id": ..., "response": ...} или {"id": ..., "error": ...}
+    """
+    analysis_service = AnalysisService(llm_gateway)
+    results = analysis_service.analyze_batch(
+        items=[(item.id, item.task, item.code) for item in items],
+        concurrency=settings.analysis_batch_concurrency,
+        refresh=refresh
+    )
+
+    async def ndjson():
+        async for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,3 +1,7 @@
+import os
+from functools import lru_cache
+from typing import Literal, Optional, cast
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -13,8 +17,83 @@ class Settings(BaseSettings):
     s3_bucket_name: str
     s3_bucket_id: str
     groq_api_key: str
+    groq_base_url: Optional[str] = None
+    s3_backend: Literal["s3", "memory"] = "s3"
+    s3_max_pool_connections: int = 32
+    s3_multipart_threshold: int = 8 * 1024 * 1024
+    s3_multipart_part_size: int = 5 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    max_upload_size: int = 25 * 1024 * 1024
+    ocr_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    # задачи в пуле OCR сверх числа процессов; ожидающие запросы ограничивает admission_ocr_queue_size
+    ocr_queue_size: int = 16
+    ocr_batch_size: Optional[int] = None
+    ocr_batch_wait_ms: float = 10.0
+    ocr_preload: bool = False
+    ocr_backend: Literal["paddle", "onnx"] = "paddle"
+    ocr_precision: Literal["fp32", "int8"] = "fp32"
+    ocr_enable_mkldnn: bool = False
+    ocr_cpu_threads: Optional[int] = None
+    ocr_det_model_dir: Optional[str] = None
+    ocr_rec_model_dir: Optional[str] = None
+    ocr_warmup: bool = True
+    ocr_normalize: bool = False
+    ocr_crop_paper: bool = True
+    ocr_target_text_height: Optional[int] = 32
+    ocr_target_dpi: Optional[int] = None
+    ocr_max_side: int = 3000
+    ocr_segmentation: bool = False
+    recognize_page_concurrency: int = 4
+    ocr_cache_memory_entries: int = 1024
+    ocr_cache_path: str = "ocr_cache.sqlite3"
+    ocr_cache_max_bytes: int = 256 * 1024 * 1024
+    llm_cache_path: str = "llm_cache.sqlite3"
+    llm_cache_ttl: int = 7 * 24 * 60 * 60
+    llm_cache_max_bytes: int = 64 * 1024 * 1024
+    llm_max_concurrency: int = 8
+    llm_max_connections: int = 16
+    llm_max_retries: int = 3
+    llm_timeout: float = 60.0
+    llm_backoff_base: float = 0.5
+    llm_backoff_max: float = 30.0
+    analysis_batch_concurrency: int = 4
+    admission_ocr_concurrency: int = 8
+    admission_ocr_queue_size: int = 16
+    admission_llm_concurrency: int = 32
+    admission_llm_queue_size: int = 64
+    admission_max_wait: float = 10.0
+    admission_retry_after: int = 5
+    postprocess_chunk_tokens: int = 0
+    jobs_db_path: str = "jobs.sqlite3"
+    jobs_storage_dir: str = "jobs"
+    job_workers: int = 2
+    job_queue_max_depth: int = 64
+    job_retry_after: int = 30
+    job_retention: int = 7 * 24 * 60 * 60
+    job_prune_interval: int = 60 * 60
+    profile_slow_requests_ms: Optional[float] = None
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "profiles"
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Загружает настройки при первом обращении
+
+    :return: Экземпляр Settings
+    """
+    return Settings()
+
+class LazySettings:
+    """
+    Доступ к настройкам, откладывающий чтение окружения до первого обращения к параметру,
+    чтобы импорт модулей приложения (например, инструментами и тестами) не требовал конфигурации
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+settings = cast(Settings, LazySettings())
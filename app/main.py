@@ -1,12 +1,88 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.routers import ocr_router
+from app.api.routers import ocr_router, health_router
+from app.api.dependencies import (
+    create_s3_repository, create_llm_gateway, get_page_normalization_options, get_ocr_engine_options
+)
+from app.core.config import settings
+from app.repositories.job_repository import JobRepository
+from app.services.job_service import RecognitionJobService
+from app.utils.llm_cache import LLMCache
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
 from fastapi.middleware.cors import CORSMiddleware
+from app.api.middleware import AdmissionMiddleware, TimingMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Создает общие ресурсы приложения при запуске и освобождает их при остановке
+
+    :param app: Экземпляр приложения
+    """
+    normalization = get_page_normalization_options()
+    engine_options = get_ocr_engine_options()
+    app.state.ocr_executor = OCRExecutor(
+        workers=settings.ocr_workers,
+        queue_size=settings.ocr_queue_size,
+        batch_size=settings.ocr_batch_size,
+        batch_wait=settings.ocr_batch_wait_ms / 1000,
+        normalization=normalization,
+        preload=settings.ocr_preload,
+        warmup=settings.ocr_warmup,
+        segmentation=settings.ocr_segmentation,
+        engine_options=engine_options
+    )
+    # пул запускается первым, пока в процессе нет других потоков (важно для fork в режиме preload);
+    # готовность пула сообщает /ready, запуск приложения ее не дожидается
+    app.state.ocr_executor.start()
+    app.state.s3_repository = create_s3_repository()
+    await app.state.s3_repository.start()
+    app.state.ocr_cache = OCRCache(
+        memory_entries=settings.ocr_cache_memory_entries,
+        disk_path=settings.ocr_cache_path,
+        disk_max_bytes=settings.ocr_cache_max_bytes,
+        normalization=normalization,
+        engine_options=engine_options
+    )
+    app.state.llm_cache = LLMCache(
+        path=settings.llm_cache_path,
+        ttl=settings.llm_cache_ttl,
+        max_bytes=settings.llm_cache_max_bytes
+    )
+    app.state.llm_gateway = create_llm_gateway(app.state.llm_cache)
+    app.state.job_repository = JobRepository(settings.jobs_db_path)
+    app.state.job_service = RecognitionJobService(
+        repository=app.state.job_repository,
+        storage_dir=settings.jobs_storage_dir,
+        s3_repository=app.state.s3_repository,
+        ocr_executor=app.state.ocr_executor,
+        ocr_cache=app.state.ocr_cache,
+        workers=settings.job_workers,
+        max_depth=settings.job_queue_max_depth,
+        retry_after=settings.job_retry_after,
+        retention=settings.job_retention,
+        prune_interval=settings.job_prune_interval
+    )
+    await app.state.job_service.start()
+    yield
+    await app.state.job_service.close()
+    app.state.job_repository.close()
+    await app.state.llm_gateway.close()
+    app.state.ocr_executor.shutdown()
+    app.state.ocr_cache.close()
+    app.state.llm_cache.close()
+    await app.state.s3_repository.close()
 
 app = FastAPI(
     title="Handwriting Recognition API",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 
+# контроль допуска выполняется внутри TimingMiddleware, чтобы отклоненные запросы попадали в метрики
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TimingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -15,3 +91,4 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.include_router(ocr_router.router)
+app.include_router(health_router.router)
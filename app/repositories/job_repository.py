@@ -0,0 +1,265 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+class JobRepository:
+    """
+    Постоянная очередь заданий распознавания в SQLite: задания и их результаты сохраняются
+    между перезапусками приложения
+    """
+
+    def __init__(self, path: str):
+        """
+        Инициализирует очередь
+
+        :param path: Путь к файлу SQLite
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "pages_total INTEGER NOT NULL, pages_done INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        self._db.commit()
+
+    async def create(self, job_id: str, params: Dict[str, Any], pages_total: int, max_depth: int) -> bool:
+        """
+        Добавляет задание в очередь, если глубина очереди меньше допустимой
+
+        :param job_id: ID задания
+        :param params: Параметры задания
+        :param pages_total: Количество страниц
+        :param max_depth: Максимальное количество ожидающих и выполняемых заданий
+        :return: True, если задание добавлено, False, если очередь заполнена
+        """
+        return await asyncio.to_thread(self._locked, self._create, job_id, params, pages_total, max_depth)
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Забирает самое раннее задание из очереди и отмечает его как выполняемое
+
+        :return: Задание или None, если очередь пуста
+        """
+        return await asyncio.to_thread(self._locked, self._claim)
+
+    async def progress(self, job_id: str):
+        """
+        Увеличивает счетчик обработанных страниц задания
+
+        :param job_id: ID задания
+        """
+        await asyncio.to_thread(
+            self._locked, self._update, job_id, "pages_done = pages_done + 1", ()
+        )
+
+    async def complete(self, job_id: str, result: Dict[str, Any]):
+        """
+        Сохраняет результат выполненного задания
+
+        :param job_id: ID задания
+        :param result: Результат задания
+        """
+        await asyncio.to_thread(
+            self._locked, self._update, job_id, "status = 'done', result = ?",
+            (json.dumps(result, ensure_ascii=False),)
+        )
+
+    async def fail(self, job_id: str, error: str):
+        """
+        Отмечает задание как завершившееся ошибкой
+
+        :param job_id: ID задания
+        :param error: Текст ошибки
+        """
+        await asyncio.to_thread(self._locked, self._update, job_id, "status = 'failed', error = ?", (error,))
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает задание
+
+        :param job_id: ID задания
+        :return: Задание или None, если оно не найдено
+        """
+        return await asyncio.to_thread(self._locked, self._get, job_id)
+
+    async def depth(self) -> int:
+        """
+        Возвращает количество ожидающих и выполняемых заданий
+
+        :return: Глубина очереди
+        """
+        return await asyncio.to_thread(self._locked, self._count, ("queued", "running"))
+
+    async def count_queued(self) -> int:
+        """
+        Возвращает количество ожидающих заданий
+
+        :return: Количество заданий
+        """
+        return await asyncio.to_thread(self._locked, self._count, ("queued",))
+
+    async def requeue_running(self) -> int:
+        """
+        Возвращает в очередь задания, выполнение которых было прервано остановкой приложения
+
+        :return: Количество возвращенных заданий
+        """
+        return await asyncio.to_thread(self._locked, self._requeue_running)
+
+    async def prune(self, older_than: float) -> List[str]:
+        """
+        Удаляет завершенные задания, обновленные раньше указанного времени
+
+        :param older_than: Время в секундах от начала эпохи
+        :return: Список ID удаленных заданий
+        """
+        return await asyncio.to_thread(self._locked, self._prune, older_than)
+
+    def close(self):
+        """
+        Закрывает файл очереди
+        """
+        with self._lock:
+            self._db.close()
+
+    def _locked(self, method: Callable, *args):
+        """
+        Выполняет операцию с файлом очереди под блокировкой
+
+        :param method: Операция
+        :param args: Аргументы операции
+        :return: Результат операции
+        """
+        with self._lock:
+            return method(*args)
+
+    def _create(self, job_id: str, params: Dict[str, Any], pages_total: int, max_depth: int) -> bool:
+        """
+        Проверяет глубину очереди и записывает новое задание в одной транзакции
+        (BEGIN IMMEDIATE блокирует запись и для других процессов, работающих с тем же файлом)
+
+        :param job_id: ID задания
+        :param params: Параметры задания
+        :param pages_total: Количество страниц
+        :param max_depth: Максимальное количество ожидающих и выполняемых заданий
+        :return: True, если задание записано
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._count(("queued", "running")) >= max_depth:
+                self._db.rollback()
+                return False
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO jobs (id, status, params, pages_total, created, updated) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(params), pages_total, now, now)
+            )
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return True
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Отмечает самое раннее ожидающее задание как выполняемое
+
+        :return: Задание или None
+        """
+        row = self._db.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE jobs SET status = 'running', pages_done = 0, updated = ? WHERE id = ?",
+            (time.time(), row[0])
+        )
+        self._db.commit()
+        return self._get(row[0])
+
+    def _update(self, job_id: str, assignments: str, args: tuple):
+        """
+        Обновляет поля задания и время его изменения
+
+        :param job_id: ID задания
+        :param assignments: Выражение SET для обновляемых полей
+        :param args: Значения параметров выражения
+        """
+        self._db.execute(
+            f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?",
+            (*args, time.time(), job_id)
+        )
+        self._db.commit()
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Читает задание
+
+        :param job_id: ID задания
+        :return: Задание или None
+        """
+        row = self._db.execute(
+            "SELECT id, status, params, pages_total, pages_done, result, error, created, updated "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "params": json.loads(row[2]),
+            "pages_total": row[3],
+            "pages_done": row[4],
+            "result": json.loads(row[5]) if row[5] is not None else None,
+            "error": row[6],
+            "created": row[7],
+            "updated": row[8],
+        }
+
+    def _count(self, statuses: tuple) -> int:
+        """
+        Считает задания в указанных состояниях
+
+        :param statuses: Состояния заданий
+        :return: Количество заданий
+        """
+        placeholders = ", ".join("?" for _ in statuses)
+        return self._db.execute(
+            f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})", statuses
+        ).fetchone()[0]
+
+    def _requeue_running(self) -> int:
+        """
+        Переводит выполняемые задания в ожидающие
+
+        :return: Количество заданий
+        """
+        cursor = self._db.execute(
+            "UPDATE jobs SET status = 'queued', pages_done = 0, updated = ? WHERE status = 'running'",
+            (time.time(),)
+        )
+        self._db.commit()
+        return cursor.rowcount
+
+    def _prune(self, older_than: float) -> List[str]:
+        """
+        Удаляет завершенные задания
+
+        :param older_than: Время в секундах от начала эпохи
+        :return: Список ID удаленных заданий
+        """
+        job_ids = [
+            job_id for job_id, in self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (older_than,)
+            ).fetchall()
+        ]
+        self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        self._db.commit()
+        return job_ids
@@ -0,0 +1,73 @@
+import uuid
+from io import BytesIO
+from typing import Any, Dict, List
+from app.repositories.s3_repository import S3Repository
+
+class MemoryS3Client:
+    """
+    Клиент S3 в памяти с подмножеством методов aiobotocore, которые использует S3Repository:
+    загрузка одним запросом и multipart upload (с завершением и отменой)
+    """
+    def __init__(self, objects: Dict[str, bytes]):
+        """
+        Инициализирует клиента
+
+        :param objects: Хранилище объектов по ключам
+        """
+        self.objects = objects
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.completed: List[str] = []
+        self.aborted: List[str] = []
+
+    async def put_object(self, Bucket: str, Key: str, Body: Any):
+        self.objects[Key] = bytes(Body.getvalue() if isinstance(Body, BytesIO) else Body)
+
+    async def create_multipart_upload(self, Bucket: str, Key: str) -> Dict[str, str]:
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any) -> Dict[str, str]:
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    async def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        self.completed.append(UploadId)
+
+    async def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+
+class MemoryS3Repository(S3Repository):
+    """
+    Локальная замена S3-хранилища, хранящая объекты в памяти процесса (для тестов и локального запуска).
+    Загрузка выполняется кодом S3Repository через клиента в памяти, включая multipart upload
+    """
+    def __init__(self, bucket_name, bucket_id):
+        """
+        Инициализирует хранилище в памяти
+
+        :param bucket_name: Название бакета
+        :param bucket_id: ID бакета (используется при формировании URL)
+        """
+        super().__init__(
+            access_key=None,
+            secret_key=None,
+            endpoint_url=None,
+            bucket_name=bucket_name,
+            bucket_id=bucket_id
+        )
+        self.objects: Dict[str, bytes] = {}
+        self.client = MemoryS3Client(self.objects)
+
+    async def start(self):
+        """
+        Внешнее подключение не требуется
+        """
+
+    async def close(self):
+        """
+        Внешнее подключение не требуется
+        """
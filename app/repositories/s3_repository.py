@@ -1,14 +1,17 @@
 from io import BytesIO
-from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Union
+from contextlib import asynccontextmanager, AsyncExitStack
+from aiobotocore.config import AioConfig
 from aiobotocore.session import get_session
 from botocore.exceptions import ClientError
 from urllib.parse import quote
+from app.utils.metrics import metrics
 
 class S3Repository:
     """
     Репозиторий для работы с S3-хранилищем
     """
-    def __init__(self, access_key, secret_key, endpoint_url, bucket_name, bucket_id):
+    def __init__(self, access_key, secret_key, endpoint_url, bucket_name, bucket_id, max_pool_connections=10):
         """
         Инициализирует репозиторий S3 с указанными параметрами подключения
 
@@ -17,44 +20,164 @@ class S3Repository:
         :param endpoint_url: URL эндпоинта S3
         :param bucket_name: Название бакета, в который осуществляется загрузка
         :param bucket_id: ID бакета, в который осуществляется загрузка
+        :param max_pool_connections: Размер пула соединений долгоживущего клиента
         """
         self.config = {
             "aws_access_key_id": access_key,
             "aws_secret_access_key": secret_key,
             "endpoint_url": endpoint_url,
+            "config": AioConfig(max_pool_connections=max_pool_connections),
         }
         self.bucket_name = bucket_name
         self.bucket_id = bucket_id
         self.session = get_session()
+        self.client = None
+        self._exit_stack = None
+
+    async def start(self):
+        """
+        Создает долгоживущего клиента S3, который используется всеми запросами
+        """
+        if self.client is None:
+            self._exit_stack = AsyncExitStack()
+            self.client = await self._exit_stack.enter_async_context(
+                self.session.create_client("s3", **self.config)
+            )
+
+    async def close(self):
+        """
+        Закрывает долгоживущего клиента S3 и его пул соединений
+        """
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self.client = None
 
     @asynccontextmanager
     async def get_client(self):
         """
-        Асинхронный контекстный менеджер, создающий клиента для работы с S3
+        Асинхронный контекстный менеджер, возвращающий клиента для работы с S3.
+        Если долгоживущий клиент не создан, создает временного клиента
 
         :return: Объект клиента S3
         """
+        if self.client is not None:
+            yield self.client
+            return
         async with self.session.create_client("s3", **self.config) as client:
             yield client
 
-    async def upload_file(self, file_obj: BytesIO, object_key: str):
+    async def upload_file(self, file_obj: Union[BytesIO, bytes, bytearray], object_key: str):
         """
         Загружает файл в S3 по указанному ключу
 
-        :param file_obj: Файл в памяти в формате BytesIO
+        :param file_obj: Файл в памяти в формате BytesIO или bytes
         :param object_key: Ключ объекта
         :return: RuntimeError: При ошибке загрузки в S3
         """
+        size = file_obj.getbuffer().nbytes if isinstance(file_obj, BytesIO) else len(file_obj)
         try:
             async with self.get_client() as client:
-                await client.put_object(
-                    Bucket=self.bucket_name,
-                    Key=object_key,
-                    Body=file_obj,
-                )
+                with metrics.stage("s3_put"):
+                    await client.put_object(
+                        Bucket=self.bucket_name,
+                        Key=object_key,
+                        Body=file_obj,
+                    )
+            metrics.add_bytes("s3_put", size)
         except ClientError as e:
             raise RuntimeError(f"S3 upload error: {e}")
 
+    async def upload_stream(
+            self,
+            chunks: AsyncIterator[bytes],
+            object_key: str,
+            part_size: int,
+            threshold: Optional[int] = None,
+            buffer: Optional[bytearray] = None
+    ):
+        """
+        Загружает в S3 файл, поступающий частями. Если файл не превышает threshold, он загружается
+        одним запросом, иначе через multipart upload: каждая часть отправляется, как только набрано part_size байт
+
+        :param chunks: Асинхронный итератор частей файла
+        :param object_key: Ключ объекта
+        :param part_size: Размер части multipart upload (не меньше 5 МБ, кроме последней)
+        :param threshold: Размер файла, начиная с которого используется multipart upload (по умолчанию part_size)
+        :param buffer: Буфер, в который источник сам дописывает прочитанные части (например, UploadTee.contents).
+            Если задан, тело запроса и части multipart upload берутся из него, и второй копии файла не создается.
+            Иначе части накапливаются в собственном буфере, и в памяти находится не больше threshold байт
+        :return: RuntimeError: При ошибке загрузки в S3
+        """
+        threshold = part_size if threshold is None else threshold
+        data = bytearray() if buffer is None else buffer
+        # количество байт data, уже отправленных частями multipart upload
+        offset = 0
+        parts = []
+        upload_id = None
+        async with self.get_client() as client:
+            try:
+                async for chunk in chunks:
+                    if buffer is None:
+                        data += chunk
+                    if upload_id is None:
+                        if len(data) < threshold:
+                            continue
+                        response = await client.create_multipart_upload(Bucket=self.bucket_name, Key=object_key)
+                        upload_id = response["UploadId"]
+                    while len(data) - offset >= part_size:
+                        part = data[offset:offset + part_size]
+                        parts.append(await self._upload_part(client, object_key, upload_id, len(parts) + 1, part))
+                        offset += part_size
+                    if buffer is None:
+                        del data[:offset]
+                        offset = 0
+
+                if upload_id is None:
+                    with metrics.stage("s3_put"):
+                        await client.put_object(Bucket=self.bucket_name, Key=object_key, Body=data)
+                    metrics.add_bytes("s3_put", len(data))
+                    return
+
+                if len(data) > offset:
+                    part = data[offset:]
+                    parts.append(await self._upload_part(client, object_key, upload_id, len(parts) + 1, part))
+                with metrics.stage("s3_complete_multipart"):
+                    await client.complete_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=object_key,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": parts}
+                    )
+            except BaseException as e:
+                if upload_id is not None:
+                    await client.abort_multipart_upload(Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+                if isinstance(e, ClientError):
+                    raise RuntimeError(f"S3 upload error: {e}")
+                raise
+
+    async def _upload_part(self, client, object_key: str, upload_id: str, part_number: int, data: bytearray):
+        """
+        Загружает одну часть multipart upload
+
+        :param client: Объект клиента S3
+        :param object_key: Ключ объекта
+        :param upload_id: ID multipart upload
+        :param part_number: Номер части (начиная с 1)
+        :param data: Содержимое части
+        :return: Описание загруженной части для завершения multipart upload
+        """
+        with metrics.stage("s3_upload_part"):
+            response = await client.upload_part(
+                Bucket=self.bucket_name,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data
+            )
+        metrics.add_bytes("s3_upload_part", len(data))
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
     def gen_url(
             self,
             object_key: str
@@ -1,24 +1,53 @@
+import asyncio
 from fastapi import HTTPException
-from groq import Groq
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from app.services.llm_gateway import LLMGateway
+from app.utils.metrics import metrics
 
 class AnalysisService:
     """
     Сервис для интеллектуального анализа кода с использованием LLM
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, gateway: LLMGateway):
         """
         Инициализирует сервис для интеллектуального анализа кода
 
-        :param api_key: Ключ API для аутентификации в Groq
+        :param gateway: Общий клиент LLM
+        """
+        self.gateway = gateway
+
+    @staticmethod
+    def _build_prompt(task: str, code: str) -> str:
+        """
+        Формирует запрос к LLM для анализа кода
+
+        :param task: Текст задачи
+        :param code: Код, подлежащий анализу
+        :return: Текст запроса
         """
-        self.api_key = api_key
+        return "You are an expert code reviewer and software engineer that thinks and never makes mistakes. " \
+               "Below is a programming task description, followed by a code implementation. " \
+               "Analyze the code and determine whether it correctly and completely fulfills the task requirements. " \
+               "Be thorough and precise without suggesting any code: " \
+               "Check for correctness: Does the logic meet the exact requirements of the task? " \
+               "Check for completeness: Does it handle all specified cases, inputs, and edge conditions? " \
+               "Check for efficiency and readability. " \
+               "Highlight any bugs, flaws, or missing parts. " \
+               "Do NOT just summarize the code — analyze it against the task. " \
+               "The answer must be in Russian language. " \
+               "TASK DESCRIPTION: " \
+               f"{task} " \
+               "CODE: " \
+               f"{code}"
 
-    def analyze_code(
+    async def analyze_code(
             self,
             task: str,
             code: str,
-            model: str = "llama3-70b-8192"
+            model: str = "llama3-70b-8192",
+            refresh: bool = False
     ):
         """
         Обрабатывает результат интеллектуального анализа кода с помощью LLM
@@ -26,34 +55,72 @@ class AnalysisService:
         :param task: Текст задачи
         :param code: Код, подлежащий анализу
         :param model: LLM модель (llama3-70b-8192)
+        :param refresh: Получить новый ответ LLM, не используя кэш
         :return: Результат анализа
         """
-        client = Groq(api_key=self.api_key)
-        content = "You are an expert code reviewer and software engineer that thinks and never makes mistakes. " \
-                  "Below is a programming task description, followed by a code implementation. " \
-                  "Analyze the code and determine whether it correctly and completely fulfills the task requirements. " \
-                  "Be thorough and precise without suggesting any code: " \
-                  "Check for correctness: Does the logic meet the exact requirements of the task? " \
-                  "Check for completeness: Does it handle all specified cases, inputs, and edge conditions? " \
-                  "Check for efficiency and readability. " \
-                  "Highlight any bugs, flaws, or missing parts. " \
-                  "Do NOT just summarize the code — analyze it against the task. " \
-                  "The answer must be in Russian language. " \
-                  "TASK DESCRIPTION: " \
-                  f"{task} " \
-                  "CODE: " \
-                  f"{code}"
+        content = self._build_prompt(task, code)
         try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ],
-                model=model,
-                temperature=0.0
-            )
-            return chat_completion.choices[0].message.content
+            with metrics.stage("llm_analysis"):
+                return await self.gateway.complete(content, model, refresh)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"AI service error: {e}")
+
+    def analyze_code_stream(
+            self,
+            task: str,
+            code: str,
+            model: str = "llama3-70b-8192",
+            refresh: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Проводит интеллектуальный анализ кода с помощью LLM, передавая результат по частям
+        по мере генерации
+
+        :param task: Текст задачи
+        :param code: Код, подлежащий анализу
+        :param model: LLM модель (llama3-70b-8192)
+        :param refresh: Получить новый ответ LLM, не используя кэш
+        :return: Асинхронный итератор частей результата анализа
+        """
+        content = self._build_prompt(task, code)
+
+        async def tokens() -> AsyncIterator[str]:
+            with metrics.stage("llm_analysis_stream"):
+                async for token in self.gateway.stream(content, model, refresh):
+                    yield token
+
+        return tokens()
+
+    async def analyze_batch(
+            self,
+            items: List[Tuple[str, str, str]],
+            concurrency: int,
+            refresh: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Проводит анализ нескольких работ параллельно и возвращает результаты по мере готовности
+
+        :param items: Список работ (id, текст задачи, код)
+        :param concurrency: Максимальное количество одновременно анализируемых работ
+        :param refresh: Провести анализ заново, не используя кэш
+        :return: Асинхронный итератор результатов с id работы (ответ или ошибка)
+        """
+        slots = asyncio.Semaphore(concurrency)
+
+        async def analyze_item(item_id: str, task: str, code: str) -> Dict[str, Any]:
+            async with slots:
+                try:
+                    return {"id": item_id, "response": await self.analyze_code(task=task, code=code, refresh=refresh)}
+                except HTTPException as e:
+                    return {"id": item_id, "error": e.detail}
+                except Exception as e:
+                    return {"id": item_id, "error": f"{type(e).__name__}: {str(e)}"}
+
+        tasks = [asyncio.ensure_future(analyze_item(*item)) for item in items]
+        try:
+            for result in asyncio.as_completed(tasks):
+                yield await result
+        finally:
+            # при разрыве соединения незавершенные задачи отменяются
+            for task in tasks:
+                task.cancel()
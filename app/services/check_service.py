@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import UploadFile, HTTPException
+
+from app.services.analysis_service import AnalysisService
+from app.services.llm_gateway import LLMGateway
+from app.services.ocr_service import handle_ocr_images, collect_page_results
+from app.services.postprocess_service import PostProcessService
+from app.services.s3_service import S3Service
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
+
+class CheckService:
+    """
+    Сервис полной проверки работы: распознавание страниц, постобработка кода и анализ решения
+    выполняются на сервере за один запрос
+    """
+
+    def __init__(
+            self,
+            s3_service: S3Service,
+            ocr_executor: OCRExecutor,
+            ocr_cache: OCRCache,
+            gateway: LLMGateway,
+            page_concurrency: int
+    ):
+        """
+        Инициализирует сервис проверки
+
+        :param s3_service: Сервис для работы с S3-хранилищем
+        :param ocr_executor: Пул процессов OCR
+        :param ocr_cache: Кэш результатов распознавания
+        :param gateway: Общий клиент LLM
+        :param page_concurrency: Максимальное количество одновременно обрабатываемых страниц
+        """
+        self.s3_service = s3_service
+        self.ocr_executor = ocr_executor
+        self.ocr_cache = ocr_cache
+        self.postprocess_service = PostProcessService(gateway)
+        self.analysis_service = AnalysisService(gateway)
+        self.page_concurrency = page_concurrency
+
+    def _postprocess(self, results: List[List[str]], refresh: bool) -> asyncio.Task:
+        """
+        Запускает постобработку распознанного кода в отдельной задаче
+
+        :param results: Результаты распознавания по страницам
+        :param refresh: Получить новый ответ LLM, не используя кэш
+        :return: Задача, возвращающая обработанный код
+        """
+        data = {"results": results, "work_url": None}
+        return asyncio.ensure_future(self.postprocess_service.postprocess_text(data=data, refresh=refresh))
+
+    async def run(
+            self,
+            images: List[UploadFile],
+            student_id: int,
+            work_code: int,
+            assignment_id: int,
+            task: str,
+            refresh: bool = False,
+            segmentation: Optional[bool] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Проверяет работу и возвращает результат каждого этапа сразу после его завершения.
+        Постобработка начинается, как только распознана последняя страница, параллельно с загрузкой в S3
+
+        :param images: Список загруженных изображений
+        :param student_id: ID студента
+        :param work_code: Код работы
+        :param assignment_id: ID задания
+        :param task: Текст задачи
+        :param refresh: Получить новые ответы LLM, не используя кэш
+        :param segmentation: Выделять строки по проекции без модели детекции (None - значение из настроек)
+        :return: Асинхронный итератор пар (этап, данные): recognize - результат в формате /recognize,
+            postprocess - обработанный код и путь к работе, analysis - результат анализа,
+            error - этап и текст ошибки (после нее проверка прекращается)
+        """
+        pages: Dict[int, List[str]] = {}
+        postprocess_task: Optional[asyncio.Task] = None
+
+        def on_page_recognized(file_index: int, lines: Optional[List[str]]):
+            nonlocal postprocess_task
+            # нераспознанная страница попадет в результат пустой, как в collect_page_results
+            pages[file_index] = lines or []
+            if len(pages) == len(images):
+                postprocess_task = self._postprocess([pages[index] for index in range(1, len(images) + 1)], refresh)
+
+        ocr_task = asyncio.ensure_future(handle_ocr_images(
+            images=images,
+            s3_service=self.s3_service,
+            ocr_executor=self.ocr_executor,
+            ocr_cache=self.ocr_cache,
+            check_date=datetime.today(),
+            student_id=student_id,
+            work_code=work_code,
+            assignment_id=assignment_id,
+            concurrency=self.page_concurrency,
+            on_page_recognized=on_page_recognized,
+            segmentation=segmentation
+        ))
+        try:
+            try:
+                result = collect_page_results(await ocr_task)
+            except HTTPException as e:
+                yield "error", {"stage": "recognize", "detail": e.detail}
+                return
+            yield "recognize", result
+            if result["work_url"] is None:
+                yield "error", {"stage": "recognize", "detail": "No page was processed"}
+                return
+
+            # страница, не загруженная в S3, исключается из результата - постобработка выполняется заново
+            if postprocess_task is None or [pages[index] for index in sorted(pages)] != result["results"]:
+                if postprocess_task is not None:
+                    postprocess_task.cancel()
+                postprocess_task = self._postprocess(result["results"], refresh)
+            try:
+                code, _ = await postprocess_task
+            except HTTPException as e:
+                yield "error", {"stage": "postprocess", "detail": e.detail}
+                return
+            yield "postprocess", {"response": code, "work_url": result["work_url"]}
+
+            try:
+                analysis = await self.analysis_service.analyze_code(task=task, code=code, refresh=refresh)
+            except HTTPException as e:
+                yield "error", {"stage": "analysis", "detail": e.detail}
+                return
+            yield "analysis", {"response": analysis}
+        finally:
+            # при разрыве соединения незавершенные этапы отменяются
+            for pending in (ocr_task, postprocess_task):
+                if pending is not None and not pending.done():
+                    pending.cancel()
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from fastapi import UploadFile, HTTPException
+
+from app.core.config import settings
+from app.repositories.job_repository import JobRepository
+from app.repositories.s3_repository import S3Repository
+from app.services.ocr_service import handle_ocr_images, collect_page_results
+from app.services.s3_service import S3Service
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
+
+logger = logging.getLogger(__name__)
+
+class RecognitionJobService:
+    """
+    Фоновое распознавание работ: страницы сохраняются на диск, задание ставится в постоянную очередь,
+    а фоновые обработчики выполняют его независимо от HTTP-соединения клиента
+    """
+
+    def __init__(
+            self,
+            repository: JobRepository,
+            storage_dir: str,
+            s3_repository: S3Repository,
+            ocr_executor: OCRExecutor,
+            ocr_cache: OCRCache,
+            workers: int,
+            max_depth: int,
+            retry_after: int,
+            retention: int,
+            prune_interval: float
+    ):
+        """
+        Инициализирует сервис заданий
+
+        :param repository: Очередь заданий
+        :param storage_dir: Каталог для страниц, ожидающих обработки
+        :param s3_repository: Общий репозиторий S3
+        :param ocr_executor: Пул процессов OCR
+        :param ocr_cache: Кэш результатов распознавания
+        :param workers: Количество одновременно выполняемых заданий
+        :param max_depth: Максимальное количество ожидающих и выполняемых заданий
+        :param retry_after: Рекомендуемая задержка повторной отправки при заполненной очереди в секундах
+        :param retention: Время хранения завершенных заданий в секундах
+        :param prune_interval: Минимальный интервал между удалениями устаревших заданий в секундах
+        """
+        self.repository = repository
+        self.storage_dir = storage_dir
+        self.s3_service = S3Service(s3_repository)
+        self.ocr_executor = ocr_executor
+        self.ocr_cache = ocr_cache
+        self.workers = workers
+        self.max_depth = max_depth
+        self.retry_after = retry_after
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self._pruned_at = 0.0
+        # количество ожидающих заданий, которые еще не забрал ни один обработчик
+        self._pending = asyncio.Semaphore(0)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """
+        Возобновляет прерванные задания и запускает фоновые обработчики
+        """
+        os.makedirs(self.storage_dir, exist_ok=True)
+        await self._prune()
+        await self.repository.requeue_running()
+        for _ in range(await self.repository.count_queued()):
+            self._pending.release()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """
+        Останавливает фоновые обработчики; прерванные задания будут выполнены после перезапуска
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+            self,
+            images: List[UploadFile],
+            student_id: int,
+            work_code: int,
+            assignment_id: int,
+            segmentation: Optional[bool] = None
+    ) -> str:
+        """
+        Сохраняет страницы работы и ставит задание распознавания в очередь
+
+        :param images: Список загруженных изображений
+        :param student_id: ID студента
+        :param work_code: Код работы
+        :param assignment_id: ID задания
+        :param segmentation: Выделять строки по проекции без модели детекции (None - значение из настроек)
+        :return: ID задания
+        :raises HTTPException: 503, если очередь заполнена
+        """
+        # предварительная проверка, чтобы не сохранять страницы при заполненной очереди;
+        # окончательно глубина проверяется вместе с добавлением задания
+        if await self.repository.depth() >= self.max_depth:
+            raise self._queue_full()
+
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        await asyncio.to_thread(os.makedirs, job_dir)
+        try:
+            for file_index, image in enumerate(images, start=1):
+                await self._store_page(image, os.path.join(job_dir, str(file_index)))
+            created = await self.repository.create(
+                job_id,
+                {
+                    "check_date": str(datetime.today()),
+                    "student_id": student_id,
+                    "work_code": work_code,
+                    "assignment_id": assignment_id,
+                    "segmentation": segmentation
+                },
+                len(images),
+                self.max_depth
+            )
+            if not created:
+                raise self._queue_full()
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            raise
+        self._pending.release()
+        return job_id
+
+    async def get(self, job_id: str) -> Dict[str, Any]:
+        """
+        Возвращает состояние задания
+
+        :param job_id: ID задания
+        :return: Состояние, прогресс и результат (после завершения) или ошибка задания
+        :raises HTTPException: 404, если задание не найдено
+        """
+        job = await self.repository.get(job_id)
+        if job is None:
+            raise HTTPException(404, "Job not found")
+        status = {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "pages_done": job["pages_done"],
+            "pages_total": job["pages_total"]
+        }
+        if job["status"] == "done":
+            status["result"] = job["result"]
+        elif job["status"] == "failed":
+            status["error"] = job["error"]
+        return status
+
+    async def _worker(self):
+        """
+        Фоновый обработчик: по очереди выполняет ожидающие задания
+        """
+        while True:
+            await self._pending.acquire()
+            # ошибка одного задания (например, при записи в файл очереди) не должна останавливать обработчик
+            try:
+                job = await self.repository.claim()
+                if job is not None:
+                    await self._run(job)
+                # устаревшие задания удаляются и без перезапуска приложения, но не чаще prune_interval
+                if time.monotonic() - self._pruned_at >= self.prune_interval:
+                    await self._prune()
+            except Exception:
+                logger.exception("Recognition job worker failed")
+
+    async def _run(self, job: Dict[str, Any]):
+        """
+        Выполняет задание: распознает сохраненные страницы и записывает результат
+
+        :param job: Задание
+        """
+        job_id = job["job_id"]
+        params = job["params"]
+        job_dir = self._job_dir(job_id)
+        files = []
+        try:
+            for file_index in range(1, job["pages_total"] + 1):
+                files.append(open(os.path.join(job_dir, str(file_index)), "rb"))
+            outcomes = await handle_ocr_images(
+                images=[UploadFile(file=file) for file in files],
+                s3_service=self.s3_service,
+                ocr_executor=self.ocr_executor,
+                ocr_cache=self.ocr_cache,
+                check_date=datetime.fromisoformat(params["check_date"]),
+                student_id=params["student_id"],
+                work_code=params["work_code"],
+                assignment_id=params["assignment_id"],
+                concurrency=settings.recognize_page_concurrency,
+                on_page_done=lambda: self.repository.progress(job_id),
+                # задания, созданные до появления параметра, выполняются с настройками по умолчанию
+                segmentation=params.get("segmentation")
+            )
+            result = collect_page_results(outcomes)
+            if result["work_url"] is None:
+                await self.repository.fail(job_id, f"Processing error: {result['errors'][0]['error']}")
+            else:
+                await self.repository.complete(job_id, result)
+        except asyncio.CancelledError:
+            # задание остается выполняемым и возвращается в очередь при следующем запуске
+            raise
+        except Exception as e:
+            await self.repository.fail(job_id, f"Processing error: {type(e).__name__}: {str(e)}")
+        finally:
+            for file in files:
+                file.close()
+        await asyncio.to_thread(shutil.rmtree, job_dir, True)
+
+    async def _store_page(self, image: UploadFile, path: str):
+        """
+        Сохраняет загруженную страницу на диск частями
+
+        :param image: Загруженный файл
+        :param path: Путь к файлу страницы
+        :raises HTTPException: 413, если размер файла превышает допустимый
+        """
+        size = 0
+        await image.seek(0)
+        with open(path, "wb") as file:
+            while chunk := await image.read(settings.upload_chunk_size):
+                size += len(chunk)
+                if size > settings.max_upload_size:
+                    raise HTTPException(413, "File is too large")
+                await asyncio.to_thread(file.write, chunk)
+
+    async def _prune(self):
+        """
+        Удаляет завершенные задания старше времени хранения вместе с их каталогами
+        """
+        self._pruned_at = time.monotonic()
+        for job_id in await self.repository.prune(time.time() - self.retention):
+            await asyncio.to_thread(shutil.rmtree, self._job_dir(job_id), True)
+
+    def _queue_full(self) -> HTTPException:
+        """
+        Формирует ответ о заполненной очереди
+
+        :return: Ошибка 503 с заголовком Retry-After
+        """
+        return HTTPException(
+            503,
+            "Recognition queue is full",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def _job_dir(self, job_id: str) -> str:
+        """
+        Возвращает каталог страниц задания
+
+        :param job_id: ID задания
+        :return: Путь к каталогу
+        """
+        return os.path.join(self.storage_dir, job_id)
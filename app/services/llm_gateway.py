@@ -0,0 +1,219 @@
+import asyncio
+import random
+from typing import AsyncIterator, Optional
+import httpx
+from groq import AsyncGroq, APIConnectionError, APIStatusError
+
+from app.utils.llm_cache import LLMCache
+from app.utils.metrics import metrics
+
+# коды ответа, после которых запрос к LLM имеет смысл повторить
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+class LLMEmptyResponseError(Exception):
+    """
+    LLM завершила ответ без текста (например, сработал фильтр содержимого или был запрошен вызов инструмента)
+    """
+
+class LLMGateway:
+    """
+    Общая точка доступа к Groq для всех сервисов: один долгоживущий асинхронный клиент
+    с пулом keep-alive соединений, ограничением числа одновременных запросов, повторами
+    с экспоненциальной задержкой и кэшем ответов
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            base_url: Optional[str] = None,
+            cache: Optional[LLMCache] = None,
+            max_concurrency: int = 8,
+            max_connections: int = 16,
+            max_retries: int = 3,
+            timeout: float = 60.0,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0
+    ):
+        """
+        Инициализирует клиента Groq
+
+        :param api_key: Ключ API для аутентификации в Groq
+        :param base_url: Адрес API (None - адрес Groq по умолчанию, например, для заглушки в тестах)
+        :param cache: Кэш ответов LLM (если не задан, ответы не кэшируются)
+        :param max_concurrency: Максимальное количество одновременных запросов к LLM
+        :param max_connections: Размер пула HTTP-соединений
+        :param max_retries: Количество повторов при временных ошибках
+        :param timeout: Время ожидания одного запроса в секундах
+        :param backoff_base: Начальная задержка перед повтором в секундах
+        :param backoff_max: Максимальная задержка перед повтором в секундах
+        """
+        self.cache = cache
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+        )
+
+    async def complete(self, content: str, model: str, refresh: bool = False) -> str:
+        """
+        Выполняет запрос к LLM, используя кэш ответов
+
+        :param content: Текст запроса
+        :param model: LLM модель
+        :param refresh: Получить новый ответ, не используя сохраненный
+        :return: Текст ответа LLM
+        """
+        if self.cache is None:
+            return await self._request(content, model)
+        return await self.cache.get_or_create(
+            model, content, lambda: self._request(content, model), bypass=refresh
+        )
+
+    async def stream(self, content: str, model: str, refresh: bool = False) -> AsyncIterator[str]:
+        """
+        Выполняет запрос к LLM, передавая ответ по частям по мере генерации.
+        Сохраненный в кэше ответ возвращается одной частью, полученный ответ сохраняется в кэш.
+        В отличие от complete, одинаковые потоковые запросы не объединяются: присоединившийся клиент
+        получил бы весь ответ только после его завершения, то есть без преимущества потоковой передачи
+
+        :param content: Текст запроса
+        :param model: LLM модель
+        :param refresh: Получить новый ответ, не используя сохраненный
+        :return: Асинхронный итератор частей ответа
+        :raises LLMEmptyResponseError: Если ответ не содержит текста (такой ответ не кэшируется)
+        """
+        if self.cache is not None and not refresh:
+            response = await self.cache.get(model, content)
+            if response is not None:
+                yield response
+                return
+
+        parts = []
+        async for token in self._request_stream(content, model):
+            parts.append(token)
+            yield token
+        if not parts:
+            raise LLMEmptyResponseError("LLM returned no text")
+        if self.cache is not None:
+            await self.cache.put(model, content, "".join(parts))
+
+    async def _request_stream(self, content: str, model: str) -> AsyncIterator[str]:
+        """
+        Выполняет потоковый запрос к LLM; повторы возможны только до получения первой части ответа
+
+        :param content: Текст запроса
+        :param model: LLM модель
+        :return: Асинхронный итератор частей ответа
+        """
+        attempt = 0
+        while True:
+            async with self.slots:
+                try:
+                    stream = await self.client.chat.completions.create(
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": content
+                            }
+                        ],
+                        model=model,
+                        temperature=0.0,
+                        timeout=self.timeout,
+                        stream=True
+                    )
+                except (APIConnectionError, APIStatusError) as e:
+                    if attempt >= self.max_retries or not self._is_retryable(e):
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                else:
+                    try:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await stream.close()
+                    return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _request(self, content: str, model: str) -> str:
+        """
+        Выполняет запрос к LLM с повторами при превышении лимитов и временных ошибках
+
+        :param content: Текст запроса
+        :param model: LLM модель
+        :return: Текст ответа LLM
+        :raises LLMEmptyResponseError: Если ответ не содержит текста (такой ответ не кэшируется)
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.slots:
+                    with metrics.stage("llm_request"):
+                        chat_completion = await self.client.chat.completions.create(
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": content
+                                }
+                            ],
+                            model=model,
+                            temperature=0.0,
+                            timeout=self.timeout
+                        )
+                choice = chat_completion.choices[0]
+                if choice.message.content is None:
+                    raise LLMEmptyResponseError(f"LLM returned no text (finish_reason: {choice.finish_reason})")
+                return choice.message.content
+            except (APIConnectionError, APIStatusError) as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """
+        Проверяет, имеет ли смысл повторить запрос после ошибки
+
+        :param error: Ошибка запроса
+        :return: True для ошибок соединения, превышения лимитов и ошибок сервера
+        """
+        if isinstance(error, APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+        return True
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Вычисляет задержку перед повтором: значение заголовка retry-after, если сервер его вернул,
+        иначе экспоненциальная задержка со случайным разбросом
+
+        :param error: Ошибка запроса
+        :param attempt: Номер попытки (начиная с 0)
+        :return: Задержка в секундах
+        """
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after is not None:
+                try:
+                    return min(max(float(retry_after), 0.0), self.backoff_max)
+                except ValueError:
+                    pass
+        delay = min(self.backoff_base * 2 ** attempt, self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def close(self):
+        """
+        Закрывает клиента и его пул соединений
+        """
+        await self.client.close()
@@ -1,55 +1,251 @@
+import asyncio
+import hashlib
+import time
 from datetime import datetime
-from fastapi import UploadFile
-from typing import Tuple, List
-from PIL import Image
-from io import BytesIO
-from app.utils.image_processing import preprocess_image
-from app.utils.paddle_ocr import process_ocr
+from fastapi import UploadFile, HTTPException
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple, List, Optional, Union
+from app.core.config import settings
 from app.services.s3_service import S3Service
+from app.utils.metrics import metrics
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_executor import OCRExecutor
+
+class UploadTee:
+    """
+    Однократное чтение загруженного файла частями: каждая часть сразу передается в S3
+    и дописывается в общий буфер, из которого затем выполняется OCR
+    """
+
+    def __init__(self, image: UploadFile, chunk_size: int, max_size: int):
+        """
+        Инициализирует чтение загруженного файла
+
+        :param image: Загруженный файл
+        :param chunk_size: Размер читаемой части
+        :param max_size: Максимально допустимый размер файла
+        """
+        self.image = image
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.contents = bytearray()
+        self.digest = hashlib.sha256()
+        self.read_seconds = 0.0
+        self.error: Optional[HTTPException] = None
+        self._complete = False
+        self._finished = asyncio.Event()
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """
+        Читает файл частями, накапливая их в буфере и вычисляя хеш содержимого
+
+        :return: Асинхронный итератор частей файла
+        :raises HTTPException: Если размер файла превышает допустимый
+        """
+        try:
+            await self.image.seek(0)
+            while True:
+                start = time.perf_counter()
+                chunk = await self.image.read(self.chunk_size)
+                self.read_seconds += time.perf_counter() - start
+                if not chunk:
+                    break
+                if len(self.contents) + len(chunk) > self.max_size:
+                    self.error = HTTPException(413, "File is too large")
+                    raise self.error
+                self.contents += chunk
+                self.digest.update(chunk)
+                yield chunk
+            self._complete = True
+            metrics.observe("upload_read", self.read_seconds)
+            metrics.add_bytes("upload_read", len(self.contents))
+        finally:
+            self._finished.set()
+
+    def close(self):
+        """
+        Завершает ожидание буфера, если чтение было прервано
+        """
+        self._finished.set()
+
+    async def read(self) -> bytearray:
+        """
+        Ожидает окончания чтения файла
+
+        :return: Содержимое файла
+        :raises HTTPException: Если размер файла превышает допустимый
+        :raises RuntimeError: Если чтение было прервано
+        """
+        await self._finished.wait()
+        if self.error is not None:
+            raise self.error
+        if not self._complete:
+            raise RuntimeError("Upload reading was interrupted")
+        return self.contents
 
 async def handle_ocr_image(
         image: UploadFile,
         s3_service: S3Service,
+        ocr_executor: OCRExecutor,
+        ocr_cache: OCRCache,
         check_date: datetime,
         student_id: int,
         work_code: int,
         assignment_id: int,
-        file_index: int
+        file_index: int,
+        on_recognized: Optional[Callable[[Optional[List[str]]], None]] = None,
+        segmentation: Optional[bool] = None
 ) -> Tuple[List[str], str]:
     """
     Обрабатывает изображение: сохраняет в S3, выполняет OCR и возвращает распознанный текст
 
     :param image: Загруженный файл
     :param s3_service: Экземпляр сервиса для работы с S3
-    :param file_obj: Файл в памяти в формате BytesIO
+    :param ocr_executor: Пул процессов, выполняющий предобработку и OCR
+    :param ocr_cache: Кэш результатов распознавания
     :param check_date: Дата проверки работы
     :param student_id: ID студента
     :param work_code: Код работы
     :param assignment_id: ID задания
     :param file_index: Порядковый номер изображения
+    :param on_recognized: Функция, вызываемая сразу после распознавания, не дожидаясь окончания загрузки в S3
+        (получает список строк или None, если распознать изображение не удалось)
+    :param segmentation: Выделять строки по проекции без модели детекции (None - значение из настроек пула)
     :return: Кортеж из списка распознанных строк и S3-пути к файлу
     """
-    contents = await image.read()
-    original_stream = BytesIO(contents)
-
-    original_stream.seek(0)
-    object_key = await s3_service.upload_student_file(
-        file_obj=original_stream,
-        check_date=check_date,
-        student_id=student_id,
-        work_code=work_code,
-        assignment_id=assignment_id,
-        file_name=f"sample{file_index}.png"
-    )
+    segmentation = ocr_executor.segmentation if segmentation is None else segmentation
+    tee = UploadTee(image, chunk_size=settings.upload_chunk_size, max_size=settings.max_upload_size)
 
-    original_stream.seek(0)
-    image_pil = Image.open(original_stream)
-    preprocessed_image = preprocess_image(image_pil)
+    async def upload() -> str:
+        try:
+            with metrics.stage("upload"):
+                return await s3_service.upload_student_stream(
+                    chunks=tee.chunks(),
+                    part_size=settings.s3_multipart_part_size,
+                    threshold=settings.s3_multipart_threshold,
+                    check_date=check_date,
+                    student_id=student_id,
+                    work_code=work_code,
+                    assignment_id=assignment_id,
+                    file_name=f"sample{file_index}.png",
+                    # тело запроса в S3 берется из буфера, в котором файл уже хранится для OCR
+                    buffer=tee.contents
+                )
+        finally:
+            tee.close()
 
-    ocr_results = process_ocr(preprocessed_image)
-    image_result = [line[1][0] for res in ocr_results for line in res]
+    async def recognize() -> List[str]:
+        result = None
+        try:
+            contents = await tee.read()
+            # при попадании в кэш предобработка и OCR не выполняются, загрузка в S3 выполняется всегда
+            cache_key = ocr_cache.make_key(tee.digest.hexdigest(), segmentation)
+            with metrics.stage("ocr_cache"):
+                result = await ocr_cache.get(cache_key)
+            if result is None:
+                with metrics.stage("ocr"):
+                    result = await ocr_executor.recognize(contents, segmentation)
+                await ocr_cache.put(cache_key, result)
+            return result
+        finally:
+            if on_recognized is not None:
+                on_recognized(result)
 
-    image_pil.close()
-    original_stream.close()
+    # загрузка в S3 идет по мере чтения файла, распознавание начинается сразу после окончания чтения
+    object_key, image_result = await asyncio.gather(upload(), recognize())
 
     return image_result, object_key
+
+async def handle_ocr_images(
+        images: List[UploadFile],
+        s3_service: S3Service,
+        ocr_executor: OCRExecutor,
+        ocr_cache: OCRCache,
+        check_date: datetime,
+        student_id: int,
+        work_code: int,
+        assignment_id: int,
+        concurrency: int,
+        on_page_done: Optional[Callable[[], Awaitable[None]]] = None,
+        on_page_recognized: Optional[Callable[[int, Optional[List[str]]], None]] = None,
+        segmentation: Optional[bool] = None
+) -> List[Union[Tuple[List[str], str], Exception]]:
+    """
+    Обрабатывает страницы работы параллельно (не более concurrency одновременно)
+
+    :param images: Список загруженных изображений
+    :param s3_service: Экземпляр сервиса для работы с S3
+    :param ocr_executor: Пул процессов, выполняющий предобработку и OCR
+    :param ocr_cache: Кэш результатов распознавания
+    :param check_date: Дата проверки работы
+    :param student_id: ID студента
+    :param work_code: Код работы
+    :param assignment_id: ID задания
+    :param concurrency: Максимальное количество одновременно обрабатываемых страниц
+    :param on_page_done: Функция, вызываемая после обработки каждой страницы (например, для учета прогресса)
+    :param on_page_recognized: Функция, вызываемая после распознавания каждой страницы с ее номером
+        и списком строк (None при ошибке), не дожидаясь окончания загрузки в S3
+    :param segmentation: Выделять строки по проекции без модели детекции (None - значение из настроек пула)
+    :return: Результаты handle_ocr_image или исключения в исходном порядке страниц
+    :raises HTTPException: Если страница отклонена (например, 413 - файл слишком большой)
+    """
+    page_slots = asyncio.Semaphore(concurrency)
+
+    async def recognize_page(image: UploadFile, file_index: int) -> Tuple[List[str], str]:
+        async with page_slots:
+            try:
+                return await handle_ocr_image(
+                    image=image,
+                    s3_service=s3_service,
+                    ocr_executor=ocr_executor,
+                    ocr_cache=ocr_cache,
+                    check_date=check_date,
+                    student_id=student_id,
+                    work_code=work_code,
+                    assignment_id=assignment_id,
+                    file_index=file_index,
+                    on_recognized=(
+                        (lambda lines: on_page_recognized(file_index, lines)) if on_page_recognized else None
+                    ),
+                    segmentation=segmentation
+                )
+            finally:
+                if on_page_done is not None:
+                    await on_page_done()
+
+    outcomes = await asyncio.gather(
+        *(recognize_page(image, file_index) for file_index, image in enumerate(images, start=1)),
+        return_exceptions=True
+    )
+    # ошибка запроса (а не обработки страницы) возвращается клиенту с исходным кодом
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            raise outcome
+    return outcomes
+
+def collect_page_results(outcomes: List[Union[Tuple[List[str], str], Exception]]) -> Dict[str, Any]:
+    """
+    Собирает ответ по результатам обработки страниц
+
+    :param outcomes: Результаты handle_ocr_images
+    :return: Список результатов распознавания (по странице на изображение), путь работы в хранилище
+        (None, если не обработана ни одна страница) и список ошибок по страницам
+    """
+    results = []
+    errors = []
+    work_url = None
+    for file_index, outcome in enumerate(outcomes, start=1):
+        if isinstance(outcome, Exception):
+            results.append([])
+            errors.append({
+                "file_index": file_index,
+                "error": f"{type(outcome).__name__}: {str(outcome)}"
+            })
+            continue
+        image_result, work_url = outcome
+        results.append(image_result)
+
+    return {
+        "results": results,
+        "work_url": work_url,
+        "errors": errors
+    }
@@ -1,57 +1,141 @@
+import asyncio
 from fastapi import HTTPException
-from typing import Dict, Any
-from groq import Groq
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from app.utils.text_postprocessing import postprocess_text
+from app.core.config import settings
+from app.services.llm_gateway import LLMGateway
+from app.utils.metrics import metrics
+from app.utils.text_postprocessing import (
+    postprocess_text, CodeFieldExtractor, CODE_FIELD_MARKER, estimate_tokens, split_code_chunks
+)
 
 class PostProcessService:
     """
     Сервис для обработки текста с использованием LLM
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, gateway: LLMGateway, chunk_tokens: Optional[int] = None):
         """
         Инициализирует сервис для обработки текста
 
-        :param api_key: Ключ API для аутентификации в Groq
+        :param gateway: Общий клиент LLM
+        :param chunk_tokens: Оценка размера кода в токенах, начиная с которой код обрабатывается частями
+            параллельно (None - значение из настроек, 0 - всегда одним запросом, по умолчанию)
         """
-        self.api_key = api_key
+        self.gateway = gateway
+        self.chunk_tokens = settings.postprocess_chunk_tokens if chunk_tokens is None else chunk_tokens
 
-    def postprocess_text(
+    @staticmethod
+    def _build_prompt(recognized_code: str, part: Optional[Tuple[int, int]] = None) -> str:
+        """
+        Формирует запрос к LLM для постобработки распознанного кода
+
+        :param recognized_code: Распознанный код
+        :param part: Номер части и количество частей, если код обрабатывается частями
+        :return: Текст запроса
+        """
+        fragment = "" if part is None else \
+            f"This is part {part[0]} of {part[1]} of a longer program, so it may start or end " \
+            "inside a block: do NOT add or remove braces to balance it. "
+        return "There is handwritten C# code that was put into OCR system. " \
+               f"{fragment}" \
+               "Postprocess it without adding any new lines or words, " \
+               "correct OCR errors to make the names logical and the code real, " \
+               "correct the code formatting according to C#, including braces, " \
+               "do not miss any lines given, include everything, but do NOT add " \
+               "anything extra, that is not written in the code given, " \
+               "do not explain anything: " \
+               f"{recognized_code} " \
+               "In the answer mark with the word /ocr_code_field at/ the beginning and at " \
+               "the end where the code is typed."
+
+    async def postprocess_text(
             self,
             data: Dict[str, Any],
-            model: str = "llama3-70b-8192"
+            model: str = "llama3-70b-8192",
+            refresh: bool = False
     ):
         """
         Обрабатывает результат распознавания рукописного кода с помощью LLM
 
         :param data: json, содержащий распознанный код
         :param model: LLM модель (llama3-70b-8192)
+        :param refresh: Получить новый ответ LLM, не используя кэш
         :return: Обработанный текст + путь к работе
         """
-        client = Groq(api_key=self.api_key)
         recognized_code, work_url = postprocess_text(data)
-        content = "There is handwritten C# code that was put into OCR system. " \
-                  "Postprocess it without adding any new lines or words, " \
-                  "correct OCR errors to make the names logical and the code real, " \
-                  "correct the code formatting according to C#, including braces, " \
-                  "do not miss any lines given, include everything, but do NOT add " \
-                  "anything extra, that is not written in the code given, " \
-                  "do not explain anything: " \
-                  f"{recognized_code} " \
-                  "In the answer mark with the word /ocr_code_field at/ the beginning and at " \
-                  "the end where the code is typed."
+        prompts = self._build_prompts(data, recognized_code)
         try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ],
-                model=model,
-                temperature=0.0
-            )
-            return chat_completion.choices[0].message.content.split("ocr_code_field")[1], work_url
+            with metrics.stage("llm_postprocess"):
+                # части обрабатываются параллельно и собираются в исходном порядке
+                responses = await asyncio.gather(
+                    *(self.gateway.complete(content, model, refresh) for content in prompts)
+                )
+            pieces = [response.split(CODE_FIELD_MARKER)[1] for response in responses]
+            # на стыках частей лишние переводы строк отбрасываются
+            pieces = [piece.rstrip("\n") for piece in pieces[:-1]] + pieces[-1:]
+            return "\n".join(pieces[:1] + [piece.lstrip("\n") for piece in pieces[1:]]), work_url
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"AI service error: {e}")
+
+    def postprocess_text_stream(
+            self,
+            data: Dict[str, Any],
+            model: str = "llama3-70b-8192",
+            refresh: bool = False
+    ) -> Tuple[AsyncIterator[str], str]:
+        """
+        Обрабатывает результат распознавания рукописного кода с помощью LLM, передавая
+        обработанный код по частям по мере генерации
+
+        :param data: json, содержащий распознанный код
+        :param model: LLM модель (llama3-70b-8192)
+        :param refresh: Получить новый ответ LLM, не используя кэш
+        :return: Асинхронный итератор частей обработанного кода + путь к работе
+        """
+        recognized_code, work_url = postprocess_text(data)
+        prompts = self._build_prompts(data, recognized_code)
+
+        async def code_parts() -> AsyncIterator[str]:
+            # первая часть передается по мере генерации, остальные обрабатываются параллельно с ней
+            rest = [asyncio.ensure_future(self.gateway.complete(content, model, refresh)) for content in prompts[1:]]
+            try:
+                extractor = CodeFieldExtractor()
+                # переводы строк в конце части задерживаются: при сборке частей они отбрасываются
+                held = ""
+                with metrics.stage("llm_postprocess_stream"):
+                    async for token in self.gateway.stream(prompts[0], model, refresh):
+                        code = held + extractor.feed(token)
+                        if rest:
+                            code, held = code.rstrip("\n"), code[len(code.rstrip("\n")):]
+                        if code:
+                            yield code
+                    code = held + extractor.finish()
+                    if rest:
+                        code = code.rstrip("\n")
+                    if code:
+                        yield code
+                    for index, task in enumerate(rest, start=1):
+                        code = (await task).split(CODE_FIELD_MARKER)[1].lstrip("\n")
+                        yield "\n" + (code if index == len(rest) else code.rstrip("\n"))
+            finally:
+                for task in rest:
+                    task.cancel()
+
+        return code_parts(), work_url
+
+    def _build_prompts(self, data: Dict[str, Any], recognized_code: str) -> List[str]:
+        """
+        Формирует запросы к LLM: один для короткого кода, по одному на часть для длинного
+
+        :param data: json, содержащий распознанный код
+        :param recognized_code: Распознанный код одной строкой
+        :return: Список запросов в порядке частей кода
+        """
+        if not self.chunk_tokens or estimate_tokens(recognized_code) <= self.chunk_tokens:
+            return [self._build_prompt(recognized_code)]
+        chunks = split_code_chunks(data["results"], self.chunk_tokens)
+        # код, который не удалось разделить (например, одна очень длинная строка), обрабатывается как обычно
+        if len(chunks) == 1:
+            return [self._build_prompt(recognized_code)]
+        return [self._build_prompt(chunk, (index, len(chunks))) for index, chunk in enumerate(chunks, start=1)]
@@ -1,5 +1,6 @@
 import datetime
 from io import BytesIO
+from typing import AsyncIterator, Optional
 from app.repositories.s3_repository import S3Repository
 
 class S3Service:
@@ -14,6 +15,24 @@ class S3Service:
         """
         self.repository = repository
 
+    @staticmethod
+    def get_folder_path(
+            check_date: datetime,
+            student_id: int,
+            work_code: int,
+            assignment_id: int
+    ) -> str:
+        """
+        Формирует путь до папки работы студента в S3
+
+        :param check_date: Дата проверки работы
+        :param student_id: ID студента
+        :param work_code: Код работы
+        :param assignment_id: ID задания
+        :return: Путь до папки (S3-директории)
+        """
+        return f"{check_date}/student_{student_id}/work_code_{work_code}/assignment_{assignment_id}"
+
     async def upload_student_file(
             self,
             file_obj: BytesIO,
@@ -34,11 +53,42 @@ class S3Service:
         :param file_name: Имя файла (например, "sample1.png")
         :return: Путь до папки (S3-директории), куда был загружен файл
         """
-        folder_path = f"{check_date}/student_{student_id}/work_code_{work_code}/assignment_{assignment_id}"
+        folder_path = self.get_folder_path(check_date, student_id, work_code, assignment_id)
         object_key = f"{folder_path}/{file_name}"
         await self.repository.upload_file(file_obj, object_key)
         return folder_path
 
+    async def upload_student_stream(
+            self,
+            chunks: AsyncIterator[bytes],
+            part_size: int,
+            threshold: int,
+            check_date: datetime,
+            student_id: int,
+            work_code: int,
+            assignment_id: int,
+            file_name: str,
+            buffer: Optional[bytearray] = None
+    ):
+        """
+        Загружает файл студента в S3 по сформированному пути, передавая его частями по мере чтения
+
+        :param chunks: Асинхронный итератор частей файла
+        :param part_size: Размер части multipart upload
+        :param threshold: Размер файла, начиная с которого используется multipart upload
+        :param check_date: Дата проверки работы
+        :param student_id: ID студента
+        :param work_code: Код работы
+        :param assignment_id: ID задания
+        :param file_name: Имя файла (например, "sample1.png")
+        :param buffer: Буфер, в который источник дописывает прочитанные части (загрузка без копии файла)
+        :return: Путь до папки (S3-директории), куда был загружен файл
+        """
+        folder_path = self.get_folder_path(check_date, student_id, work_code, assignment_id)
+        object_key = f"{folder_path}/{file_name}"
+        await self.repository.upload_stream(chunks, object_key, part_size, threshold, buffer)
+        return folder_path
+
     def get_files_urls(
             self,
             file_num: int,
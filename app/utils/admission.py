@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque
+from app.utils.metrics import metrics
+
+class AdmissionRejected(Exception):
+    """
+    Запрос не допущен к обработке: все места заняты и очередь ожидания заполнена
+    или время ожидания истекло
+    """
+
+    def __init__(self, route: str, reason: str):
+        """
+        :param route: Путь обработчика
+        :param reason: Причина: queue_full или timeout
+        """
+        super().__init__(f"Request to {route} was shed: {reason}")
+        self.route = route
+        self.reason = reason
+
+class AdmissionController:
+    """
+    Контроль допуска запросов к обработчику: ограничивает количество одновременно выполняемых запросов,
+    остальные ожидают в ограниченной очереди в порядке поступления. Запросы сверх очереди и запросы,
+    не дождавшиеся места за max_wait, отклоняются сразу, а не накапливаются
+    """
+
+    def __init__(self, route: str, concurrency: int, queue_size: int, max_wait: float):
+        """
+        Инициализирует контроль допуска
+
+        :param route: Путь обработчика (метка в метриках)
+        :param concurrency: Максимальное количество одновременно выполняемых запросов
+        :param queue_size: Максимальное количество запросов, ожидающих допуска
+        :param max_wait: Максимальное время ожидания допуска в секундах
+        """
+        self.route = route
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._report()
+
+    def _report(self):
+        """
+        Передает текущее состояние в метрики
+        """
+        metrics.set_admission(self.route, self.in_flight, len(self._waiters))
+
+    def _reject(self, reason: str):
+        """
+        Учитывает отклоненный запрос
+
+        :param reason: Причина отклонения
+        :raises AdmissionRejected: Всегда
+        """
+        metrics.add_shed(self.route, reason)
+        raise AdmissionRejected(self.route, reason)
+
+    async def _acquire(self):
+        """
+        Занимает место для запроса, при необходимости ожидая в очереди
+
+        :raises AdmissionRejected: Если очередь заполнена или время ожидания истекло
+        """
+        # пока есть ожидающие, новые запросы встают в очередь за ними, даже если место освободилось
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self._report()
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report()
+        start = time.perf_counter()
+        try:
+            # место передается ожидающему при освобождении (in_flight не меняется)
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._reject("timeout")
+        except asyncio.CancelledError:
+            # клиент отключился, но место уже могло быть передано этому запросу
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._report()
+            metrics.observe("admission_wait", time.perf_counter() - start)
+
+    def _release(self):
+        """
+        Освобождает место: передает его первому ожидающему запросу или уменьшает количество выполняемых
+        """
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._report()
+                return
+        self.in_flight -= 1
+        self._report()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Выполняет блок кода, заняв место для запроса
+
+        :raises AdmissionRejected: Если запрос отклонен
+        """
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
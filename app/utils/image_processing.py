@@ -1,32 +1,193 @@
-from PIL import Image, ImageEnhance, ImageFilter
 import cv2
 import numpy as np
 
-def preprocess_image(image_data: Image):
+# коэффициенты усиления яркости и контрастности
+BRIGHTNESS_FACTOR = 2.7
+CONTRAST_FACTOR = 100
+# порог бинаризации
+BINARY_THRESHOLD = 180
+# количество строк изображения, обрабатываемых за один проход фильтра резкости
+BAND_ROWS = 256
+
+# перевод в оттенки серого с фиксированной точкой, как в PIL (ITU-R 601-2), порядок каналов BGR
+_LUMA_WEIGHTS = (7471, 38470, 19595)
+_LUMA_ROUNDING = 0x8000
+# ядро ImageFilter.SHARPEN, умноженное на 8: (16 * c - сумма соседей) / 8
+_SHARPEN_KERNEL = np.array([[-1, -1, -1], [-1, 16, -1], [-1, -1, -1]], np.float32)
+_DILATE_KERNEL = np.ones((2, 2), np.uint8)
+
+def _build_brightness_lut() -> np.ndarray:
+    """
+    Таблица повышения яркости: значение умножается на коэффициент в float32 и отбрасывается
+    дробная часть (как в ImageEnhance.Brightness)
+
+    :return: Таблица из 256 значений uint8
+    """
+    values = np.float32(BRIGHTNESS_FACTOR) * np.arange(256, dtype=np.float32)
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+def _build_binary_lut() -> np.ndarray:
+    """
+    Таблица бинаризации оттенков серого: жёсткая контрастность 3 * (v - 128) + 128 в арифметике uint8
+    (с переполнением по модулю 256, как в исходной реализации), порог и инверсия
+
+    :return: Таблица из 256 значений uint8 (0 - текст, 255 - фон)
+    """
+    contrasted = (3 * np.arange(256)) % 256
+    return np.where(contrasted > BINARY_THRESHOLD, 255, 0).astype(np.uint8)
+
+_BRIGHTNESS_LUT = _build_brightness_lut()
+_BINARY_LUT = _build_binary_lut()
+# веса каналов после повышения яркости, округление добавлено к весу синего канала
+_BRIGHT_LUMA_LUTS = (
+    _LUMA_WEIGHTS[0] * _BRIGHTNESS_LUT.astype(np.int32) + _LUMA_ROUNDING,
+    _LUMA_WEIGHTS[1] * _BRIGHTNESS_LUT.astype(np.int32),
+    _LUMA_WEIGHTS[2] * _BRIGHTNESS_LUT.astype(np.int32),
+)
+
+def decode_image(contents: bytes, apply_orientation: bool = False) -> np.ndarray:
+    """
+    Декодирует изображение из байтов в массив BGR без промежуточных копий
+
+    :param contents: Изображение в виде байтов (JPG/PNG/BMP)
+    :param apply_orientation: Повернуть изображение согласно тегу EXIF Orientation
+    :return: Массив изображения (H, W, 3) в формате BGR
+    """
+    flags = cv2.IMREAD_COLOR if apply_orientation else cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), flags)
+    if image is None:
+        raise ValueError("Cannot decode image")
+    return image
+
+class ImagePreprocessor:
+    """
+    Предобработка изображения перед передачей в OCR за минимальное число проходов по пикселям.
+    Результат попиксельно совпадает с последовательностью Brightness -> Contrast -> SHARPEN -> L ->
+    бинаризация -> дилатация -> инверсия на PIL/OpenCV
+
+    Промежуточные буферы переиспользуются между вызовами, поэтому экземпляр не потокобезопасен
+    """
+
+    def __init__(self, band_rows: int = BAND_ROWS):
+        """
+        Инициализирует обработчик
+
+        :param band_rows: Количество строк изображения, обрабатываемых за один проход
+        """
+        self.band_rows = band_rows
+        self._buffers = {}
+
+    def _buffer(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        """
+        Возвращает промежуточный буфер нужной формы, выделяя память только при нехватке размера
+
+        :param name: Имя буфера
+        :param shape: Требуемая форма
+        :param dtype: Тип элементов
+        :return: Непрерывный массив требуемой формы
+        """
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = np.empty(size, dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def _contrast_mean(self, image: np.ndarray) -> int:
+        """
+        Вычисляет среднюю яркость изображения в оттенках серого после повышения яркости
+        (опорное значение ImageEnhance.Contrast), не сохраняя осветлённое изображение
+
+        :param image: Массив изображения BGR
+        :return: Округлённое среднее значение
+        """
+        width = image.shape[1]
+        histogram = np.zeros(256, np.int64)
+        for y0 in range(0, image.shape[0], self.band_rows):
+            band = image[y0:y0 + self.band_rows]
+            acc = self._buffer("acc", band.shape[:2], np.int32)
+            tmp = self._buffer("tmp", band.shape[:2], np.int32)
+            np.take(_BRIGHT_LUMA_LUTS[0], band[..., 0], out=acc, mode="clip")
+            for channel in (1, 2):
+                np.take(_BRIGHT_LUMA_LUTS[channel], band[..., channel], out=tmp, mode="clip")
+                np.add(acc, tmp, out=acc)
+            np.right_shift(acc, 16, out=acc)
+            histogram += np.bincount(acc.reshape(-1), minlength=256)
+
+        # тот же порядок вычислений, что и в ImageStat.Stat.mean
+        total = 0.0
+        for value in range(256):
+            total += int(histogram[value]) * value
+        return int(total / (image.shape[0] * width) + 0.5)
+
+    def _binarize_band(self, rows: np.ndarray, out: np.ndarray):
+        """
+        Переводит полосу изображения в оттенки серого и бинаризует её
+
+        :param rows: Полоса изображения BGR (значения 0..255)
+        :param out: Полоса выходного изображения
+        """
+        acc = self._buffer("acc", rows.shape[:2], np.int32)
+        tmp = self._buffer("tmp", rows.shape[:2], np.int32)
+        np.multiply(rows[..., 0], _LUMA_WEIGHTS[0], out=acc, dtype=np.int32)
+        for channel in (1, 2):
+            np.multiply(rows[..., channel], _LUMA_WEIGHTS[channel], out=tmp, dtype=np.int32)
+            np.add(acc, tmp, out=acc)
+        np.add(acc, _LUMA_ROUNDING, out=acc)
+        np.right_shift(acc, 16, out=acc)
+        np.take(_BINARY_LUT, acc, out=out, mode="clip")
+
+    def run(self, image: np.ndarray) -> np.ndarray:
+        """
+        Предобработка изображения перед передачей в OCR
+
+        :param image: Массив изображения BGR (изменяется на месте)
+        :return: Бинаризованное изображение (H, W) в формате uint8
+        """
+        height, width = image.shape[:2]
+
+        # повышение яркости и контрастности одной таблицей
+        mean = self._contrast_mean(image)
+        contrast = np.clip(mean + CONTRAST_FACTOR * (np.arange(256) - mean), 0, 255).astype(np.uint8)
+        cv2.LUT(image, contrast[_BRIGHTNESS_LUT], dst=image)
+
+        # повышение резкости, перевод в оттенки серого и бинаризация полосами
+        final = np.empty((height, width), np.uint8)
+        sharpen = height >= 3 and width >= 3
+        for y0 in range(0, height, self.band_rows):
+            y1 = min(y0 + self.band_rows, height)
+            if not sharpen:
+                self._binarize_band(image[y0:y1], final[y0:y1])
+                continue
+
+            lo, hi = max(y0 - 1, 0), min(y1 + 1, height)
+            window = image[lo:hi]
+            sharp = self._buffer("sharp", window.shape, np.int16)
+            sharp = cv2.filter2D(window, cv2.CV_16S, _SHARPEN_KERNEL, dst=sharp, borderType=cv2.BORDER_REPLICATE)
+            rows = sharp[y0 - lo:y1 - lo]
+            # деление на 8 с округлением к ближайшему, как в ImageFilter.SHARPEN
+            np.add(rows, 4, out=rows)
+            np.right_shift(rows, 3, out=rows)
+            np.clip(rows, 0, 255, out=rows)
+            # крайние пиксели изображения фильтр резкости не изменяет
+            rows[:, 0] = image[y0:y1, 0]
+            rows[:, -1] = image[y0:y1, -1]
+            if y0 == 0:
+                rows[0] = image[0]
+            if y1 == height:
+                rows[-1] = image[height - 1]
+            self._binarize_band(rows, final[y0:y1])
+
+        # дилатация текста на инвертированном изображении равна эрозии фона на исходном
+        return cv2.erode(final, _DILATE_KERNEL, dst=final, iterations=1)
+
+_preprocessor = ImagePreprocessor()
+
+def preprocess_image(image_data: np.ndarray) -> np.ndarray:
     """
     Предобработка изображения перед передачей в OCR
 
-    :param image_data: Входное изображение
-    :return: Обработанное изображение в формате байтов
-    """
-    # повышение яркости
-    image = ImageEnhance.Brightness(image_data).enhance(2.7)
-    # повышение контрастности
-    image = ImageEnhance.Contrast(image).enhance(100)
-    # повышение резкости
-    image = image.filter(ImageFilter.SHARPEN)
-    # перевод в оттенки серого (Grayscale)
-    np_img = np.array(image.convert("L"))
-    # жёсткая контрастность для бинаризации
-    np_img = np.clip(3 * (np_img - 128) + 128, 0, 255).astype(np.uint8)
-    # бинаризация изображения (черно-белое)
-    _, binary = cv2.threshold(np_img, 180, 255, cv2.THRESH_BINARY_INV)
-    # дилатация - расширение белых участков изображения
-    kernel = np.ones((2, 2), np.uint8)
-    dilated = cv2.dilate(binary, kernel, iterations=1)
-    # инверсия цветов
-    final = cv2.bitwise_not(dilated)
-    # получение изображения в виде bytes
-    success, buffer = cv2.imencode(".png", final)
-    image_bytes = buffer.tobytes()
-    return image_bytes
+    :param image_data: Входное изображение в формате BGR (изменяется на месте)
+    :return: Обработанное изображение в виде массива, готовое для подачи в OCR
+    """
+    return _preprocessor.run(image_data)
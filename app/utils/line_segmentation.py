@@ -0,0 +1,154 @@
+from typing import List, Optional, Tuple
+import cv2
+import numpy as np
+
+# доля заполненной строки или столбца у края изображения, начиная с которой они считаются фоном вокруг листа
+MARGIN_FILL = 0.25
+# максимальное количество проходов обрезки фона
+MARGIN_PASSES = 4
+# доля заполненной строки или столбца листа, начиная с которой они считаются линией разлиновки
+RULE_FILL = 0.5
+# минимальная доля ширины листа, занятая текстом в строке изображения
+ROW_INK_FILL = 0.005
+# минимальная высота строки текста в пикселях
+MIN_LINE_HEIGHT = 8
+# строки ниже этой доли медианной высоты считаются шумом (точки, штрихи)
+MIN_LINE_RATIO = 0.3
+# строки выше этой доли медианной высоты означают слипшиеся или наклонные строки
+MAX_LINE_RATIO = 1.8
+# промежуток по вертикали меньше этой доли медианной высоты строку не разделяет
+MIN_GAP_RATIO = 0.1
+# промежуток по горизонтали больше этой доли высоты строки разделяет ее на отдельные фрагменты
+SEGMENT_GAP_RATIO = 2.0
+# максимальная доля текста на листе и максимальная доля высоты листа, занятая строками
+MAX_INK_FILL = 0.3
+MAX_LINES_FILL = 0.85
+# максимальный сдвиг центра текста правой половины строки относительно левой (доля медианной высоты строки):
+# больший сдвиг означает наклон страницы, при котором проекции строк перекрываются
+MAX_LINE_SLOPE = 0.25
+# максимальная доля текста в строке (темные углы фона, тени)
+MAX_LINE_FILL = 0.5
+# поля вокруг вырезаемой строки (доля высоты строки)
+LINE_PADDING = 0.25
+# связные области меньшей площади в пикселях считаются зерном, а не текстом
+MIN_COMPONENT_AREA = 12
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Находит непрерывные участки истинных значений
+
+    :param mask: Одномерный массив bool
+    :return: Массивы начал и концов (не включительно) участков
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+def _merge_runs(starts: np.ndarray, ends: np.ndarray, min_gap: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Объединяет участки, разделенные промежутком меньше заданного
+
+    :param starts: Начала участков
+    :param ends: Концы участков
+    :param min_gap: Минимальный промежуток между отдельными участками
+    :return: Начала и концы объединенных участков
+    """
+    keep = starts[1:] - ends[:-1] >= min_gap
+    return starts[np.concatenate(([True], keep))], ends[np.concatenate((keep, [True]))]
+
+def _line_is_straight(band: np.ndarray, max_shift: float) -> bool:
+    """
+    Проверяет, что строка горизонтальна: центры текста левой и правой половин находятся на одной высоте
+
+    :param band: Маска текста строки (h, w)
+    :param max_shift: Максимальный допустимый сдвиг центров в пикселях
+    :return: True, если строка не наклонена и не состоит из нескольких наклонных строк
+    """
+    columns = np.flatnonzero(band.any(axis=0))
+    middle = (columns[0] + columns[-1] + 1) // 2
+    rows = np.arange(band.shape[0])
+    left = band[:, :middle].sum(axis=1)
+    right = band[:, middle:].sum(axis=1)
+    if left.sum() == 0 or right.sum() == 0:
+        return True
+    return abs(rows @ left / left.sum() - rows @ right / right.sum()) <= max_shift
+
+def _page_bounds(ink: np.ndarray) -> Tuple[int, int, int, int]:
+    """
+    Обрезает с краев изображения строки и столбцы с большой долей темных пикселей (фон вокруг листа),
+    чередуя столбцы и строки, пока границы не перестанут меняться
+
+    :param ink: Маска текста (H, W)
+    :return: Границы листа (top, bottom, left, right), концы не включительно
+    """
+    top, bottom, left, right = 0, ink.shape[0], 0, ink.shape[1]
+    for _ in range(MARGIN_PASSES):
+        bounds = (top, bottom, left, right)
+        columns = np.flatnonzero(ink[top:bottom, left:right].mean(axis=0) < MARGIN_FILL)
+        if len(columns) == 0:
+            break
+        left, right = left + columns[0], left + columns[-1] + 1
+        rows = np.flatnonzero(ink[top:bottom, left:right].mean(axis=1) < MARGIN_FILL)
+        if len(rows) == 0:
+            break
+        top, bottom = top + rows[0], top + rows[-1] + 1
+        if (top, bottom, left, right) == bounds:
+            break
+    return top, bottom, left, right
+
+def segment_lines(binary_image: np.ndarray) -> Optional[List[np.ndarray]]:
+    """
+    Выделяет строки текста на бинаризованной странице по горизонтальной проекции (для тетрадных листов
+    в линейку или клетку) без модели детекции. Зерно исключается по площади связных областей,
+    фон вокруг листа и линии разлиновки - по заполненности строк и столбцов изображения
+
+    :param binary_image: Результат preprocess_image (H, W): 0 - текст, 255 - фон
+    :return: Изображения строк (BGR) в порядке чтения или None, если страница не подходит
+        для проекционной сегментации (наклон, слипшиеся строки, шум) и нужна модель детекции
+    """
+    full_ink = binary_image < 128
+    # лист и строки ищутся по маске без зерна, строки вырезаются из исходной
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(full_ink.view(np.uint8), connectivity=8)
+    components = stats[:, cv2.CC_STAT_AREA] >= MIN_COMPONENT_AREA
+    components[0] = False
+    full_clean = components[labels]
+    page_top, page_bottom, page_left, page_right = _page_bounds(full_clean)
+    # координаты строк отсчитываются от левого верхнего угла листа
+    ink = full_ink[page_top:page_bottom, page_left:page_right].copy()
+    clean = full_clean[page_top:page_bottom, page_left:page_right].copy()
+    height, width = ink.shape
+    if height < MIN_LINE_HEIGHT or width < MIN_LINE_HEIGHT or clean.mean() > MAX_INK_FILL:
+        return None
+    # вертикальные линии клетки, затем горизонтальные линии разлиновки
+    rule_columns = clean.mean(axis=0) >= RULE_FILL
+    ink[:, rule_columns] = clean[:, rule_columns] = False
+    rule_rows = clean.mean(axis=1) >= RULE_FILL
+    ink[rule_rows] = clean[rule_rows] = False
+
+    profile = np.convolve(clean.sum(axis=1), np.ones(3, np.int64), mode="same")
+    starts, ends = _runs(profile > max(ROW_INK_FILL * width, 2))
+    lines = ends - starts >= MIN_LINE_HEIGHT
+    if not lines.any():
+        return None
+    starts, ends = _merge_runs(starts[lines], ends[lines], MIN_GAP_RATIO * np.median(ends[lines] - starts[lines]))
+    median = np.median(ends - starts)
+    lines = ends - starts >= MIN_LINE_RATIO * median
+    starts, ends = starts[lines], ends[lines]
+    heights = ends - starts
+    if heights.max() > MAX_LINE_RATIO * median or heights.sum() > MAX_LINES_FILL * height:
+        return None
+
+    crops = []
+    for y0, y1 in zip(starts, ends):
+        band = clean[y0:y1]
+        if band.mean() > MAX_LINE_FILL or not _line_is_straight(band, MAX_LINE_SLOPE * median):
+            return None
+        line_height = y1 - y0
+        x_starts, x_ends = _runs(band.any(axis=0))
+        x_starts, x_ends = _merge_runs(x_starts, x_ends, SEGMENT_GAP_RATIO * line_height)
+        pad = int(LINE_PADDING * line_height)
+        top, bottom = max(y0 - pad, 0), min(y1 + pad, height)
+        for x0, x1 in zip(x_starts, x_ends):
+            left, right = max(x0 - pad, 0), min(x1 + pad, width)
+            crop = np.where(ink[top:bottom, left:right], np.uint8(0), np.uint8(255))
+            crops.append(cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR))
+    return crops
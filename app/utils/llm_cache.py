@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+class LLMCache:
+    """
+    Постоянный кэш ответов LLM по модели и тексту запроса (ответы детерминированы при temperature=0.0)
+    с ограничением времени жизни и суммарного размера. Одновременные одинаковые запросы объединяются
+    в один вызов LLM
+    """
+
+    def __init__(self, path: str, ttl: int, max_bytes: int):
+        """
+        Инициализирует кэш
+
+        :param path: Путь к файлу SQLite
+        :param ttl: Время жизни записи в секундах
+        :param max_bytes: Максимальный суммарный размер ответов
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_responses_accessed ON llm_responses (accessed)")
+        self._db.commit()
+        self.size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        """
+        Формирует ключ кэша
+
+        :param model: LLM модель
+        :param prompt: Текст запроса
+        :return: Ключ кэша
+        """
+        return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+    async def get(self, model: str, prompt: str) -> Optional[str]:
+        """
+        Возвращает сохраненный ответ
+
+        :param model: LLM модель
+        :param prompt: Текст запроса
+        :return: Ответ LLM или None, если ответа нет или он устарел
+        """
+        response = await asyncio.to_thread(self._locked, self._get, self.make_key(model, prompt))
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def put(self, model: str, prompt: str, response: str):
+        """
+        Сохраняет ответ
+
+        :param model: LLM модель
+        :param prompt: Текст запроса
+        :param response: Ответ LLM
+        """
+        await asyncio.to_thread(self._locked, self._put, self.make_key(model, prompt), response)
+
+    async def get_or_create(
+            self,
+            model: str,
+            prompt: str,
+            create: Callable[[], Awaitable[str]],
+            bypass: bool = False
+    ) -> str:
+        """
+        Возвращает сохраненный ответ или получает новый. Если такой же запрос уже выполняется,
+        ожидает его результат вместо повторного вызова LLM
+
+        :param model: LLM модель
+        :param prompt: Текст запроса
+        :param create: Функция, выполняющая запрос к LLM
+        :param bypass: Не использовать сохраненный ответ (новый ответ сохраняется в кэш)
+        :return: Ответ LLM
+        """
+        key = self.make_key(model, prompt)
+        if key not in self._inflight and not bypass:
+            response = await asyncio.to_thread(self._locked, self._get, key)
+            if response is not None:
+                self.hits += 1
+                return response
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._create(key, create))
+        else:
+            self.coalesced += 1
+        # отмена одного из ожидающих запросов не прерывает общий вызов LLM
+        return await asyncio.shield(task)
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        """
+        Получает новый ответ и сохраняет его в кэш
+
+        :param key: Ключ кэша
+        :param create: Функция, выполняющая запрос к LLM
+        :return: Ответ LLM
+        """
+        try:
+            response = await create()
+            await asyncio.to_thread(self._locked, self._put, key, response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает счетчики попаданий, промахов и объединенных запросов
+
+        :return: Словарь со статистикой кэша
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bytes": self.size,
+        }
+
+    def close(self):
+        """
+        Закрывает файл кэша
+        """
+        with self._lock:
+            self._db.close()
+
+    def _locked(self, method: Callable, *args):
+        """
+        Выполняет операцию с файлом кэша под блокировкой
+
+        :param method: Операция
+        :param args: Аргументы операции
+        :return: Результат операции
+        """
+        with self._lock:
+            return method(*args)
+
+    def _get(self, key: str) -> Optional[str]:
+        """
+        Читает неустаревший ответ и обновляет время последнего обращения
+
+        :param key: Ключ кэша
+        :return: Ответ LLM или None
+        """
+        now = time.time()
+        row = self._db.execute("SELECT response, created FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            self._delete(key)
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE llm_responses SET accessed = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return row[0]
+
+    def _put(self, key: str, response: str):
+        """
+        Сохраняет ответ и вытесняет наиболее давно использованные записи при превышении размера
+
+        :param key: Ключ кэша
+        :param response: Ответ LLM
+        """
+        now = time.time()
+        self._delete(key)
+        size = len(response.encode())
+        self._db.execute(
+            "INSERT INTO llm_responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, response, size, now, now)
+        )
+        self.size += size
+        for expired_key, in self._db.execute(
+                "SELECT key FROM llm_responses WHERE created < ?", (now - self.ttl,)
+        ).fetchall():
+            self._delete(expired_key)
+        while self.size > self.max_bytes:
+            row = self._db.execute("SELECT key FROM llm_responses ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._delete(row[0])
+        self._db.commit()
+
+    def _delete(self, key: str):
+        """
+        Удаляет запись
+
+        :param key: Ключ кэша
+        """
+        row = self._db.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self.size -= row[0]
@@ -0,0 +1,245 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# границы корзин гистограммы длительности этапов в секундах
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# этапы, выполненные при обработке текущего запроса (заполняется для заголовка Server-Timing)
+request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+class Histogram:
+    """
+    Гистограмма значений с фиксированными границами корзин
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        Инициализирует гистограмму
+
+        :param buckets: Верхние границы корзин по возрастанию
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Добавляет значение
+
+        :param value: Значение
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class Metrics:
+    """
+    Реестр метрик этапов обработки: гистограммы длительности, количество выполняемых операций,
+    ошибки и объем обработанных данных, а также состояние контроля допуска запросов.
+    Выводится в текстовом формате Prometheus
+    """
+
+    def __init__(self, prefix: str = "app", buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        """
+        Инициализирует реестр
+
+        :param prefix: Префикс имен метрик
+        :param buckets: Границы корзин гистограмм длительности в секундах
+        """
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Histogram] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._bytes: Dict[str, int] = {}
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        self._request_durations: Dict[Tuple[str, str], Histogram] = {}
+        self._admission: Dict[str, Tuple[int, int]] = {}
+        self._shed: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False, request: bool = True):
+        """
+        Записывает длительность этапа
+
+        :param stage: Название этапа
+        :param seconds: Длительность в секундах
+        :param error: Этап завершился ошибкой
+        :param request: Учесть этап в заголовке Server-Timing текущего запроса
+        """
+        with self._lock:
+            histogram = self._durations.get(stage)
+            if histogram is None:
+                histogram = self._durations[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+        timings = request_timings.get() if request else None
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    def add_bytes(self, stage: str, size: int):
+        """
+        Увеличивает объем данных, обработанных этапом
+
+        :param stage: Название этапа
+        :param size: Размер в байтах
+        """
+        with self._lock:
+            self._bytes[stage] = self._bytes.get(stage, 0) + size
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Измеряет длительность блока кода как этапа обработки (подходит и для блоков с await)
+
+        :param name: Название этапа
+        """
+        with self._lock:
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, error=error)
+            with self._lock:
+                self._in_flight[name] -= 1
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        """
+        Записывает обработанный HTTP-запрос
+
+        :param method: Метод запроса
+        :param route: Шаблон пути обработчика
+        :param status: Код ответа
+        :param seconds: Длительность обработки в секундах
+        """
+        with self._lock:
+            key = (method, route, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._request_durations.get((method, route))
+            if histogram is None:
+                histogram = self._request_durations[(method, route)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def set_admission(self, route: str, in_flight: int, queued: int):
+        """
+        Записывает текущее состояние контроля допуска обработчика
+
+        :param route: Путь обработчика
+        :param in_flight: Количество выполняемых запросов
+        :param queued: Количество запросов, ожидающих допуска
+        """
+        with self._lock:
+            self._admission[route] = (in_flight, queued)
+
+    def add_shed(self, route: str, reason: str):
+        """
+        Учитывает запрос, отклоненный контролем допуска
+
+        :param route: Путь обработчика
+        :param reason: Причина: queue_full - очередь заполнена, timeout - истекло время ожидания
+        """
+        with self._lock:
+            key = (route, reason)
+            self._shed[key] = self._shed.get(key, 0) + 1
+
+    def render(self) -> str:
+        """
+        Формирует текст метрик в формате Prometheus
+
+        :return: Текст метрик
+        """
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines += [f"# HELP {p}_stage_duration_seconds Duration of processing stages",
+                      f"# TYPE {p}_stage_duration_seconds histogram"]
+            for stage, histogram in sorted(self._durations.items()):
+                lines += self._render_histogram(f"{p}_stage_duration_seconds", f'stage="{stage}"', histogram)
+            lines += [f"# HELP {p}_stage_in_flight Processing stages currently running",
+                      f"# TYPE {p}_stage_in_flight gauge"]
+            lines += [f'{p}_stage_in_flight{{stage="{stage}"}} {value}' for stage, value in sorted(self._in_flight.items())]
+            lines += [f"# HELP {p}_stage_errors_total Processing stages that raised an error",
+                      f"# TYPE {p}_stage_errors_total counter"]
+            lines += [f'{p}_stage_errors_total{{stage="{stage}"}} {value}' for stage, value in sorted(self._errors.items())]
+            lines += [f"# HELP {p}_stage_bytes_total Bytes processed by stages",
+                      f"# TYPE {p}_stage_bytes_total counter"]
+            lines += [f'{p}_stage_bytes_total{{stage="{stage}"}} {value}' for stage, value in sorted(self._bytes.items())]
+            lines += [f"# HELP {p}_http_requests_total HTTP requests by route and status",
+                      f"# TYPE {p}_http_requests_total counter"]
+            lines += [
+                f'{p}_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {value}'
+                for (method, route, status), value in sorted(self._requests.items())
+            ]
+            lines += [f"# HELP {p}_http_request_duration_seconds HTTP request duration by route",
+                      f"# TYPE {p}_http_request_duration_seconds histogram"]
+            for (method, route), histogram in sorted(self._request_durations.items()):
+                lines += self._render_histogram(
+                    f"{p}_http_request_duration_seconds", f'method="{method}",route="{route}"', histogram
+                )
+            lines += [f"# HELP {p}_admission_in_flight Requests admitted and running by route",
+                      f"# TYPE {p}_admission_in_flight gauge"]
+            lines += [f'{p}_admission_in_flight{{route="{route}"}} {value[0]}' for route, value in sorted(self._admission.items())]
+            lines += [f"# HELP {p}_admission_queue_depth Requests waiting for admission by route",
+                      f"# TYPE {p}_admission_queue_depth gauge"]
+            lines += [f'{p}_admission_queue_depth{{route="{route}"}} {value[1]}' for route, value in sorted(self._admission.items())]
+            lines += [f"# HELP {p}_admission_shed_total Requests rejected with 503 by route and reason",
+                      f"# TYPE {p}_admission_shed_total counter"]
+            lines += [
+                f'{p}_admission_shed_total{{route="{route}",reason="{reason}"}} {value}'
+                for (route, reason), value in sorted(self._shed.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(name: str, labels: str, histogram: Histogram) -> List[str]:
+        """
+        Формирует строки гистограммы в формате Prometheus (корзины с накоплением)
+
+        :param name: Имя метрики
+        :param labels: Метки гистограммы
+        :param histogram: Гистограмма
+        :return: Список строк
+        """
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return lines
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """
+    Формирует значение заголовка Server-Timing: суммарная длительность каждого этапа
+    (этапы разных страниц выполняются параллельно, поэтому сумма может превышать total)
+
+    :param timings: Этапы запроса и их длительность в секундах
+    :param total: Общая длительность обработки запроса в секундах
+    :return: Значение заголовка
+    """
+    stages: Dict[str, List[float]] = {}
+    for stage, seconds in timings:
+        stages.setdefault(stage, []).append(seconds)
+    parts = [
+        f'{stage};dur={sum(values) * 1000:.1f};desc="x{len(values)}"' if len(values) > 1
+        else f"{stage};dur={values[0] * 1000:.1f}"
+        for stage, values in stages.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# общий реестр метрик процесса приложения
+metrics = Metrics()
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+import numpy as np
+
+class RecognitionBatcher:
+    """
+    Планировщик распознавания строк: собирает изображения строк от одновременных запросов
+    и распознает их общими пакетами, затем возвращает каждому запросу его результаты в исходном порядке
+    """
+
+    def __init__(
+            self,
+            run_batch: Callable[[List[np.ndarray]], Awaitable[List[Tuple[str, float]]]],
+            max_batch_size: int,
+            max_wait: float
+    ):
+        """
+        Инициализирует планировщик
+
+        :param run_batch: Функция распознавания пакета изображений строк
+        :param max_batch_size: Количество строк, при накоплении которого пакет отправляется сразу
+        :param max_wait: Максимальное время ожидания пополнения пакета в секундах
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending: List[Tuple[List[np.ndarray], asyncio.Future]] = []
+        self.pending_size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # ссылки на выполняемые пакеты, чтобы задачи не были удалены сборщиком мусора до завершения
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """
+        Добавляет строки одного изображения в очередной пакет и ожидает их распознавания
+
+        :param crops: Список изображений строк
+        :return: Список пар (текст, уверенность) в порядке строк
+        """
+        if not crops:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((crops, future))
+        self.pending_size += len(crops)
+        if self.pending_size >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        """
+        Отправляет накопленные строки на распознавание одним пакетом
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending, self.pending_size = self.pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[List[np.ndarray], asyncio.Future]]):
+        """
+        Распознает пакет и распределяет результаты по запросам
+
+        :param batch: Список (строки изображения, future запроса)
+        """
+        crops = [crop for item_crops, _ in batch for crop in item_crops]
+        try:
+            results = await self.run_batch(crops)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for item_crops, future in batch:
+            if not future.done():
+                future.set_result(results[offset:offset + len(item_crops)])
+            offset += len(item_crops)
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.utils import image_processing
+from app.utils.paddle_ocr import OCR_ENGINE_CONFIG, RUNTIME_OPTIONS
+
+def get_ocr_config_fingerprint(
+        normalization: Optional[Dict[str, Any]] = None,
+        engine_options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Формирует отпечаток параметров предобработки и модели OCR, входящий в ключ кэша:
+    при их изменении ранее сохраненные результаты перестают использоваться
+
+    :param normalization: Параметры нормализации страниц (None - без нормализации)
+    :param engine_options: Параметры варианта вывода OCR (параметры, влияющие только на скорость, не учитываются)
+    :return: Строка-отпечаток
+    """
+    engine = {
+        **OCR_ENGINE_CONFIG,
+        **{name: value for name, value in (engine_options or {}).items() if name not in RUNTIME_OPTIONS}
+    }
+    config = {
+        "brightness": image_processing.BRIGHTNESS_FACTOR,
+        "contrast": image_processing.CONTRAST_FACTOR,
+        "threshold": image_processing.BINARY_THRESHOLD,
+        "engine": engine,
+    }
+    if normalization is not None:
+        config["normalization"] = normalization
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+class OCRCache:
+    """
+    Кэш результатов OCR по содержимому изображения: LRU в памяти и SQLite на диске
+    """
+
+    def __init__(
+            self,
+            memory_entries: int,
+            disk_path: Optional[str],
+            disk_max_bytes: int,
+            normalization: Optional[Dict[str, Any]] = None,
+            engine_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Инициализирует кэш
+
+        :param memory_entries: Максимальное количество записей в памяти
+        :param disk_path: Путь к файлу SQLite (None или пустая строка - без дискового уровня)
+        :param disk_max_bytes: Максимальный суммарный размер записей на диске
+        :param normalization: Параметры нормализации страниц, входящие в ключ кэша
+        :param engine_options: Параметры варианта вывода OCR, входящие в ключ кэша
+        """
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.fingerprint = get_ocr_config_fingerprint(normalization, engine_options)
+        self.memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.disk_bytes = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ocr_results_accessed ON ocr_results (accessed)")
+            self._db.commit()
+            self.disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+    def make_key(self, image_hash: str, segmentation: bool = False) -> str:
+        """
+        Формирует ключ кэша
+
+        :param image_hash: SHA-256 содержимого изображения
+        :param segmentation: Строки выделяются по проекции без модели детекции
+        :return: Ключ кэша
+        """
+        return f"{image_hash}:{self.fingerprint}:segment" if segmentation else f"{image_hash}:{self.fingerprint}"
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        """
+        Ищет результат распознавания сначала в памяти, затем на диске
+
+        :param key: Ключ кэша
+        :return: Список распознанных строк или None при промахе
+        """
+        result = self.memory.get(key)
+        if result is not None:
+            self.memory.move_to_end(key)
+            self.hits_memory += 1
+            return result
+
+        if self._db is not None:
+            result = await asyncio.to_thread(self._disk_get, key)
+            if result is not None:
+                self._memory_put(key, result)
+                self.hits_disk += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, result: List[str]):
+        """
+        Сохраняет результат распознавания в память и на диск
+
+        :param key: Ключ кэша
+        :param result: Список распознанных строк
+        """
+        self._memory_put(key, result)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, result)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает счетчики попаданий и промахов
+
+        :return: Словарь со статистикой кэша
+        """
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk_bytes,
+        }
+
+    def close(self):
+        """
+        Закрывает файл дискового уровня
+        """
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+    def _memory_put(self, key: str, result: List[str]):
+        """
+        Добавляет запись в память, вытесняя наиболее давно использованные
+
+        :param key: Ключ кэша
+        :param result: Список распознанных строк
+        """
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[List[str]]:
+        """
+        Читает запись с диска и обновляет время последнего обращения
+
+        :param key: Ключ кэша
+        :return: Список распознанных строк или None
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE ocr_results SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def _disk_put(self, key: str, result: List[str]):
+        """
+        Записывает результат на диск и вытесняет наиболее давно использованные записи
+        при превышении допустимого размера
+
+        :param key: Ключ кэша
+        :param result: Список распознанных строк
+        """
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode())
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self.disk_bytes += size - (previous[0] if previous else 0)
+            while self.disk_bytes > self.disk_max_bytes:
+                row = self._db.execute(
+                    "SELECT key, size FROM ocr_results ORDER BY accessed LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                self._db.execute("DELETE FROM ocr_results WHERE key = ?", (row[0],))
+                self.disk_bytes -= row[1]
+            self._db.commit()
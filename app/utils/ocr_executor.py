@@ -0,0 +1,295 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.utils.image_processing import decode_image, preprocess_image
+from app.utils.line_segmentation import segment_lines
+from app.utils.metrics import metrics
+from app.utils.ocr_batcher import RecognitionBatcher
+from app.utils.page_normalization import PageNormalizer
+from app.utils.paddle_ocr import (
+    OCR_ENGINE_CONFIG, init_ocr_engine, warmup_ocr_engine, process_ocr, detect_lines, recognize_lines
+)
+
+# максимальное время ожидания готовности всех рабочих процессов в секундах
+WORKERS_READY_TIMEOUT = 600
+
+# нормализация страниц в рабочем процессе (None - изображение передается в предобработку как есть)
+page_normalizer: Optional[PageNormalizer] = None
+# барьер, на котором задачи проверки готовности ожидают запуска всех рабочих процессов
+workers_ready_barrier = None
+
+def init_worker(
+        engine_options: Optional[Dict[str, Any]],
+        normalization: Optional[Dict[str, Any]],
+        warmup: bool = False,
+        ready_barrier=None
+):
+    """
+    Подготавливает рабочий процесс пула: настраивает нормализацию страниц, загружает PaddleOCR
+    (если модели не были загружены родительским процессом до fork) и выполняет пробное распознавание
+
+    :param engine_options: Дополнительные параметры PaddleOCR
+    :param normalization: Параметры PageNormalizer (None - без нормализации)
+    :param warmup: Выполнить пробное распознавание
+    :param ready_barrier: Барьер проверки готовности рабочих процессов
+    """
+    global page_normalizer, workers_ready_barrier
+    cpu_threads = (engine_options or {}).get("cpu_threads")
+    if cpu_threads:
+        # потоки OpenCV ограничиваются так же, как потоки вывода модели, чтобы процессы пула не конкурировали за ядра
+        cv2.setNumThreads(cpu_threads)
+    page_normalizer = PageNormalizer(**normalization) if normalization is not None else None
+    workers_ready_barrier = ready_barrier
+    init_ocr_engine(engine_options)
+    if warmup:
+        warmup_ocr_engine()
+
+def wait_workers_ready():
+    """
+    Ожидает, пока каждый рабочий процесс пула не возьмет по одной такой задаче, то есть пока все процессы
+    не будут запущены и инициализированы (запускается в рабочем процессе пула)
+    """
+    workers_ready_barrier.wait(WORKERS_READY_TIMEOUT)
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """
+    Измеряет длительность этапа в рабочем процессе (передается в основной процесс вместе с результатом)
+
+    :param timings: Длительность этапов задачи в секундах
+    :param stage: Название этапа
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def load_page(contents: bytes, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Декодирует изображение и, если она включена, выполняет нормализацию страницы
+
+    :param contents: Исходное изображение в виде байтов
+    :param timings: Длительность этапов задачи (дополняется)
+    :return: Массив изображения BGR
+    """
+    timings = {} if timings is None else timings
+    with timed(timings, "decode"):
+        image = decode_image(contents, apply_orientation=page_normalizer is not None)
+    if page_normalizer is not None:
+        with timed(timings, "normalize"):
+            image, _ = page_normalizer.run(image)
+    return image
+
+def segment_page(preprocessed_image: np.ndarray, timings: Dict[str, float]) -> Optional[List[np.ndarray]]:
+    """
+    Выделяет строки по горизонтальной проекции; если страница для этого не подходит, это учитывается
+    в метриках этапом segment_fallback
+
+    :param preprocessed_image: Результат preprocess_image
+    :param timings: Длительность этапов задачи (дополняется)
+    :return: Список изображений строк или None, если нужна модель детекции
+    """
+    with timed(timings, "segment"):
+        crops = segment_lines(preprocessed_image)
+    if crops is None:
+        timings["segment_fallback"] = timings.pop("segment")
+    return crops
+
+def recognize_image(contents: bytes, segmentation: bool = False) -> Tuple[List[str], Dict[str, float]]:
+    """
+    Выполняет предобработку и OCR изображения (запускается в рабочем процессе пула)
+
+    :param contents: Исходное изображение в виде байтов
+    :param segmentation: Выделять строки по проекции без модели детекции (если страница подходит)
+    :return: Список распознанных строк и длительность этапов
+    """
+    timings = {}
+    image = load_page(contents, timings)
+    with timed(timings, "preprocess"):
+        preprocessed_image = preprocess_image(image)
+    crops = segment_page(preprocessed_image, timings) if segmentation else None
+    if crops is not None:
+        with timed(timings, "recognize"):
+            lines = recognize_lines(crops)
+        return [text for text, score in lines if score >= OCR_ENGINE_CONFIG["drop_score"]], timings
+    with timed(timings, "engine"):
+        ocr_results = process_ocr(preprocessed_image)
+    return [line[1][0] for res in ocr_results for line in res], timings
+
+def detect_image(contents: bytes, segmentation: bool = False) -> Tuple[List[np.ndarray], Dict[str, float]]:
+    """
+    Выполняет предобработку изображения и детекцию строк (запускается в рабочем процессе пула)
+
+    :param contents: Исходное изображение в виде байтов
+    :param segmentation: Выделять строки по проекции без модели детекции (если страница подходит)
+    :return: Список изображений строк в порядке чтения и длительность этапов
+    """
+    timings = {}
+    image = load_page(contents, timings)
+    with timed(timings, "preprocess"):
+        preprocessed_image = preprocess_image(image)
+    crops = segment_page(preprocessed_image, timings) if segmentation else None
+    if crops is None:
+        with timed(timings, "detect"):
+            crops = detect_lines(preprocessed_image)
+    return crops, timings
+
+def recognize_batch(crops: List[np.ndarray]) -> Tuple[List[Tuple[str, float]], Dict[str, float]]:
+    """
+    Распознает пакет изображений строк (запускается в рабочем процессе пула)
+
+    :param crops: Список изображений строк
+    :return: Список пар (текст, уверенность) и длительность этапов
+    """
+    timings = {}
+    with timed(timings, "recognize"):
+        lines = recognize_lines(crops)
+    return lines, timings
+
+class OCRExecutor:
+    """
+    Пул процессов для выполнения OCR вне цикла событий
+    """
+    def __init__(
+            self,
+            workers: int,
+            queue_size: int,
+            batch_size: Optional[int] = None,
+            batch_wait: float = 0.01,
+            normalization: Optional[Dict[str, Any]] = None,
+            preload: bool = False,
+            warmup: bool = True,
+            segmentation: bool = False,
+            engine_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Инициализирует пул процессов, каждый из которых один раз загружает свой экземпляр PaddleOCR.
+        Процессы запускаются вызовом start()
+
+        :param workers: Количество рабочих процессов
+        :param queue_size: Количество задач, переданных в пул сверх числа процессов (ожидают свободного процесса
+            внутри пула). Это ограничение очереди пула, а не числа ожидающих запросов: остальные запросы
+            ждут места без ограничения, а их число и время ожидания ограничивает контроль допуска
+            (AdmissionMiddleware, параметры admission_ocr_*)
+        :param batch_size: Размер пакета распознавания строк, общего для одновременных запросов
+            (None - каждое изображение распознается отдельно)
+        :param batch_wait: Максимальное время ожидания пополнения пакета в секундах
+        :param normalization: Параметры нормализации страниц (None - без нормализации)
+        :param preload: Загрузить модели в текущем процессе и создавать рабочие процессы через fork:
+            страницы памяти с моделями разделяются процессами до первой записи (copy-on-write)
+        :param warmup: Выполнять пробное распознавание при запуске рабочего процесса
+        :param segmentation: По умолчанию выделять строки по проекции без модели детекции
+        :param engine_options: Параметры варианта вывода PaddleOCR (бэкенд, точность, количество потоков)
+        """
+        self.workers = workers
+        self.segmentation = segmentation
+        self.queue_size = queue_size
+        self.ready = False
+        self.warmup_error: Optional[str] = None
+        self._warmup: Optional[asyncio.Future] = None
+        engine_options = {**(engine_options or {}), **({"rec_batch_num": batch_size} if batch_size else {})}
+        if preload:
+            # в родительском процессе модели только загружаются; пробное распознавание запускает потоки
+            # вычислительных библиотек, поэтому выполняется уже в рабочих процессах после fork
+            init_ocr_engine(engine_options)
+        context = multiprocessing.get_context("fork" if preload else "spawn")
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(engine_options, normalization, warmup, context.Barrier(workers))
+        )
+        # ограничивает только количество задач в пуле; отклонение лишних запросов (503) выполняет AdmissionMiddleware
+        self.slots = asyncio.Semaphore(workers + queue_size)
+        self.batcher = None
+        if batch_size:
+            self.batcher = RecognitionBatcher(self._recognize_batch, max_batch_size=batch_size, max_wait=batch_wait)
+
+    def start(self):
+        """
+        Запускает все рабочие процессы и в фоне ожидает их готовности (флаг ready).
+        В режиме preload процессы создаются через fork непосредственно во время вызова
+        """
+        loop = asyncio.get_running_loop()
+        futures = [loop.run_in_executor(self.pool, wait_workers_ready) for _ in range(self.workers)]
+        self._warmup = asyncio.ensure_future(self._wait_ready(futures))
+
+    async def _wait_ready(self, futures: List[asyncio.Future]):
+        """
+        Ожидает готовности рабочих процессов
+
+        :param futures: Задачи проверки готовности
+        """
+        try:
+            await asyncio.gather(*futures)
+        except Exception as e:
+            self.warmup_error = f"{type(e).__name__}: {str(e)}"
+            return
+        self.ready = True
+
+    async def recognize(self, contents: bytes, segmentation: Optional[bool] = None) -> List[str]:
+        """
+        Передает изображение в пул процессов; если очередь заполнена, ожидает освобождения места
+
+        :param contents: Исходное изображение в виде байтов
+        :param segmentation: Выделять строки по проекции без модели детекции (None - значение по умолчанию)
+        :return: Список распознанных строк
+        """
+        segmentation = self.segmentation if segmentation is None else segmentation
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        async with self.slots:
+            if self.batcher is None:
+                lines, timings = await loop.run_in_executor(self.pool, recognize_image, contents, segmentation)
+                self._observe(timings, time.perf_counter() - start)
+                return lines
+            crops, timings = await loop.run_in_executor(self.pool, detect_image, contents, segmentation)
+            self._observe(timings, time.perf_counter() - start)
+
+        with metrics.stage("ocr_batch_wait"):
+            lines = await self.batcher.submit(crops)
+        return [text for text, score in lines if score >= OCR_ENGINE_CONFIG["drop_score"]]
+
+    @staticmethod
+    def _observe(timings: Dict[str, float], elapsed: float, request: bool = True):
+        """
+        Записывает в метрики длительность этапов, выполненных рабочим процессом, и время ожидания
+        (очередь пула и передача данных между процессами)
+
+        :param timings: Длительность этапов задачи в секундах
+        :param elapsed: Общее время выполнения задачи с учетом ожидания
+        :param request: Учесть этапы в заголовке Server-Timing текущего запроса
+        """
+        for stage, seconds in timings.items():
+            metrics.observe(f"ocr_{stage}", seconds, request=request)
+        metrics.observe("ocr_queue", max(elapsed - sum(timings.values()), 0.0), request=request)
+
+    async def _recognize_batch(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """
+        Передает пакет изображений строк в пул процессов
+
+        :param crops: Список изображений строк
+        :return: Список пар (текст, уверенность)
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        # пакет занимает место в очереди пула наравне с отдельными изображениями
+        async with self.slots:
+            lines, timings = await loop.run_in_executor(self.pool, recognize_batch, crops)
+        # пакет содержит строки нескольких запросов, поэтому в Server-Timing он не учитывается
+        self._observe(timings, time.perf_counter() - start, request=False)
+        return lines
+
+    def shutdown(self):
+        """
+        Останавливает пул процессов, отменяя задачи, которые еще не начали выполняться
+        """
+        if self._warmup is not None:
+            self._warmup.cancel()
+        self.pool.shutdown(wait=True, cancel_futures=True)
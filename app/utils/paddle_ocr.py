@@ -1,17 +1,155 @@
-from paddleocr import PaddleOCR
+import copy
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
 
-ocr_engine = PaddleOCR(
-    use_angle_cls=False,
-    lang='en',
-    det_model_dir='det_model',
-    rec_model_dir='rec_model',
-    use_gpu=False
-)
+if TYPE_CHECKING:
+    from paddleocr import PaddleOCR
 
-def process_ocr(image_data: bytes):
+# параметры модели OCR (также входят в ключ кэша результатов распознавания)
+OCR_ENGINE_CONFIG = {
+    "use_angle_cls": False,
+    "lang": "en",
+    "det_model_dir": "det_model",
+    "rec_model_dir": "rec_model",
+    "use_gpu": False,
+    "drop_score": 0.5,
+}
+
+# пути к моделям по умолчанию для каждого варианта вывода (бэкенд, точность):
+# ONNX-модели экспортируются из моделей Paddle, INT8-модели - их динамически квантованные копии
+# (PaddleOCR не включает INT8-ядра MKL-DNN, поэтому INT8 поддерживается только в ONNX Runtime)
+MODEL_PATHS = {
+    ("paddle", "fp32"): ("det_model", "rec_model"),
+    ("onnx", "fp32"): ("det_model.onnx", "rec_model.onnx"),
+    ("onnx", "int8"): ("det_model.int8.onnx", "rec_model.int8.onnx"),
+}
+
+# параметры, которые влияют только на скорость, но не на результат распознавания (не входят в ключ кэша)
+RUNTIME_OPTIONS = {"cpu_threads", "rec_batch_num"}
+
+ocr_engine = None
+
+def get_backend_options(
+        backend: str = "paddle",
+        precision: str = "fp32",
+        cpu_threads: int = 1,
+        enable_mkldnn: bool = False,
+        det_model_dir: Optional[str] = None,
+        rec_model_dir: Optional[str] = None
+) -> Dict:
+    """
+    Формирует параметры PaddleOCR для варианта вывода на CPU. Для варианта по умолчанию
+    (Paddle, FP32, без MKL-DNN) возвращается только количество потоков
+
+    :param backend: Бэкенд вывода: paddle (Paddle Inference) или onnx (ONNX Runtime)
+    :param precision: Точность моделей: fp32 или int8 (квантованные модели, только для onnx)
+    :param cpu_threads: Количество потоков вычислений одного процесса
+    :param enable_mkldnn: Использовать MKL-DNN (oneDNN) в Paddle Inference
+    :param det_model_dir: Путь к модели детекции (None - путь по умолчанию для варианта)
+    :param rec_model_dir: Путь к модели распознавания (None - путь по умолчанию для варианта)
+    :return: Дополнительные параметры PaddleOCR
+    :raises ValueError: Если вариант вывода не поддерживается
+    """
+    if (backend, precision) not in MODEL_PATHS:
+        raise ValueError(f"Unsupported OCR backend '{backend}' with precision '{precision}'")
+    options: Dict = {"cpu_threads": cpu_threads}
+    default_det, default_rec = MODEL_PATHS[(backend, precision)]
+    if backend != "paddle" or det_model_dir or rec_model_dir:
+        options["det_model_dir"] = det_model_dir or default_det
+        options["rec_model_dir"] = rec_model_dir or default_rec
+    if backend == "onnx":
+        options["use_onnx"] = True
+    elif enable_mkldnn:
+        # cpu_threads PaddleOCR применяет только вместе с MKL-DNN
+        options["enable_mkldnn"] = True
+    return options
+
+def _limit_onnx_threads(engine: "PaddleOCR", threads: int):
+    """
+    Пересоздает сессии ONNX Runtime моделей детекции и распознавания с заданным количеством потоков:
+    PaddleOCR создает их с настройками по умолчанию (по потоку на каждое ядро в каждом процессе пула)
+
+    :param engine: Экземпляр PaddleOCR с use_onnx
+    :param threads: Количество потоков одной сессии
+    """
+    import onnxruntime as ort
+
+    session_options = ort.SessionOptions()
+    session_options.intra_op_num_threads = threads
+    session_options.inter_op_num_threads = 1
+    for predictor, model_path in (
+            (engine.text_detector, engine.args.det_model_dir),
+            (engine.text_recognizer, engine.args.rec_model_dir)
+    ):
+        predictor.predictor = ort.InferenceSession(
+            model_path, session_options, providers=["CPUExecutionProvider"]
+        )
+        predictor.input_tensor = predictor.predictor.get_inputs()[0]
+
+def init_ocr_engine(options: Optional[Dict] = None) -> "PaddleOCR":
+    """
+    Создает экземпляр PaddleOCR для текущего процесса (один раз на процесс).
+    paddleocr импортируется здесь, а не при импорте модуля, чтобы импорт приложения не загружал Paddle
+
+    :param options: Дополнительные параметры PaddleOCR (например, rec_batch_num или параметры
+        из get_backend_options)
+    :return: Экземпляр PaddleOCR
+    """
+    global ocr_engine
+    if ocr_engine is None:
+        from paddleocr import PaddleOCR
+        options = {**OCR_ENGINE_CONFIG, **(options or {})}
+        engine = PaddleOCR(**options)
+        if options.get("use_onnx") and options.get("cpu_threads"):
+            _limit_onnx_threads(engine, options["cpu_threads"])
+        ocr_engine = engine
+    return ocr_engine
+
+def warmup_ocr_engine():
+    """
+    Выполняет пробное распознавание, чтобы первая настоящая страница не тратила время
+    на инициализацию предсказателей и выделение памяти
+    """
+    image = np.full((64, 320, 3), 255, np.uint8)
+    cv2.putText(image, "Console.WriteLine(x);", (8, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    init_ocr_engine().ocr(image)
+
+def process_ocr(image_data: np.ndarray):
     """
     Обработка изображения через PaddleOCR
-    :param image_data: Изображение в формате байтов для подачи в OCR
+    :param image_data: Изображение в виде массива для подачи в OCR
     :return: Список с результатами OCR
     """
-    return ocr_engine.ocr(image_data)
+    return init_ocr_engine().ocr(image_data)
+
+def detect_lines(image_data: np.ndarray) -> List[np.ndarray]:
+    """
+    Находит строки текста моделью детекции и вырезает их в порядке чтения (сверху вниз, слева направо)
+
+    :param image_data: Изображение в виде массива
+    :return: Список изображений строк
+    """
+    from tools.infer.predict_system import sorted_boxes
+    from tools.infer.utility import get_rotate_crop_image, get_minarea_rect_crop
+
+    engine = init_ocr_engine()
+    if image_data.ndim == 2:
+        image_data = cv2.cvtColor(image_data, cv2.COLOR_GRAY2BGR)
+    dt_boxes, _ = engine.text_detector(image_data)
+    if dt_boxes is None or len(dt_boxes) == 0:
+        return []
+    crop = get_rotate_crop_image if engine.args.det_box_type == "quad" else get_minarea_rect_crop
+    return [crop(image_data, copy.deepcopy(box)) for box in sorted_boxes(dt_boxes)]
+
+def recognize_lines(crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+    """
+    Распознает изображения строк моделью распознавания
+
+    :param crops: Список изображений строк
+    :return: Список пар (текст, уверенность) в порядке входных изображений
+    """
+    if not crops:
+        return []
+    rec_res, _ = init_ocr_engine().text_recognizer(crops)
+    return [(text, float(score)) for text, score in rec_res]
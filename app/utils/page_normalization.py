@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+# короткая сторона листа A4 в дюймах (для нормализации по DPI)
+A4_SHORT_SIDE_INCHES = 210 / 25.4
+# длинная сторона рабочего изображения для поиска листа
+PAPER_SEARCH_SIDE = 1024
+# длинная сторона рабочего изображения для оценки высоты текста
+TEXT_SEARCH_SIDE = 1600
+# минимальная и максимальная доля кадра, занимаемая листом
+PAPER_MIN_AREA = 0.2
+PAPER_MAX_AREA = 0.95
+# поля вокруг найденного листа (доля размера листа)
+PAPER_MARGIN = 0.01
+# минимальное количество компонент текста для оценки его высоты
+TEXT_MIN_COMPONENTS = 20
+
+@dataclass(frozen=True)
+class PageTransform:
+    """
+    Преобразование исходного изображения при нормализации: обрезка до листа, затем масштабирование
+    """
+    offset_x: int = 0
+    offset_y: int = 0
+    scale: float = 1.0
+
+    def to_original(self, points: np.ndarray) -> np.ndarray:
+        """
+        Переводит координаты точек нормализованного изображения в координаты исходного
+
+        :param points: Массив точек (..., 2) в формате (x, y)
+        :return: Массив точек в координатах исходного изображения
+        """
+        return np.asarray(points, np.float32) / self.scale + np.float32((self.offset_x, self.offset_y))
+
+class PageNormalizer:
+    """
+    Нормализация фотографии работы перед предобработкой: обрезка до листа бумаги и уменьшение
+    до целевой высоты текста или разрешения, чтобы предобработка и детекция не обрабатывали
+    лишние пиксели фона и избыточного разрешения
+    """
+
+    def __init__(
+            self,
+            target_text_height: Optional[int] = 32,
+            target_dpi: Optional[int] = None,
+            max_side: int = 3000,
+            crop_paper: bool = True
+    ):
+        """
+        Инициализирует нормализацию
+
+        :param target_text_height: Целевая высота строчных символов в пикселях
+        :param target_dpi: Целевое разрешение листа A4 (если задано, используется вместо высоты текста)
+        :param max_side: Максимальный размер длинной стороны результата
+        :param crop_paper: Обрезать изображение до найденного листа
+        """
+        self.target_text_height = target_text_height
+        self.target_dpi = target_dpi
+        self.max_side = max_side
+        self.crop_paper = crop_paper
+
+    @staticmethod
+    def _working_copy(image: np.ndarray, side: int) -> Tuple[np.ndarray, float]:
+        """
+        Уменьшает изображение в оттенках серого для вспомогательных вычислений
+
+        :param image: Массив изображения BGR
+        :param side: Длинная сторона рабочего изображения
+        :return: Рабочее изображение и его масштаб относительно исходного
+        """
+        scale = min(side / max(image.shape[:2]), 1.0)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def find_paper(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Ищет лист бумаги как самую большую светлую область кадра
+
+        :param image: Массив изображения BGR
+        :return: Прямоугольник листа (x, y, ширина, высота) или None, если лист не найден
+            или уже занимает почти весь кадр
+        """
+        gray, scale = self._working_copy(image, PAPER_SEARCH_SIDE)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # закрытие убирает из маски листа строки текста
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+
+        x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+        area = w * h / (gray.shape[0] * gray.shape[1])
+        if area < PAPER_MIN_AREA or area > PAPER_MAX_AREA:
+            return None
+
+        margin_x, margin_y = int(w * PAPER_MARGIN), int(h * PAPER_MARGIN)
+        x0 = max(int((x - margin_x) / scale), 0)
+        y0 = max(int((y - margin_y) / scale), 0)
+        x1 = min(int((x + w + margin_x) / scale) + 1, image.shape[1])
+        y1 = min(int((y + h + margin_y) / scale) + 1, image.shape[0])
+        return x0, y0, x1 - x0, y1 - y0
+
+    @staticmethod
+    def estimate_text_height(image: np.ndarray) -> Optional[float]:
+        """
+        Оценивает высоту символов как медианную высоту связных компонент текста
+
+        :param image: Массив изображения BGR
+        :return: Высота в пикселях исходного изображения или None, если текста слишком мало
+        """
+        gray, scale = PageNormalizer._working_copy(image, TEXT_SEARCH_SIDE)
+        binary = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 15
+        )
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        # отбрасываются шум, точки и линии разметки листа
+        keep = (heights >= 4) & (heights <= gray.shape[0] / 10) & (widths >= 2) & (areas >= 10)
+        if np.count_nonzero(keep) < TEXT_MIN_COMPONENTS:
+            return None
+        return float(np.median(heights[keep])) / scale
+
+    def run(self, image: np.ndarray) -> Tuple[np.ndarray, PageTransform]:
+        """
+        Обрезает изображение до листа и уменьшает его (изображение никогда не увеличивается)
+
+        :param image: Массив изображения BGR
+        :return: Нормализованное изображение и преобразование для перевода координат в исходные
+        """
+        offset_x = offset_y = 0
+        paper = self.find_paper(image) if self.crop_paper else None
+        if paper is not None:
+            offset_x, offset_y, w, h = paper
+            image = image[offset_y:offset_y + h, offset_x:offset_x + w]
+
+        scale = 1.0
+        if self.target_dpi and paper is not None:
+            scale = self.target_dpi * A4_SHORT_SIDE_INCHES / min(image.shape[:2])
+        elif self.target_text_height:
+            text_height = self.estimate_text_height(image)
+            if text_height:
+                scale = self.target_text_height / text_height
+        scale = min(scale, self.max_side / max(image.shape[:2]), 1.0)
+
+        if scale < 1.0:
+            # INTER_AREA с дробным коэффициентом в несколько раз медленнее, а при уменьшении
+            # менее чем вдвое билинейная интерполяция не дает заметных искажений
+            interpolation = cv2.INTER_LINEAR if scale >= 0.5 else cv2.INTER_AREA
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+        else:
+            # обрезка дает представление исходного массива, а предобработка изменяет изображение на месте
+            image = np.ascontiguousarray(image)
+        return image, PageTransform(offset_x, offset_y, scale)
@@ -1,3 +1,5 @@
+from typing import List
+
 def postprocess_text(data):
     """
     Преобразует вложенный список строк в одну строку с элементами,
@@ -7,3 +9,120 @@ def postprocess_text(data):
     :return: Строка, содержащая все элементы из вложенных списков
     """
     return '\n'.join(line for block in data["results"] for line in block), data["work_url"]
+
+
+# метка, которой LLM обозначает начало и конец кода в ответе
+CODE_FIELD_MARKER = "ocr_code_field"
+
+class CodeFieldExtractor:
+    """
+    Выделяет код между первой и второй метками ocr_code_field в ответе LLM, поступающем по частям.
+    Результат совпадает с response.split("ocr_code_field")[1] для полного ответа
+    """
+
+    def __init__(self, marker: str = CODE_FIELD_MARKER):
+        """
+        Инициализирует выделение кода
+
+        :param marker: Метка начала и конца кода
+        """
+        self.marker = marker
+        self.buffer = ""
+        self.inside = False
+        self.finished = False
+
+    def feed(self, text: str) -> str:
+        """
+        Принимает очередную часть ответа
+
+        :param text: Часть ответа LLM
+        :return: Часть кода, которую уже можно передать клиенту (может быть пустой)
+        """
+        if self.finished:
+            return ""
+        self.buffer += text
+        if not self.inside:
+            index = self.buffer.find(self.marker)
+            if index < 0:
+                # конец буфера может оказаться началом метки
+                self.buffer = self.buffer[max(len(self.buffer) - len(self.marker) + 1, 0):]
+                return ""
+            self.buffer = self.buffer[index + len(self.marker):]
+            self.inside = True
+
+        index = self.buffer.find(self.marker)
+        if index >= 0:
+            code = self.buffer[:index]
+            self.buffer = ""
+            self.finished = True
+            return code
+        ready = max(len(self.buffer) - len(self.marker) + 1, 0)
+        code, self.buffer = self.buffer[:ready], self.buffer[ready:]
+        return code
+
+    def finish(self) -> str:
+        """
+        Завершает обработку ответа
+
+        :return: Оставшаяся часть кода
+        :raises ValueError: Если в ответе нет метки начала кода
+        """
+        if not self.inside:
+            raise ValueError(f"No '{self.marker}' marker in LLM response")
+        code = "" if self.finished else self.buffer
+        self.buffer = ""
+        self.finished = True
+        return code
+
+# среднее количество символов кода на один токен LLM (код токенизируется плотнее обычного текста)
+CHARS_PER_TOKEN = 3
+
+def estimate_tokens(text: str) -> int:
+    """
+    Оценивает количество токенов текста без токенизатора модели
+
+    :param text: Текст
+    :return: Оценка количества токенов
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def split_code_chunks(pages: List[List[str]], max_tokens: int) -> List[str]:
+    """
+    Разбивает распознанный код на части не больше заданного размера. Части разделяются по строкам,
+    после которых вложенность фигурных скобок минимальна (при равной вложенности - по концам блоков
+    и операторов, затем по границам страниц), чтобы методы и классы по возможности не разрывались.
+    Строка, превышающая размер, остается целой
+
+    :param pages: Список страниц, каждая - список распознанных строк
+    :param max_tokens: Максимальная оценка количества токенов одной части
+    :return: Список частей кода в исходном порядке (одна часть, если код помещается целиком)
+    """
+    lines = []
+    # вложенность скобок после строки, признак конца блока или оператора и признак последней строки страницы
+    boundaries = []
+    depth = 0
+    for page in pages:
+        for index, line in enumerate(page):
+            depth = max(depth + line.count("{") - line.count("}"), 0)
+            lines.append(line)
+            boundaries.append((depth, line.rstrip().endswith(("}", ";")), index == len(page) - 1))
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = start
+        size = 0
+        while end < len(lines) and (end == start or size + estimate_tokens(lines[end]) + 1 <= max_tokens):
+            size += estimate_tokens(lines[end]) + 1
+            end += 1
+        if end < len(lines):
+            # граница выбирается во второй половине части, чтобы не получать слишком мелких частей:
+            # наименьшая вложенность, затем конец блока, затем конец страницы, затем ближе к концу
+            def rank(cut: int):
+                depth_after, closes, page_end = boundaries[cut - 1]
+                return depth_after, not closes, not page_end, -cut
+
+            end = min(range(start + max((end - start) // 2, 1), end + 1), key=rank)
+        chunks.append("\n".join(lines[start:end]))
+        start = end
+    return chunks
@@ -0,0 +1,148 @@
+"""
+Сравнение вариантов вывода OCR на CPU: Paddle Inference (с MKL-DNN и без), ONNX Runtime в FP32 и INT8
+
+Запуск: python -m benchmarks.backends [--variants paddle onnx ...] [--resolutions 5mp] [--samples DIR]
+                                      [--workers W] [--cpu-threads T] [--repeat N] [--export]
+                                      [--output FILE]
+
+Каждый вариант запускается в собственном пуле из W процессов с T потоками на процесс
+(по умолчанию ядра процессора делятся между процессами, как в приложении). Для каждого варианта
+выводятся пропускная способность, процентили задержки страницы и совпадение результата
+с эталонным вариантом paddle (доля совпавших страниц и CER). С --export модели ONNX экспортируются
+из det_model и rec_model (нужен paddle2onnx), а INT8-модели получаются их динамическим квантованием
+(нужен onnxruntime). Модели ищутся в рабочем каталоге по путям из MODEL_PATHS
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import emit, percentiles
+from benchmarks.normalization import levenshtein
+from benchmarks.samples import RESOLUTIONS, load_samples
+from app.utils import ocr_executor
+from app.utils.paddle_ocr import MODEL_PATHS, get_backend_options
+
+# варианты вывода: бэкенд, точность и MKL-DNN
+VARIANTS = {
+    "paddle": {"backend": "paddle", "precision": "fp32"},
+    "paddle-mkldnn": {"backend": "paddle", "precision": "fp32", "enable_mkldnn": True},
+    "onnx": {"backend": "onnx", "precision": "fp32"},
+    "onnx-int8": {"backend": "onnx", "precision": "int8"},
+}
+
+# эталонный вариант, с результатом которого сравниваются остальные
+REFERENCE_VARIANT = "paddle"
+
+def export_models():
+    """
+    Экспортирует модели Paddle в ONNX и квантует их в INT8 (существующие файлы не перезаписываются)
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    paddle_models = MODEL_PATHS[("paddle", "fp32")]
+    onnx_models = MODEL_PATHS[("onnx", "fp32")]
+    int8_models = MODEL_PATHS[("onnx", "int8")]
+    for model_dir, onnx_path, int8_path in zip(paddle_models, onnx_models, int8_models):
+        if not Path(onnx_path).exists():
+            subprocess.run([
+                "paddle2onnx", "--model_dir", model_dir,
+                "--model_filename", "inference.pdmodel", "--params_filename", "inference.pdiparams",
+                "--save_file", onnx_path, "--opset_version", "11", "--enable_onnx_checker", "True"
+            ], check=True)
+        if not Path(int8_path).exists():
+            quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+
+def run_variant(options: Dict, pages: List[bytes], workers: int, repeat: int) -> Dict:
+    """
+    Распознает страницы в пуле процессов с заданными параметрами вывода
+
+    :param options: Параметры PaddleOCR варианта
+    :param pages: Изображения страниц в виде байтов
+    :param workers: Количество рабочих процессов
+    :param repeat: Количество проходов по набору (после одного прогревочного)
+    :return: Результаты распознавания страниц, пропускная способность и процентили задержки страницы
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=ocr_executor.init_worker,
+            initargs=(options, None, True)
+    ) as pool:
+        results = [lines for lines, _ in pool.map(ocr_executor.recognize_image, pages)]
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, timings in pool.map(ocr_executor.recognize_image, pages):
+                latencies.append(sum(timings.values()))
+        seconds = time.perf_counter() - start
+    return {
+        "results": results,
+        "pages": len(pages) * repeat,
+        "seconds": seconds,
+        "throughput_pages_per_s": len(pages) * repeat / seconds,
+        **percentiles(latencies),
+    }
+
+def parity(results: List[List[str]], reference: List[List[str]]) -> Dict[str, float]:
+    """
+    Сравнивает результат варианта с эталонным
+
+    :param results: Распознанные строки по страницам
+    :param reference: Эталонные строки по страницам
+    :return: Доля страниц с полностью совпавшим результатом и CER относительно эталона
+    """
+    errors = 0
+    length = 0
+    for lines, expected in zip(results, reference):
+        text, expected_text = "\n".join(lines), "\n".join(expected)
+        errors += levenshtein(text, expected_text)
+        length += len(expected_text)
+    exact = sum(lines == expected for lines, expected in zip(results, reference))
+    return {"exact_pages": exact / max(len(reference), 1), "cer": errors / max(length, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--resolutions", nargs="+", default=["5mp"], choices=list(RESOLUTIONS))
+    parser.add_argument("--samples", type=Path, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cpu-threads", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--export", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.export:
+        export_models()
+    cpu_threads = args.cpu_threads or max((os.cpu_count() or 1) // args.workers, 1)
+    pages = [contents for _, contents in load_samples(args.resolutions, args.samples)]
+    # эталон нужен для сравнения, поэтому выполняется всегда и первым
+    names = [REFERENCE_VARIANT] + [name for name in args.variants if name != REFERENCE_VARIANT]
+
+    variants = {}
+    reference = None
+    for name in names:
+        options = get_backend_options(cpu_threads=cpu_threads, **VARIANTS[name])
+        result = run_variant(options, pages, args.workers, args.repeat)
+        results = result.pop("results")
+        if reference is None:
+            reference = results
+        variants[name] = {**result, "parity": parity(results, reference)}
+
+    config = {
+        "resolutions": args.resolutions,
+        "samples": str(args.samples) if args.samples else None,
+        "workers": args.workers,
+        "cpu_threads": cpu_threads,
+        "repeat": args.repeat,
+    }
+    emit({"benchmark": "backends", "config": config, "variants": variants}, args.output)
+
+if __name__ == "__main__":
+    main()
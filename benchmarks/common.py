@@ -0,0 +1,91 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Вычисляет процентили задержки (ближайший ранг)
+
+    :param samples: Значения задержки в секундах
+    :return: Словарь p50/p95/p99/max в миллисекундах
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def rank(q: float) -> float:
+        index = min(max(int(round(q * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)
+        return ordered[index] * 1000
+
+    return {
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "p99_ms": rank(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def peak_rss(pids: Iterable[int] = ()) -> Dict[str, Any]:
+    """
+    Возвращает пиковый размер резидентной памяти текущего процесса и указанных дочерних процессов
+
+    :param pids: ID работающих дочерних процессов (например, рабочих процессов OCR)
+    :return: Словарь с размерами в байтах
+    """
+    # ru_maxrss в Linux задается в килобайтах, в macOS - в байтах
+    unit = 1 if sys.platform == "darwin" else 1024
+    result: Dict[str, Any] = {"self_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit}
+    # RUSAGE_CHILDREN не подходит: при spawn дочерний процесс до exec учитывается с памятью родителя,
+    # поэтому пик каждого процесса читается из /proc (VmHWM сбрасывается при exec)
+    workers = []
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        workers.append(int(line.split()[1]) * 1024)
+        except OSError:
+            continue
+    if workers:
+        result["workers_bytes"] = workers
+        result["total_bytes"] = result["self_bytes"] + sum(workers)
+    return result
+
+def environment() -> Dict[str, Any]:
+    """
+    Описывает окружение запуска, чтобы результаты разных запусков можно было сопоставить
+
+    :return: Словарь с версией кода, интерпретатора и параметрами машины
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def emit(report: Dict[str, Any], output: Optional[Path]):
+    """
+    Выводит результат в формате JSON в файл или в стандартный вывод
+
+    :param report: Результат измерений
+    :param output: Путь к файлу (None - стандартный вывод)
+    """
+    text = json.dumps({"environment": environment(), **report}, indent=2, ensure_ascii=False)
+    if output is None:
+        print(text)
+    else:
+        output.write_text(text + "\n")
@@ -0,0 +1,176 @@
+"""
+Нагрузочный тест /recognize, /postprocess-text и /analyze-code через приложение FastAPI
+
+Запуск: python -m benchmarks.load [--requests N] [--concurrency C] [--resolution 5mp]
+                                  [--pages P] [--llm-latency-ms MS] [--ready-timeout S] [--output FILE]
+
+Приложение запускается в текущем процессе (с пулом OCR и всем жизненным циклом), S3 заменяется
+хранилищем в памяти (S3_BACKEND=memory), Groq - локальной заглушкой. Кэши OCR и LLM отключаются,
+чтобы каждый запрос проходил весь конвейер. Любой параметр окружения можно переопределить
+(например, OCR_WORKERS=4). Для каждого сценария выводятся пропускная способность,
+процентили задержки и коды ответов, а также пиковый RSS процесса и рабочих процессов OCR
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict
+
+import httpx
+
+from benchmarks.common import emit, peak_rss, percentiles
+from benchmarks.samples import CODE_LINES, RESOLUTIONS, load_samples
+from benchmarks.stub_groq import serve_in_thread
+
+def configure_environment(groq_base_url: str, workdir: str):
+    """
+    Задает параметры приложения для нагрузочного теста, не изменяя уже заданные в окружении
+
+    :param groq_base_url: Адрес заглушки Groq
+    :param workdir: Каталог для временных файлов приложения
+    """
+    defaults = {
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "S3_ENDPOINT_URL": "http://127.0.0.1:9",
+        "S3_BUCKET_NAME": "bench",
+        "S3_BUCKET_ID": "bench",
+        "S3_BACKEND": "memory",
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": groq_base_url,
+        "OCR_CACHE_MEMORY_ENTRIES": "0",
+        "OCR_CACHE_PATH": "",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+        "LLM_CACHE_TTL": "0",
+        "JOBS_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOBS_STORAGE_DIR": os.path.join(workdir, "jobs"),
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float):
+    """
+    Ожидает готовности приложения (/ready)
+
+    :param client: Клиент приложения
+    :param timeout: Максимальное время ожидания в секундах
+    :raises RuntimeError: Если запуск рабочих процессов OCR завершился ошибкой или время ожидания истекло
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        status = (await client.get("/ready")).json()
+        if status["status"] == "ready":
+            return
+        if status["status"] == "failed":
+            raise RuntimeError(f"OCR workers failed to start: {status.get('error')}")
+        if time.perf_counter() >= deadline:
+            raise RuntimeError(f"Application is not ready after {timeout:g} s")
+        await asyncio.sleep(0.1)
+
+async def run_scenario(
+        send: Callable[[int], Awaitable[httpx.Response]],
+        requests: int,
+        concurrency: int
+) -> Dict:
+    """
+    Выполняет запросы с ограничением числа одновременных
+
+    :param send: Функция, отправляющая запрос с заданным номером
+    :param requests: Количество запросов
+    :param concurrency: Количество одновременных запросов
+    :return: Пропускная способность, процентили задержки и коды ответов
+    """
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async def one(index: int):
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await send(index)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    seconds = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "throughput_rps": requests / seconds,
+        "status_codes": dict(statuses),
+        **percentiles(latencies),
+    }
+
+async def run(args: argparse.Namespace) -> Dict:
+    """
+    Запускает приложение и выполняет сценарии нагрузки
+
+    :param args: Параметры командной строки
+    :return: Результаты сценариев и пиковый RSS
+    """
+    from app.main import app
+
+    pages = [contents for _, contents in load_samples([args.resolution])] * args.pages
+    code = "\n".join(CODE_LINES)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await wait_ready(client, args.ready_timeout)
+
+            files = [("images", (f"page{page}.jpg", contents, "image/jpeg")) for page, contents in enumerate(pages)]
+
+            def recognize(index: int):
+                return client.post(
+                    "/api/v1/recognize",
+                    files=files,
+                    data={"student_id": index, "work_code": 1, "assignment_id": 1}
+                )
+
+            def postprocess(index: int):
+                return client.post(
+                    "/api/v1/postprocess-text",
+                    json={"results": [CODE_LINES, [f"// {index}"]], "work_url": f"bench/student_{index}"}
+                )
+
+            def analyze(index: int):
+                return client.post("/api/v1/analyze-code", json={"task": f"Task {index}", "code": code})
+
+            scenarios = {}
+            for name, send in (("recognize", recognize), ("postprocess_text", postprocess), ("analyze_code", analyze)):
+                scenarios[name] = await run_scenario(send, args.requests, args.concurrency)
+        # память рабочих процессов OCR читается до остановки пула
+        memory = peak_rss(app.state.ocr_executor.pool._processes)
+    return {"scenarios": scenarios, "peak_rss": memory}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--resolution", default="5mp", choices=list(RESOLUTIONS))
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    groq_base_url, stub = serve_in_thread(args.llm_latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(groq_base_url, workdir)
+        results = asyncio.run(run(args))
+    stub.should_exit = True
+
+    config = {name: value for name, value in vars(args).items() if name != "output"}
+    emit({"benchmark": "load", "config": config, **results}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Микробенчмарки этапов распознавания: decode_image, preprocess_image, segment_lines, process_ocr
+и постобработки PostProcessService.postprocess_text
+
+Запуск: python -m benchmarks.micro [--resolutions 1mp 5mp 12mp] [--samples DIR] [--repeat N]
+                                   [--skip-ocr] [--llm-latency-ms MS] [--chunk-tokens T] [--output FILE]
+
+process_ocr требует моделей PaddleOCR (det_model, rec_model) в рабочем каталоге; без них
+используйте --skip-ocr. Постобработка выполняется без кэша через локальную заглушку Groq
+(по умолчанию без задержки, то есть измеряются накладные расходы сервиса: формирование запросов,
+разбиение на части, HTTP-клиент и разбор ответа) одним запросом и частями по --chunk-tokens.
+Результат выводится в формате JSON
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.common import emit, peak_rss, percentiles
+from benchmarks.samples import CODE_LINES, RESOLUTIONS, load_samples
+from benchmarks.stub_groq import serve_in_thread
+from app.services.llm_gateway import LLMGateway
+from app.services.postprocess_service import PostProcessService
+from app.utils.image_processing import decode_image, preprocess_image
+from app.utils.line_segmentation import segment_lines
+from app.utils.paddle_ocr import init_ocr_engine, process_ocr
+
+def measure(run: Callable[[], None], repeat: int, prepare: Callable[[], None] = None) -> Dict[str, float]:
+    """
+    Измеряет время выполнения функции
+
+    :param run: Измеряемая функция
+    :param repeat: Количество измерений (после одного прогревочного запуска)
+    :param prepare: Подготовка перед каждым запуском, не входящая в измерение
+    :return: Количество измерений, среднее значение и процентили
+    """
+    timings: List[float] = []
+    for index in range(repeat + 1):
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        run()
+        if index > 0:
+            timings.append(time.perf_counter() - start)
+    return {"iterations": repeat, "mean_ms": statistics.mean(timings) * 1000, **percentiles(timings)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--samples", type=Path, default=None)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--skip-ocr", action="store_true")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chunk-tokens", type=int, default=500)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if not args.skip_ocr:
+        init_ocr_engine()
+
+    results: Dict[str, Dict] = {}
+    for name, contents in load_samples(args.resolutions, args.samples):
+        image = decode_image(contents)
+        state = {}
+
+        def copy_image():
+            # предобработка изменяет изображение на месте
+            state["image"] = image.copy()
+
+        preprocessed = preprocess_image(image.copy())
+        sample = {
+            "shape": list(image.shape),
+            "bytes": len(contents),
+            "decode_image": measure(lambda: decode_image(contents), args.repeat),
+            "preprocess_image": measure(lambda: preprocess_image(state["image"]), args.repeat, copy_image),
+            "segment_lines": measure(lambda: segment_lines(preprocessed), args.repeat),
+        }
+        if not args.skip_ocr:
+            sample["process_ocr"] = measure(lambda: process_ocr(preprocessed), args.repeat)
+        results[name] = sample
+
+    # типичный результат распознавания: несколько страниц по несколько десятков строк
+    data = {"results": [CODE_LINES * 4 for _ in range(5)], "work_url": "bench/student_1/work_code_1/assignment_1"}
+    groq_base_url, stub = serve_in_thread(args.llm_latency_ms / 1000)
+    loop = asyncio.new_event_loop()
+    gateway = LLMGateway(api_key="bench", base_url=groq_base_url)
+    for name, chunk_tokens in (("postprocess_service", 0), ("postprocess_service_chunked", args.chunk_tokens)):
+        service = PostProcessService(gateway, chunk_tokens=chunk_tokens)
+        results[name] = measure(lambda: loop.run_until_complete(service.postprocess_text(data)), args.repeat)
+    loop.run_until_complete(gateway.close())
+    loop.close()
+    stub.should_exit = True
+
+    emit({"benchmark": "micro", "results": results, "peak_rss": peak_rss()}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Сравнение распознавания с нормализацией страниц и без нее на наборе изображений
+
+Запуск: python -m benchmarks.normalization <каталог с изображениями> [--repeat N] [--output FILE]
+
+Для каждого изображения измеряется время предобработки и OCR (и отдельно нормализации),
+а если рядом лежит файл <имя>.txt с эталонным текстом - доля ошибок в символах (CER).
+Результат выводится в формате JSON
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.common import emit
+from app.utils import ocr_executor
+from app.utils.image_processing import decode_image
+from app.utils.page_normalization import PageNormalizer
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Вычисляет расстояние редактирования между строками
+
+    :param a: Первая строка
+    :param b: Вторая строка
+    :return: Минимальное количество вставок, удалений и замен
+    """
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def measure(contents: bytes, repeat: int, reference: Optional[str]) -> Dict:
+    """
+    Распознает изображение в текущем режиме нормализации
+
+    :param contents: Изображение в виде байтов
+    :param repeat: Количество повторов измерения
+    :param reference: Эталонный текст или None
+    :return: Медианное время, количество пикселей на входе OCR и CER
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines, _ = ocr_executor.recognize_image(contents)
+        timings.append(time.perf_counter() - start)
+    pixels = ocr_executor.load_page(contents).shape[:2]
+    result = {
+        "seconds": statistics.median(timings),
+        "pixels": pixels[0] * pixels[1],
+        "lines": len(lines),
+    }
+    if reference is not None:
+        text = "\n".join(lines)
+        result["cer"] = levenshtein(text, reference) / max(len(reference), 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--target-text-height", type=int, default=32)
+    parser.add_argument("--target-dpi", type=int, default=None)
+    parser.add_argument("--max-side", type=int, default=3000)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    normalization = {
+        "target_text_height": args.target_text_height,
+        "target_dpi": args.target_dpi,
+        "max_side": args.max_side,
+        "crop_paper": True,
+    }
+    ocr_executor.init_worker(None, None)
+    normalizer = PageNormalizer(**normalization)
+
+    report: List[Dict] = []
+    for path in sorted(p for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES):
+        contents = path.read_bytes()
+        reference_path = path.with_suffix(".txt")
+        reference = reference_path.read_text().strip() if reference_path.exists() else None
+
+        ocr_executor.page_normalizer = None
+        baseline = measure(contents, args.repeat, reference)
+        ocr_executor.page_normalizer = normalizer
+        normalized = measure(contents, args.repeat, reference)
+
+        start = time.perf_counter()
+        _, transform = normalizer.run(decode_image(contents, apply_orientation=True))
+        normalized["normalize_seconds"] = time.perf_counter() - start
+        normalized["scale"] = transform.scale
+        normalized["offset"] = [transform.offset_x, transform.offset_y]
+        report.append({"image": path.name, "baseline": baseline, "normalized": normalized})
+
+    summary = {}
+    for mode in ("baseline", "normalized"):
+        rows = [item[mode] for item in report]
+        if not rows:
+            continue
+        summary[mode] = {"seconds_total": sum(row["seconds"] for row in rows)}
+        cers = [row["cer"] for row in rows if "cer" in row]
+        if cers:
+            summary[mode]["cer_mean"] = statistics.mean(cers)
+    emit(
+        {
+            "benchmark": "normalization",
+            "config": {"samples": str(args.samples), "repeat": args.repeat},
+            "normalization": normalization,
+            "summary": summary,
+            "images": report,
+        },
+        args.output
+    )
+
+if __name__ == "__main__":
+    main()
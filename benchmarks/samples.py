@@ -0,0 +1,104 @@
+"""
+Набор изображений страниц с кодом для бенчмарков
+
+Синтетические страницы генерируются детерминированно (фиксированное зерно), поэтому при одинаковых
+параметрах набор совпадает между запусками. Дополнительно можно передать каталог с реальными
+фотографиями рукописных работ (JPG/PNG/BMP), они добавляются в набор как есть
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+# разрешения синтетических фотографий (ширина, высота)
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "1mp": (1280, 960),
+    "5mp": (2592, 1944),
+    "12mp": (4000, 3000),
+}
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+CODE_LINES = [
+    "using System;",
+    "class Program",
+    "{",
+    "    static void Main(string[] args)",
+    "    {",
+    "        int n = int.Parse(Console.ReadLine());",
+    "        int sum = 0;",
+    "        for (int i = 1; i <= n; i++)",
+    "        {",
+    "            if (i % 2 == 0) sum += i;",
+    "        }",
+    "        Console.WriteLine(sum);",
+    "    }",
+    "}",
+]
+
+def synthetic_page(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    Рисует фотографию листа с кодом: лист на темном фоне, рукописный шрифт с дрожанием строк,
+    шум сенсора и неравномерное освещение
+
+    :param width: Ширина изображения
+    :param height: Высота изображения
+    :param seed: Зерно генератора случайных чисел
+    :return: Массив изображения BGR
+    """
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), np.uint8)
+    image[:] = (55, 70, 85)
+
+    # лист занимает около 70% кадра
+    x0, y0 = int(width * 0.15), int(height * 0.08)
+    x1, y1 = int(width * 0.85), int(height * 0.92)
+    cv2.rectangle(image, (x0, y0), (x1, y1), (232, 238, 242), -1)
+
+    scale = (y1 - y0) / 900
+    line_height = int(55 * scale)
+    for index, line in enumerate(CODE_LINES):
+        jitter_x, jitter_y = rng.integers(-6, 7, size=2) * scale
+        origin = (int(x0 + 40 * scale + jitter_x), int(y0 + (index + 2) * line_height + jitter_y))
+        cv2.putText(
+            image, line, origin, cv2.FONT_HERSHEY_SCRIPT_SIMPLEX,
+            1.1 * scale, (45, 40, 70), max(int(2 * scale), 1), cv2.LINE_AA
+        )
+
+    # неравномерное освещение и шум
+    gradient = np.linspace(0.85, 1.05, width, dtype=np.float32)[None, :, None]
+    noisy = image.astype(np.float32) * gradient + rng.normal(0, 4, image.shape).astype(np.float32)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+def encode(image: np.ndarray, extension: str = ".jpg") -> bytes:
+    """
+    Кодирует изображение так же, как его присылает клиент
+
+    :param image: Массив изображения BGR
+    :param extension: Формат
+    :return: Изображение в виде байтов
+    """
+    ok, buffer = cv2.imencode(extension, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Cannot encode image")
+    return buffer.tobytes()
+
+def load_samples(resolutions: List[str], samples_dir: Optional[Path] = None) -> List[Tuple[str, bytes]]:
+    """
+    Формирует набор изображений
+
+    :param resolutions: Имена разрешений синтетических страниц из RESOLUTIONS
+    :param samples_dir: Каталог с реальными изображениями (None - только синтетические)
+    :return: Список пар (имя, изображение в виде байтов)
+    """
+    samples = [
+        (f"synthetic_{name}", encode(synthetic_page(*RESOLUTIONS[name])))
+        for name in resolutions
+    ]
+    if samples_dir is not None:
+        samples += [
+            (path.name, path.read_bytes())
+            for path in sorted(samples_dir.iterdir())
+            if path.suffix.lower() in IMAGE_SUFFIXES
+        ]
+    return samples
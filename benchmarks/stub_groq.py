@@ -0,0 +1,76 @@
+"""
+Заглушка Groq для нагрузочного теста: отвечает на /openai/v1/chat/completions с заданной задержкой,
+оборачивая ответ метками ocr_code_field, как это делает настоящая модель
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+from typing import Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+def create_app(latency: float) -> FastAPI:
+    """
+    Создает приложение заглушки
+
+    :param latency: Задержка ответа в секундах
+    :return: Экземпляр FastAPI
+    """
+    app = FastAPI()
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = body["messages"][0]["content"]
+        content = f"ocr_code_field\n// {len(prompt)} characters\nocr_code_field"
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+
+        async def chunks():
+            parts = content.split(" ")
+            for index, part in enumerate(parts):
+                await asyncio.sleep(latency / len(parts))
+                delta = part if index == 0 else " " + part
+                chunk = {
+                    "id": "stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+def serve_in_thread(latency: float) -> Tuple[str, uvicorn.Server]:
+    """
+    Запускает заглушку в отдельном потоке на свободном порту
+
+    :param latency: Задержка ответа в секундах
+    :return: Адрес API (значение GROQ_BASE_URL) и сервер (server.should_exit = True для остановки)
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(latency), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server
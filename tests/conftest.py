@@ -0,0 +1,27 @@
+import pytest
+
+from app.core.config import get_settings
+
+# обязательные параметры окружения (сетевые клиенты в тестах не подключаются)
+REQUIRED_ENV = {
+    "AWS_ACCESS_KEY_ID": "test",
+    "AWS_SECRET_ACCESS_KEY": "test",
+    "S3_ENDPOINT_URL": "http://127.0.0.1:9",
+    "S3_BUCKET_NAME": "bucket",
+    "S3_BUCKET_ID": "id",
+    "GROQ_API_KEY": "test",
+}
+
+@pytest.fixture
+def configure(monkeypatch):
+    """
+    Задает настройки приложения через окружение: configure(max_upload_size=10, ...)
+    """
+    def apply(**values):
+        for name, value in {**REQUIRED_ENV, **{key.upper(): value for key, value in values.items()}}.items():
+            monkeypatch.setenv(name, str(value))
+        get_settings.cache_clear()
+        return get_settings()
+
+    yield apply
+    get_settings.cache_clear()
@@ -0,0 +1,129 @@
+import asyncio
+from contextlib import suppress
+from typing import List
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.middleware import AdmissionMiddleware, RECOGNIZE_ROUTE
+from app.utils.admission import AdmissionController, AdmissionRejected
+
+async def hold(controller: AdmissionController, admitted: List[int], index: int, release: asyncio.Event):
+    async with controller.admit():
+        admitted.append(index)
+        await release.wait()
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def run():
+        controller = AdmissionController("/test", concurrency=1, queue_size=8, max_wait=5.0)
+        admitted: List[int] = []
+        release = asyncio.Event()
+        await controller._acquire()
+        tasks = []
+        for index in range(4):
+            tasks.append(asyncio.create_task(hold(controller, admitted, index, release)))
+            await asyncio.sleep(0)
+        assert (controller.in_flight, len(controller._waiters)) == (1, 4)
+        release.set()
+        controller._release()
+        await asyncio.gather(*tasks)
+        return admitted, controller
+
+    admitted, controller = asyncio.run(run())
+    assert admitted == [0, 1, 2, 3]
+    assert (controller.in_flight, len(controller._waiters)) == (0, 0)
+
+def test_request_is_rejected_when_queue_is_full():
+    async def run():
+        controller = AdmissionController("/test", concurrency=1, queue_size=1, max_wait=5.0)
+        await controller._acquire()
+        waiter = asyncio.create_task(controller._acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as error:
+            await controller._acquire()
+        controller._release()
+        await waiter
+        controller._release()
+        return error.value, controller
+
+    error, controller = asyncio.run(run())
+    assert error.reason == "queue_full"
+    assert controller.in_flight == 0
+
+def test_request_is_rejected_after_max_wait():
+    async def run():
+        controller = AdmissionController("/test", concurrency=1, queue_size=4, max_wait=0.05)
+        await controller._acquire()
+        with pytest.raises(AdmissionRejected) as error:
+            await controller._acquire()
+        return error.value, controller
+
+    error, controller = asyncio.run(run())
+    assert error.reason == "timeout"
+    assert (controller.in_flight, len(controller._waiters)) == (1, 0)
+
+def test_cancelled_waiter_does_not_leak_handed_slot():
+    async def run():
+        controller = AdmissionController("/test", concurrency=1, queue_size=4, max_wait=5.0)
+        admitted: List[int] = []
+        release = asyncio.Event()
+        release.set()
+        await controller._acquire()
+        waiter = asyncio.create_task(hold(controller, admitted, 0, release))
+        await asyncio.sleep(0)
+        # место передано ожидающему, но он отменен раньше, чем успел продолжить выполнение
+        controller._release()
+        waiter.cancel()
+        with suppress(asyncio.CancelledError):
+            await waiter
+        assert (controller.in_flight, len(controller._waiters)) == (0, 0)
+        # место снова доступно без ожидания
+        await asyncio.wait_for(controller._acquire(), 0.1)
+
+    asyncio.run(run())
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        controller = AdmissionController("/test", concurrency=1, queue_size=4, max_wait=5.0)
+        await controller._acquire()
+        waiter = asyncio.create_task(controller._acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with suppress(asyncio.CancelledError):
+            await waiter
+        assert (controller.in_flight, len(controller._waiters)) == (1, 0)
+        controller._release()
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+def test_middleware_sheds_with_retry_after_and_lets_jobs_through(configure):
+    configure(admission_ocr_concurrency=1, admission_ocr_queue_size=0, admission_retry_after=9)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    @app.post(RECOGNIZE_ROUTE)
+    async def recognize(mode: str = "sync"):
+        if mode == "sync":
+            started.set()
+            await release.wait()
+        return {"mode": mode}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            busy = asyncio.create_task(client.post(RECOGNIZE_ROUTE))
+            await started.wait()
+            shed = await client.post(RECOGNIZE_ROUTE)
+            job = await client.post(RECOGNIZE_ROUTE, params={"mode": "job"})
+            release.set()
+            return await busy, shed, job
+
+    busy, shed, job = asyncio.run(run())
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "9"
+    assert shed.json() == {"detail": "Server is busy, retry later"}
+    assert (job.status_code, job.json()) == (200, {"mode": "job"})
+    assert (busy.status_code, busy.json()) == (200, {"mode": "sync"})
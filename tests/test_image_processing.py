@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance, ImageFilter
+
+from app.utils.image_processing import ImagePreprocessor, preprocess_image
+from benchmarks.samples import synthetic_page
+
+def legacy_preprocess(image: Image.Image) -> np.ndarray:
+    """
+    Исходная предобработка на PIL/OpenCV, с которой должен совпадать ImagePreprocessor
+    """
+    image = ImageEnhance.Brightness(image).enhance(2.7)
+    image = ImageEnhance.Contrast(image).enhance(100)
+    image = image.filter(ImageFilter.SHARPEN)
+    np_img = np.array(image.convert("L"))
+    np_img = np.clip(3 * (np_img - 128) + 128, 0, 255).astype(np.uint8)
+    _, binary = cv2.threshold(np_img, 180, 255, cv2.THRESH_BINARY_INV)
+    dilated = cv2.dilate(binary, np.ones((2, 2), np.uint8), iterations=1)
+    return cv2.bitwise_not(dilated)
+
+def pages():
+    for seed in range(6):
+        page = synthetic_page(480 + 37 * seed, 360 + 29 * seed, seed)
+        yield f"synthetic-{seed}", page
+        yield f"blurred-{seed}", cv2.GaussianBlur(page, (0, 0), 1.6)
+        # тусклый размытый снимок в оттенках серого: после повышения контрастности остается много
+        # пикселей со средним значением, и результат зависит от округления в фильтре резкости
+        gray = cv2.cvtColor(cv2.cvtColor(page, cv2.COLOR_BGR2GRAY) // 3, cv2.COLOR_GRAY2BGR)
+        yield f"dim-blurred-{seed}", cv2.GaussianBlur(gray, (0, 0), 2.0)
+
+@pytest.mark.parametrize("page", [pytest.param(page, id=name) for name, page in pages()])
+def test_matches_legacy_pipeline(page):
+    expected = legacy_preprocess(Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB)))
+    assert np.array_equal(preprocess_image(page.copy()), expected)
+
+@pytest.mark.parametrize("shape", [(1, 1), (2, 5), (5, 2), (3, 3), (300, 7)])
+def test_small_images_and_band_edges_match_legacy_pipeline(shape):
+    page = np.random.default_rng(sum(shape)).integers(0, 256, shape + (3,), dtype=np.uint8)
+    expected = legacy_preprocess(Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB)))
+    assert np.array_equal(ImagePreprocessor(band_rows=4).run(page.copy()), expected)
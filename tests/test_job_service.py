@@ -0,0 +1,166 @@
+import asyncio
+from io import BytesIO
+from typing import Awaitable, Callable, List, Optional
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.repositories.job_repository import JobRepository
+from app.repositories.memory_s3_repository import MemoryS3Repository
+from app.services.job_service import RecognitionJobService
+from app.utils.ocr_cache import OCRCache
+
+class StubExecutor:
+    """
+    Пул OCR, возвращающий размер страницы; страницы с номерами из blocked ждут события release
+    """
+
+    def __init__(self, blocked: tuple = ()):
+        self.segmentation = False
+        self.blocked = blocked
+        self.release = asyncio.Event()
+
+    async def recognize(self, contents: bytearray, segmentation: bool) -> List[str]:
+        if contents[0] in self.blocked:
+            await self.release.wait()
+        return [f"page {contents[0]}: {len(contents)} bytes"]
+
+def pages(count: int) -> List[UploadFile]:
+    return [UploadFile(BytesIO(bytes([index]) * 10), headers={"content-type": "image/png"}) for index in range(count)]
+
+def make_service(
+        repository: JobRepository,
+        storage_dir: str,
+        executor: Optional[StubExecutor] = None,
+        workers: int = 1,
+        retention: int = 3600
+) -> RecognitionJobService:
+    return RecognitionJobService(
+        repository=repository,
+        storage_dir=storage_dir,
+        s3_repository=MemoryS3Repository("bucket", "id"),
+        ocr_executor=executor or StubExecutor(),
+        ocr_cache=OCRCache(memory_entries=16, disk_path=None, disk_max_bytes=0),
+        workers=workers,
+        max_depth=4,
+        retry_after=7,
+        retention=retention,
+        prune_interval=0
+    )
+
+async def wait_until(condition: Callable[[], Awaitable[bool]], timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition was not met in time"
+        await asyncio.sleep(0.01)
+
+async def status_is(service: RecognitionJobService, job_id: str, status: str) -> bool:
+    return (await service.get(job_id))["status"] == status
+
+async def pages_done_is(service: RecognitionJobService, job_id: str, pages_done: int) -> bool:
+    return (await service.get(job_id))["pages_done"] == pages_done
+
+async def is_pruned(service: RecognitionJobService, job_id: str) -> bool:
+    return await service.repository.get(job_id) is None
+
+def test_create_respects_max_depth():
+    async def run():
+        repository = JobRepository(":memory:")
+        assert [await repository.create(str(index), {}, 1, 2) for index in range(3)] == [True, True, False]
+        await repository.complete("0", {})
+        assert await repository.create("3", {}, 1, 2)
+        assert await repository.depth() == 2
+
+    asyncio.run(run())
+
+def test_depth_is_checked_atomically_across_connections(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    repositories = [JobRepository(path), JobRepository(path)]
+
+    async def run():
+        return await asyncio.gather(*(
+            repositories[index % 2].create(str(index), {}, 1, 3) for index in range(10)
+        ))
+
+    assert sum(asyncio.run(run())) == 3
+    assert asyncio.run(repositories[0].depth()) == 3
+
+def test_submit_rejects_when_queue_is_full(configure, tmp_path):
+    configure()
+
+    async def run():
+        service = make_service(JobRepository(":memory:"), str(tmp_path / "jobs"), workers=0)
+        await service.start()
+        for _ in range(4):
+            await service.submit(pages(1), student_id=1, work_code=2, assignment_id=3)
+        with pytest.raises(HTTPException) as error:
+            await service.submit(pages(1), student_id=1, work_code=2, assignment_id=3)
+        await service.close()
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503 and error.headers == {"Retry-After": "7"}
+    assert len(list((tmp_path / "jobs").iterdir())) == 4
+
+def test_interrupted_job_is_requeued_after_restart(configure, tmp_path):
+    configure()
+    path = str(tmp_path / "jobs.sqlite3")
+    storage_dir = str(tmp_path / "jobs")
+
+    async def interrupted() -> str:
+        repository = JobRepository(path)
+        service = make_service(repository, storage_dir, workers=0)
+        await service.start()
+        job_id = await service.submit(pages(2), student_id=1, work_code=2, assignment_id=3)
+        # приложение остановилось во время выполнения задания
+        assert (await repository.claim())["job_id"] == job_id
+        await service.close()
+        repository.close()
+        return job_id
+
+    async def restarted(job_id: str):
+        repository = JobRepository(path)
+        service = make_service(repository, storage_dir)
+        await service.start()
+        await wait_until(lambda: status_is(service, job_id, "done"))
+        job = await service.get(job_id)
+        await service.close()
+        return job
+
+    job_id = asyncio.run(interrupted())
+    job = asyncio.run(restarted(job_id))
+    assert job["pages_done"] == job["pages_total"] == 2
+    assert job["result"]["results"] == [["page 0: 10 bytes"], ["page 1: 10 bytes"]]
+    assert not (tmp_path / "jobs" / job_id).exists()
+
+def test_progress_is_reported_per_page(configure, tmp_path):
+    configure(recognize_page_concurrency=1)
+
+    async def run():
+        executor = StubExecutor(blocked=(1,))
+        service = make_service(JobRepository(":memory:"), str(tmp_path / "jobs"), executor)
+        await service.start()
+        job_id = await service.submit(pages(3), student_id=1, work_code=2, assignment_id=3)
+        await wait_until(lambda: pages_done_is(service, job_id, 1))
+        running = await service.get(job_id)
+        executor.release.set()
+        await wait_until(lambda: status_is(service, job_id, "done"))
+        done = await service.get(job_id)
+        await service.close()
+        return running, done
+
+    running, done = asyncio.run(run())
+    assert (running["status"], running["pages_done"], running["pages_total"]) == ("running", 1, 3)
+    assert (done["pages_done"], done["pages_total"]) == (3, 3)
+
+def test_finished_jobs_are_pruned_while_running(configure, tmp_path):
+    configure()
+
+    async def run():
+        service = make_service(JobRepository(":memory:"), str(tmp_path / "jobs"), retention=0)
+        await service.start()
+        job_id = await service.submit(pages(1), student_id=1, work_code=2, assignment_id=3)
+        await wait_until(lambda: is_pruned(service, job_id))
+        await service.close()
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.dependencies import get_llm_gateway
+from app.api.routers.ocr_router import router
+from tests.test_llm_gateway import completion, stream_response, stub_gateway
+
+def prompt_of(request: httpx.Request) -> str:
+    return json.loads(request.content)["messages"][0]["content"]
+
+def make_app(handler) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    gateway = stub_gateway(handler)
+    app.dependency_overrides[get_llm_gateway] = lambda: gateway
+    return app
+
+def post(app: FastAPI, url: str, payload: Any) -> httpx.Response:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(url, json=payload)
+
+    return asyncio.run(run())
+
+def sse_events(body: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Разбирает поток Server-Sent Events на пары (тип события, данные)
+    """
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+def test_postprocess_stream_sends_code_tokens_and_work_url(configure):
+    configure()
+    # метки разбиты между частями ответа
+    tokens = ["Here:\nocr_co", "de_field\nint x", " = 1;\n", "ocr_code", "_field\nDone"]
+    app = make_app(lambda request: stream_response(tokens))
+    response = post(app, "/api/v1/postprocess-text/stream", {"results": [["int x = 1;"]], "work_url": "work/1"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[-1] == ("done", {"work_url": "work/1"})
+    assert {event for event, _ in events[:-1]} == {"message"}
+    assert "".join(data["token"] for _, data in events[:-1]) == "".join(tokens).split("ocr_code_field")[1]
+
+def test_analysis_stream_reports_errors_as_event(configure):
+    configure()
+    app = make_app(lambda request: httpx.Response(400, json={"error": {"message": "bad request"}}))
+    events = sse_events(post(app, "/api/v1/analyze-code/stream", {"task": "t", "code": "c"}).text)
+    assert len(events) == 1
+    assert events[0][0] == "error" and events[0][1]["detail"].startswith("AI service error")
+
+def test_analysis_stream_ends_with_done(configure):
+    configure()
+    app = make_app(lambda request: stream_response(["Код ", "верный"]))
+    events = sse_events(post(app, "/api/v1/analyze-code/stream", {"task": "t", "code": "c"}).text)
+    assert events == [("message", {"token": "Код "}), ("message", {"token": "верный"}), ("done", {})]
+
+def test_analysis_batch_streams_one_line_per_item(configure):
+    configure(analysis_batch_concurrency=2)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        code = prompt_of(request).rsplit("CODE: ", 1)[1]
+        if code == "broken":
+            return httpx.Response(400, json={"error": {"message": "bad request"}})
+        return httpx.Response(200, json=completion(f"analysis of {code}"))
+
+    app = make_app(handler)
+    items = [{"id": str(index), "task": "t", "code": f"code {index}"} for index in range(5)]
+    items.append({"id": "bad", "task": "t", "code": "broken"})
+    response = post(app, "/api/v1/analyze-code/batch", items)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {line["id"]: line for line in lines}
+    assert len(lines) == len(results) == 6
+    for index in range(5):
+        assert results[str(index)] == {"id": str(index), "response": f"analysis of code {index}"}
+    assert results["bad"]["error"].startswith("AI service error")
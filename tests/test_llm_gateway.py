@@ -0,0 +1,160 @@
+import asyncio
+import json
+from typing import Callable, List, Optional
+
+import httpx
+import pytest
+from groq import APIConnectionError, APIStatusError, AsyncGroq
+
+from app.services.llm_gateway import LLMEmptyResponseError, LLMGateway
+from app.utils.llm_cache import LLMCache
+
+def completion(content: Optional[str], finish_reason: str = "stop") -> dict:
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub-model",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+def stream_response(tokens: List[str], finish_reason: str = "stop") -> httpx.Response:
+    """
+    Формирует потоковый ответ Groq (Server-Sent Events) из частей текста
+    """
+    chunks = [{"index": 0, "delta": {"content": token}, "finish_reason": None} for token in tokens]
+    chunks.append({"index": 0, "delta": {}, "finish_reason": finish_reason})
+    events = "".join(
+        "data: " + json.dumps({
+            "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub-model", "choices": [choice]
+        }) + "\n\n"
+        for choice in chunks
+    )
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events + "data: [DONE]\n\n")
+
+def stub_gateway(
+        handler: Callable[[httpx.Request], httpx.Response],
+        cache: Optional[LLMCache] = None,
+        **options
+) -> LLMGateway:
+    """
+    Создает шлюз, запросы которого обрабатывает заглушка Groq вместо сети
+    """
+    gateway = LLMGateway(api_key="test", cache=cache, backoff_base=0.001, backoff_max=0.01, **options)
+    gateway.client = AsyncGroq(
+        api_key="test",
+        base_url="http://groq.test",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return gateway
+
+def test_retries_rate_limit_and_server_errors():
+    statuses = [429, 503]
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if statuses:
+            return httpx.Response(statuses.pop(0), headers={"retry-after": "0"}, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json=completion("answer"))
+
+    gateway = stub_gateway(handler, max_retries=3)
+    assert asyncio.run(gateway.complete("prompt", "stub-model")) == "answer"
+    assert len(requests) == 3
+    assert json.loads(requests[0].content)["temperature"] == 0.0
+
+def test_gives_up_after_max_retries():
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(500, json={"error": {"message": "down"}})
+
+    gateway = stub_gateway(handler, max_retries=2)
+    with pytest.raises(APIStatusError):
+        asyncio.run(gateway.complete("prompt", "stub-model"))
+    assert len(requests) == 3
+
+def test_does_not_retry_client_errors():
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    gateway = stub_gateway(handler, max_retries=3)
+    with pytest.raises(APIStatusError):
+        asyncio.run(gateway.complete("prompt", "stub-model"))
+    assert len(requests) == 1
+
+def test_retry_delay_honors_retry_after_and_backoff():
+    gateway = LLMGateway(api_key="test", backoff_base=0.5, backoff_max=30.0)
+    request = httpx.Request("POST", "http://groq.test")
+    limited = APIStatusError(
+        "rate limited", response=httpx.Response(429, headers={"retry-after": "7"}, request=request), body=None
+    )
+    assert gateway._retry_delay(limited, 0) == 7.0
+    capped = APIStatusError(
+        "rate limited", response=httpx.Response(429, headers={"retry-after": "120"}, request=request), body=None
+    )
+    assert gateway._retry_delay(capped, 0) == 30.0
+    connection = APIConnectionError(request=request)
+    for attempt in range(4):
+        assert 0.25 * 2 ** attempt <= gateway._retry_delay(connection, attempt) <= 0.5 * 2 ** attempt
+    assert gateway._retry_delay(connection, 20) <= 30.0
+
+def test_empty_completion_raises_and_is_not_cached(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl=60, max_bytes=1024 * 1024)
+    gateway = stub_gateway(lambda request: httpx.Response(200, json=completion(None, "content_filter")), cache)
+    with pytest.raises(LLMEmptyResponseError, match="content_filter"):
+        asyncio.run(gateway.complete("prompt", "stub-model"))
+    assert asyncio.run(cache.get("stub-model", "prompt")) is None
+
+def test_concurrent_identical_requests_are_coalesced(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl=60, max_bytes=1024 * 1024)
+    requests: List[httpx.Request] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=completion("answer"))
+
+    gateway = stub_gateway(handler, cache)
+
+    async def run():
+        responses = await asyncio.gather(*(gateway.complete("prompt", "stub-model") for _ in range(5)))
+        # повторный запрос после завершения берется из кэша
+        responses.append(await gateway.complete("prompt", "stub-model"))
+        return responses
+
+    assert asyncio.run(run()) == ["answer"] * 6
+    assert len(requests) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["hits"] == 1
+
+async def collect(tokens) -> List[str]:
+    return [token async for token in tokens]
+
+def test_stream_is_cached_and_replayed_in_one_part(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl=60, max_bytes=1024 * 1024)
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return stream_response(["an", "sw", "er"])
+
+    gateway = stub_gateway(handler, cache)
+    assert asyncio.run(collect(gateway.stream("prompt", "stub-model"))) == ["an", "sw", "er"]
+    assert asyncio.run(collect(gateway.stream("prompt", "stub-model"))) == ["answer"]
+    assert asyncio.run(gateway.complete("prompt", "stub-model")) == "answer"
+    assert len(requests) == 1
+    assert json.loads(requests[0].content)["stream"] is True
+
+def test_empty_stream_raises_and_is_not_cached(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl=60, max_bytes=1024 * 1024)
+    gateway = stub_gateway(lambda request: stream_response([], "content_filter"), cache)
+    with pytest.raises(LLMEmptyResponseError):
+        asyncio.run(collect(gateway.stream("prompt", "stub-model")))
+    assert asyncio.run(cache.get("stub-model", "prompt")) is None
@@ -0,0 +1,91 @@
+import importlib.util
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import pytest
+
+from benchmarks.normalization import levenshtein
+from app.utils import ocr_executor
+from app.utils.ocr_cache import get_ocr_config_fingerprint
+from app.utils.paddle_ocr import MODEL_PATHS, get_backend_options
+
+# допустимая доля ошибок в символах относительно Paddle FP32 для вариантов той же точности и для INT8
+FP32_MAX_CER = 0.01
+INT8_MAX_CER = 0.05
+
+def test_default_backend_only_sets_threads():
+    assert get_backend_options(cpu_threads=4) == {"cpu_threads": 4}
+
+def test_mkldnn_backend():
+    assert get_backend_options(cpu_threads=2, enable_mkldnn=True) == {"cpu_threads": 2, "enable_mkldnn": True}
+
+def test_onnx_backends_use_exported_models():
+    for precision in ("fp32", "int8"):
+        det_model, rec_model = MODEL_PATHS[("onnx", precision)]
+        assert get_backend_options("onnx", precision) == {
+            "cpu_threads": 1, "det_model_dir": det_model, "rec_model_dir": rec_model, "use_onnx": True
+        }
+
+def test_model_dirs_can_be_overridden():
+    options = get_backend_options("onnx", "int8", det_model_dir="models/det.onnx")
+    assert options["det_model_dir"] == "models/det.onnx"
+    assert options["rec_model_dir"] == MODEL_PATHS[("onnx", "int8")][1]
+
+def test_paddle_int8_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported OCR backend"):
+        get_backend_options("paddle", "int8")
+
+def test_cache_fingerprint_depends_only_on_result_affecting_options():
+    default = get_ocr_config_fingerprint()
+    assert get_ocr_config_fingerprint(engine_options={"cpu_threads": 8, "rec_batch_num": 16}) == default
+    assert get_ocr_config_fingerprint(engine_options=get_backend_options("onnx")) != default
+    assert get_ocr_config_fingerprint(engine_options=get_backend_options("onnx", "int8")) != \
+        get_ocr_config_fingerprint(engine_options=get_backend_options("onnx"))
+
+def recognize_pages(options: Dict, pages: List[bytes]) -> List[List[str]]:
+    """
+    Распознает страницы в отдельном процессе: экземпляр PaddleOCR создается один раз на процесс,
+    поэтому каждый вариант вывода нужно запускать в новом процессе
+    """
+    with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=ocr_executor.init_worker,
+            initargs=(options, None)
+    ) as pool:
+        return [lines for lines, _ in pool.map(ocr_executor.recognize_image, pages)]
+
+def variant_available(backend: str, precision: str) -> bool:
+    if importlib.util.find_spec("paddleocr") is None:
+        return False
+    if backend == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+        return False
+    return all(os.path.exists(path) for path in MODEL_PATHS[(backend, precision)] + MODEL_PATHS[("paddle", "fp32")])
+
+@pytest.fixture(scope="module")
+def pages() -> List[bytes]:
+    from benchmarks.samples import load_samples
+
+    return [contents for _, contents in load_samples(["1mp", "5mp"])]
+
+@pytest.fixture(scope="module")
+def reference(pages) -> List[List[str]]:
+    if not variant_available("paddle", "fp32"):
+        pytest.skip("PaddleOCR models are not available")
+    return recognize_pages(get_backend_options(), pages)
+
+@pytest.mark.parametrize("backend, precision, enable_mkldnn, max_cer", [
+    ("paddle", "fp32", True, FP32_MAX_CER),
+    ("onnx", "fp32", False, FP32_MAX_CER),
+    ("onnx", "int8", False, INT8_MAX_CER),
+])
+def test_backend_parity(pages, reference, backend, precision, enable_mkldnn, max_cer):
+    if not variant_available(backend, precision):
+        pytest.skip(f"{backend} {precision} models are not available (see python -m benchmarks.backends --export)")
+    options = get_backend_options(backend, precision, cpu_threads=2, enable_mkldnn=enable_mkldnn)
+    results = recognize_pages(options, pages)
+    errors = sum(levenshtein("\n".join(lines), "\n".join(expected)) for lines, expected in zip(results, reference))
+    length = sum(len("\n".join(expected)) for expected in reference)
+    assert errors / max(length, 1) <= max_cer
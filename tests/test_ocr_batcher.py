@@ -0,0 +1,101 @@
+import asyncio
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from app.utils.ocr_batcher import RecognitionBatcher
+
+class StubRecognizer:
+    """
+    Распознавание пакета, возвращающее для каждой строки ее метку (значение пикселей)
+    """
+
+    def __init__(self, fail: bool = False):
+        self.batches: List[int] = []
+        self.fail = fail
+
+    async def __call__(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        self.batches.append(len(crops))
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("OCR worker crashed")
+        return [(f"line {int(crop[0, 0])}", 1.0) for crop in crops]
+
+def crops(caller: int, count: int) -> List[np.ndarray]:
+    return [np.full((4, 16), caller * 10 + line, np.uint8) for line in range(count)]
+
+def expected(caller: int, count: int) -> List[Tuple[str, float]]:
+    return [(f"line {caller * 10 + line}", 1.0) for line in range(count)]
+
+def test_full_batch_is_sent_without_waiting():
+    recognizer = StubRecognizer()
+
+    async def run():
+        batcher = RecognitionBatcher(recognizer, max_batch_size=5, max_wait=10.0)
+        return await asyncio.wait_for(asyncio.gather(batcher.submit(crops(1, 2)), batcher.submit(crops(2, 3))), 1.0)
+
+    assert asyncio.run(run()) == [expected(1, 2), expected(2, 3)]
+    assert recognizer.batches == [5]
+
+def test_partial_batch_is_sent_after_max_wait():
+    recognizer = StubRecognizer()
+
+    async def run():
+        batcher = RecognitionBatcher(recognizer, max_batch_size=100, max_wait=0.02)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(
+            *(batcher.submit(crops(caller, count)) for caller, count in ((1, 1), (2, 4), (3, 2)))
+        )
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(run())
+    assert results == [expected(1, 1), expected(2, 4), expected(3, 2)]
+    assert recognizer.batches == [7]
+    assert elapsed >= 0.02
+
+def test_each_caller_gets_its_own_lines_across_batches():
+    recognizer = StubRecognizer()
+    counts = [3, 1, 5, 2, 0, 4, 1]
+
+    async def run():
+        batcher = RecognitionBatcher(recognizer, max_batch_size=4, max_wait=0.01)
+
+        async def caller(index: int, count: int):
+            # запросы поступают не одновременно и попадают в разные пакеты
+            await asyncio.sleep(0.003 * index)
+            return await batcher.submit(crops(index, count))
+
+        return await asyncio.gather(*(caller(index, count) for index, count in enumerate(counts)))
+
+    assert asyncio.run(run()) == [expected(index, count) for index, count in enumerate(counts)]
+    assert sum(recognizer.batches) == sum(counts)
+    assert len(recognizer.batches) > 1
+
+def test_batch_error_reaches_every_waiter():
+    async def run():
+        batcher = RecognitionBatcher(StubRecognizer(fail=True), max_batch_size=100, max_wait=0.01)
+        return await asyncio.gather(
+            *(batcher.submit(crops(caller, 2)) for caller in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+    assert len(errors) == 3
+    assert all(isinstance(error, RuntimeError) and str(error) == "OCR worker crashed" for error in errors)
+
+def test_cancelled_caller_does_not_affect_others():
+    recognizer = StubRecognizer()
+
+    async def run():
+        batcher = RecognitionBatcher(recognizer, max_batch_size=100, max_wait=0.01)
+        cancelled = asyncio.ensure_future(batcher.submit(crops(1, 2)))
+        other = asyncio.ensure_future(batcher.submit(crops(2, 3)))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return await other
+
+    assert asyncio.run(run()) == expected(2, 3)
+    assert recognizer.batches == [5]
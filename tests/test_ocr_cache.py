@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import ocr_cache
+from app.utils.ocr_cache import OCRCache, get_ocr_config_fingerprint
+from app.utils.paddle_ocr import get_backend_options
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # время последнего обращения строго возрастает, чтобы порядок вытеснения не зависел от точности часов
+    ticks = itertools.count(1)
+    monkeypatch.setattr(ocr_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+def entry_size(result) -> int:
+    return len(json.dumps(result, ensure_ascii=False).encode())
+
+def test_memory_tier_evicts_least_recently_used():
+    async def run():
+        cache = OCRCache(memory_entries=2, disk_path=None, disk_max_bytes=0)
+        await cache.put("a", ["line a"])
+        await cache.put("b", ["line b"])
+        assert await cache.get("a") == ["line a"]
+        await cache.put("c", ["line c"])
+        return cache, [await cache.get(key) for key in ("a", "b", "c")]
+
+    cache, results = asyncio.run(run())
+    assert results == [["line a"], None, ["line c"]]
+    assert list(cache.memory) == ["a", "c"]
+    assert cache.stats() == {"hits_memory": 3, "hits_disk": 0, "misses": 1, "memory_entries": 2, "disk_bytes": 0}
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "ocr.sqlite3")
+
+    async def run():
+        cache = OCRCache(memory_entries=4, disk_path=path, disk_max_bytes=1024)
+        await cache.put("a", ["строка"])
+        cache.close()
+        restarted = OCRCache(memory_entries=4, disk_path=path, disk_max_bytes=1024)
+        result = await restarted.get("a")
+        # после чтения с диска запись поднимается в память
+        assert await restarted.get("a") == result
+        return restarted, result
+
+    cache, result = asyncio.run(run())
+    assert result == ["строка"]
+    assert (cache.hits_disk, cache.hits_memory) == (1, 1)
+    assert cache.disk_bytes == entry_size(["строка"])
+
+def test_disk_tier_evicts_least_recently_accessed_by_size(tmp_path):
+    result = ["x" * 40]
+    size = entry_size(result)
+
+    async def run():
+        # без уровня в памяти каждое чтение обращается к диску и обновляет время обращения
+        cache = OCRCache(memory_entries=0, disk_path=str(tmp_path / "ocr.sqlite3"), disk_max_bytes=3 * size)
+        for key in ("a", "b", "c"):
+            await cache.put(key, result)
+        assert await cache.get("a") == result
+        await cache.put("d", result)
+        return cache, {key: await cache.get(key) is not None for key in "abcd"}
+
+    cache, present = asyncio.run(run())
+    assert present == {"a": True, "b": False, "c": True, "d": True}
+    assert cache.disk_bytes == 3 * size
+    total = cache._db.execute("SELECT SUM(size) FROM ocr_results").fetchone()[0]
+    assert total == cache.disk_bytes
+
+def test_replacing_entry_keeps_disk_size_accurate(tmp_path):
+    async def run():
+        cache = OCRCache(memory_entries=0, disk_path=str(tmp_path / "ocr.sqlite3"), disk_max_bytes=1024)
+        await cache.put("a", ["short"])
+        await cache.put("a", ["much longer line"])
+        return cache
+
+    assert asyncio.run(run()).disk_bytes == entry_size(["much longer line"])
+
+def test_results_are_invalidated_when_fingerprint_changes(tmp_path):
+    path = str(tmp_path / "ocr.sqlite3")
+    image_hash = "0" * 64
+
+    async def run():
+        cache = OCRCache(memory_entries=4, disk_path=path, disk_max_bytes=1024)
+        await cache.put(cache.make_key(image_hash), ["paddle"])
+        cache.close()
+        found = {}
+        for name, options in {
+            "same": {},
+            "runtime only": {"engine_options": {"cpu_threads": 8}},
+            "onnx": {"engine_options": get_backend_options("onnx")},
+            "normalization": {"normalization": {"target_text_height": 32}},
+        }.items():
+            restarted = OCRCache(memory_entries=4, disk_path=path, disk_max_bytes=1024, **options)
+            found[name] = await restarted.get(restarted.make_key(image_hash))
+            found[name + ", segmentation"] = await restarted.get(restarted.make_key(image_hash, segmentation=True))
+            restarted.close()
+        return found
+
+    found = asyncio.run(run())
+    assert found == {
+        "same": ["paddle"], "same, segmentation": None,
+        "runtime only": ["paddle"], "runtime only, segmentation": None,
+        "onnx": None, "onnx, segmentation": None,
+        "normalization": None, "normalization, segmentation": None,
+    }
+
+def test_fingerprint_covers_preprocessing_constants(monkeypatch):
+    default = get_ocr_config_fingerprint()
+    monkeypatch.setattr(ocr_cache.image_processing, "BINARY_THRESHOLD", 181)
+    assert get_ocr_config_fingerprint() != default
@@ -0,0 +1,56 @@
+import asyncio
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.repositories.memory_s3_repository import MemoryS3Repository
+from app.services.ocr_service import UploadTee, handle_ocr_images
+from app.services.s3_service import S3Service
+
+MB = 1024 * 1024
+
+def test_small_upload_is_held_in_one_buffer():
+    contents = bytes(5 * MB)
+    repository = MemoryS3Repository("bucket", "id")
+    bodies = []
+
+    async def put_object(Bucket, Key, Body):
+        bodies.append(Body)
+
+    repository.client.put_object = put_object
+    tee = UploadTee(UploadFile(BytesIO(contents)), chunk_size=MB, max_size=25 * MB)
+
+    tracemalloc.start()
+    try:
+        asyncio.run(repository.upload_stream(
+            tee.chunks(), "work/page.jpg", part_size=5 * MB, threshold=8 * MB, buffer=tee.contents
+        ))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # S3 получает буфер, из которого затем выполняется OCR, а не его копию
+    assert bodies[0] is tee.contents and tee.contents == contents
+    assert peak < 1.5 * len(contents)
+
+def test_too_large_pages_are_rejected_with_413(configure):
+    configure(max_upload_size=10, upload_chunk_size=4)
+    repository = MemoryS3Repository("bucket", "id")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(handle_ocr_images(
+            images=[UploadFile(BytesIO(b"x" * 12)) for _ in range(2)],
+            s3_service=S3Service(repository),
+            ocr_executor=SimpleNamespace(segmentation=False),
+            ocr_cache=None,
+            check_date=datetime(2024, 1, 1),
+            student_id=1,
+            work_code=2,
+            assignment_id=3,
+            concurrency=2
+        ))
+    assert error.value.status_code == 413
+    assert repository.objects == {}
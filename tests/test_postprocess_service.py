@@ -0,0 +1,80 @@
+import asyncio
+import re
+from typing import AsyncIterator, List
+
+import pytest
+
+from app.services.postprocess_service import PostProcessService
+from tests.test_text_postprocessing import PROGRAM
+
+class StubGateway:
+    """
+    Шлюз LLM, возвращающий код из запроса между метками ocr_code_field (с лишними переводами строк,
+    которые LLM добавляет вокруг кода). Более ранние части отвечают позже, чтобы проверить порядок сборки
+    """
+
+    def __init__(self):
+        self.prompts: List[str] = []
+
+    @staticmethod
+    def respond(content: str) -> str:
+        code = re.search(r"do not explain anything: (.*) In the answer mark", content, re.S).group(1)
+        return f"Here is the code:\nocr_code_field\n{code}\n\nocr_code_field\nDone."
+
+    async def complete(self, content: str, model: str, refresh: bool = False) -> str:
+        self.prompts.append(content)
+        part = re.search(r"This is part (\d+) of (\d+)", content)
+        if part:
+            await asyncio.sleep(0.01 * (int(part.group(2)) - int(part.group(1))))
+        return self.respond(content)
+
+    async def stream(self, content: str, model: str, refresh: bool = False) -> AsyncIterator[str]:
+        self.prompts.append(content)
+        response = self.respond(content)
+        for start in range(0, len(response), 5):
+            await asyncio.sleep(0)
+            yield response[start:start + 5]
+
+DATA = {"results": PROGRAM, "work_url": "work/1"}
+
+def postprocess(chunk_tokens: int, data=DATA):
+    gateway = StubGateway()
+    code, work_url = asyncio.run(PostProcessService(gateway, chunk_tokens).postprocess_text(data))
+    return code, work_url, gateway.prompts
+
+def postprocess_stream(chunk_tokens: int, data=DATA):
+    gateway = StubGateway()
+    parts, work_url = PostProcessService(gateway, chunk_tokens).postprocess_text_stream(data)
+
+    async def collect():
+        return [part async for part in parts]
+
+    return "".join(asyncio.run(collect())), work_url, gateway.prompts
+
+def test_chunking_disabled_sends_one_plain_prompt():
+    code, work_url, prompts = postprocess(0)
+    assert len(prompts) == 1 and "This is part" not in prompts[0]
+    assert code == "\n" + "\n".join(line for page in PROGRAM for line in page) + "\n\n"
+    assert work_url == "work/1"
+
+def test_small_code_and_single_chunk_use_plain_prompt():
+    assert postprocess(10_000)[2] == postprocess(0)[2]
+    # строку, превышающую размер части, разделить нельзя
+    data = {"results": [["x" * 300]], "work_url": "work/1"}
+    code, _, prompts = postprocess(10, data)
+    assert len(prompts) == 1 and "This is part" not in prompts[0]
+    assert code == postprocess(0, data)[0]
+
+@pytest.mark.parametrize("chunk_tokens", [20, 40, 110])
+def test_parts_are_stitched_in_order(chunk_tokens):
+    code, _, prompts = postprocess(chunk_tokens)
+    assert len(prompts) > 1
+    assert all(f"This is part {index} of {len(prompts)}" in prompt for index, prompt in enumerate(prompts, start=1))
+    # на стыках частей лишние переводы строк отбрасываются, края всего кода остаются как в одном запросе
+    assert code == postprocess(0)[0]
+
+@pytest.mark.parametrize("chunk_tokens", [0, 20, 40, 110])
+def test_stream_matches_single_response(chunk_tokens):
+    code, work_url, prompts = postprocess_stream(chunk_tokens)
+    assert (code, work_url) == postprocess(chunk_tokens)[:2]
+    assert len(prompts) == len(postprocess(chunk_tokens)[2])
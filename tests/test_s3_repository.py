@@ -0,0 +1,106 @@
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.repositories.memory_s3_repository import MemoryS3Repository
+from app.repositories.s3_repository import S3Repository
+
+async def iterate(chunks: List[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+def test_repository_reuses_one_client():
+    async def run():
+        repository = S3Repository("key", "secret", "http://127.0.0.1:9", "bucket", "id", max_pool_connections=4)
+        await repository.start()
+        client = repository.client
+        await repository.start()
+        async with repository.get_client() as first, repository.get_client() as second:
+            assert first is second is client
+        assert client.meta.config.max_pool_connections == 4
+        await repository.close()
+        assert repository.client is None
+
+    asyncio.run(run())
+
+def test_small_stream_is_uploaded_with_one_put():
+    repository = MemoryS3Repository("bucket", "id")
+    asyncio.run(repository.upload_stream(iterate([b"abc", b"de"]), "work/page.jpg", part_size=8))
+    assert repository.objects["work/page.jpg"] == b"abcde"
+    assert repository.client.completed == []
+
+def test_large_stream_is_uploaded_in_parts():
+    repository = MemoryS3Repository("bucket", "id")
+    chunks = [bytes([index]) * 3 for index in range(7)]
+    asyncio.run(repository.upload_stream(iterate(chunks), "work/page.jpg", part_size=5))
+    assert repository.objects["work/page.jpg"] == b"".join(chunks)
+    assert len(repository.client.completed) == 1
+    assert repository.client.uploads == {}
+
+def test_multipart_upload_is_aborted_when_reading_fails():
+    repository = MemoryS3Repository("bucket", "id")
+
+    async def failing() -> AsyncIterator[bytes]:
+        yield b"x" * 10
+        raise ValueError("client disconnected")
+
+    with pytest.raises(ValueError):
+        asyncio.run(repository.upload_stream(failing(), "work/page.jpg", part_size=5))
+    assert "work/page.jpg" not in repository.objects
+    assert len(repository.client.aborted) == 1
+    assert repository.client.uploads == {}
+
+def test_multipart_upload_is_aborted_on_s3_error():
+    repository = MemoryS3Repository("bucket", "id")
+
+    async def upload_part(**kwargs):
+        raise ClientError({"Error": {"Code": "InternalError", "Message": "boom"}}, "UploadPart")
+
+    repository.client.upload_part = upload_part
+    with pytest.raises(RuntimeError, match="S3 upload error"):
+        asyncio.run(repository.upload_stream(iterate([b"x" * 10]), "work/page.jpg", part_size=5))
+    assert "work/page.jpg" not in repository.objects
+    assert len(repository.client.aborted) == 1
+
+def test_buffered_stream_is_uploaded_from_source_buffer():
+    repository = MemoryS3Repository("bucket", "id")
+    bodies = []
+
+    async def put_object(Bucket, Key, Body):
+        bodies.append(Body)
+
+    repository.client.put_object = put_object
+    buffer = bytearray()
+
+    async def source() -> AsyncIterator[bytes]:
+        for chunk in (b"abc", b"de"):
+            buffer.extend(chunk)
+            yield chunk
+
+    asyncio.run(repository.upload_stream(source(), "work/page.jpg", part_size=5, threshold=8, buffer=buffer))
+    assert bodies == [b"abcde"] and bodies[0] is buffer
+
+def test_buffered_stream_is_uploaded_in_parts_after_threshold():
+    repository = MemoryS3Repository("bucket", "id")
+    chunks = [bytes([index]) * 3 for index in range(7)]
+    buffer = bytearray()
+
+    async def source() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            buffer.extend(chunk)
+            yield chunk
+
+    sizes = []
+    upload_part = repository.client.upload_part
+
+    async def record_part(**kwargs):
+        sizes.append(len(kwargs["Body"]))
+        return await upload_part(**kwargs)
+
+    repository.client.upload_part = record_part
+    asyncio.run(repository.upload_stream(source(), "work/page.jpg", part_size=4, threshold=9, buffer=buffer))
+    assert repository.objects["work/page.jpg"] == b"".join(chunks)
+    assert sizes == [4, 4, 4, 4, 4, 1]
+    assert len(repository.client.completed) == 1
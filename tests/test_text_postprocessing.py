@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from app.utils.text_postprocessing import CODE_FIELD_MARKER, CodeFieldExtractor, estimate_tokens, split_code_chunks
+
+RESPONSES = [
+    "Here is the code:\nocr_code_field\nint x = 1;\nConsole.WriteLine(x);\nocr_code_field\nThat's all.",
+    "ocr_code_fieldint y;ocr_code_field",
+    # после второй метки текст не передается, даже если в нем есть третья
+    "/ocr_code_field at/ the beginning: ocr_code_field\nvar a = b;\nocr_code_field ocr_code_field tail",
+    # без закрывающей метки код продолжается до конца ответа
+    "prefix ocr_code_field\nclass A {}\n",
+]
+
+def extract(tokens) -> str:
+    extractor = CodeFieldExtractor()
+    return "".join(extractor.feed(token) for token in tokens) + extractor.finish()
+
+@pytest.mark.parametrize("response", RESPONSES)
+def test_extractor_matches_split_for_any_token_boundaries(response):
+    expected = response.split(CODE_FIELD_MARKER)[1]
+    assert extract([response]) == expected
+    assert extract(list(response)) == expected
+    rng = random.Random(0)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(response)), rng.randint(1, 10)))
+        assert extract([response[start:end] for start, end in zip([0] + cuts, cuts + [None])]) == expected
+
+def test_extractor_streams_code_before_closing_marker():
+    extractor = CodeFieldExtractor()
+    assert extractor.feed("ocr_code_field\n") == ""
+    streamed = extractor.feed("int x = 1; int y = 2;")
+    # задерживается только конец, который может оказаться началом метки
+    assert streamed and len("\nint x = 1; int y = 2;") - len(streamed) < len(CODE_FIELD_MARKER)
+
+def test_extractor_requires_marker():
+    extractor = CodeFieldExtractor()
+    assert extractor.feed("no code here") == ""
+    with pytest.raises(ValueError, match=CODE_FIELD_MARKER):
+        extractor.finish()
+
+PROGRAM = [
+    [
+        "using System;",
+        "class Program",
+        "{",
+        "    static int Sum(int[] values)",
+        "    {",
+        "        int total = 0;",
+        "        foreach (var value in values)",
+        "        {",
+        "            total += value;",
+        "        }",
+        "        return total;",
+        "    }",
+    ],
+    [
+        "    static void Main()",
+        "    {",
+        "        var values = new[] { 1, 2, 3 };",
+        "        Console.WriteLine(Sum(values));",
+        "        Console.WriteLine(values.Length);",
+        "    }",
+        "}",
+    ],
+]
+
+def test_split_keeps_code_whole_when_it_fits():
+    assert split_code_chunks(PROGRAM, 10_000) == ["\n".join(line for page in PROGRAM for line in page)]
+
+@pytest.mark.parametrize("max_tokens", [20, 40, 80])
+def test_split_preserves_lines_and_respects_size(max_tokens):
+    chunks = split_code_chunks(PROGRAM, max_tokens)
+    assert len(chunks) > 1
+    assert "\n".join(chunks) == "\n".join(line for page in PROGRAM for line in page)
+    for chunk in chunks:
+        assert sum(estimate_tokens(line) + 1 for line in chunk.split("\n")) <= max_tokens
+
+def test_split_prefers_method_boundaries():
+    chunks = split_code_chunks(PROGRAM, 110)
+    # в первую часть помещается и начало Main, но она заканчивается концом метода Sum
+    assert chunks[0].endswith("        return total;\n    }")
+    assert chunks[1].startswith("    static void Main()")
+
+def test_split_keeps_overlong_line_whole():
+    line = "x" * 300
+    assert split_code_chunks([[line, "y;"]], 10) == [line, "y;"]